@@ -0,0 +1,98 @@
+# * Imports
+from src.main.database.controller import Controller
+from src.main.utils.constants import IO_THREADS, SCAN_BATCH
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, List
+import asyncio
+import functools
+
+
+# * The AsyncController class is the Controller for asyncio code. Every call runs on a pool of I/O threads, so reading
+# and writing pages never blocks the event loop, and many calls run at the same time on one concurrent Controller.
+# Calls that miss the same page at once share one read of the page (ConcurrentBufferPool.fetch). A commit runs on an
+# I/O thread as well and writes the pages without holding the buffer pool, so reads go on while it writes.
+class AsyncController:
+    # Initialize the controller of the file with io_threads I/O threads, the other arguments are those of a Controller
+    def __init__(self, filepath, io_threads: int = IO_THREADS, **kwargs):
+        self.controller = Controller(filepath, concurrent=True, **kwargs)
+        self.executor = ThreadPoolExecutor(io_threads, thread_name_prefix='page-io')
+
+    # Returns the schema of the records, set by an insert
+    @property
+    def schema(self) -> List[str]:
+        return self.controller.schema
+
+    @schema.setter
+    def schema(self, schema: List[str]):
+        self.controller.schema = schema
+
+    # Runs a function on an I/O thread and returns its result
+    async def run(self, function: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                functools.partial(function, *args, **kwargs))
+
+    # Insert a record, see Controller.insert.
+    async def insert(self, data, schema: List[str]):
+        return await self.run(self.controller.insert, data, schema)
+
+    # Insert many records at once, see Controller.insert_many.
+    async def insert_many(self, data, schema: List[str]):
+        return await self.run(self.controller.insert_many, data, schema)
+
+    # Read the record with the given id, see Controller.read.
+    async def read(self, id_: int):
+        return await self.run(self.controller.read, id_)
+
+    # Read many records by their id at once, see Controller.read_many.
+    async def read_many(self, ids: List[int]):
+        return await self.run(self.controller.read_many, ids)
+
+    # Update the record with the given id, see Controller.update.
+    async def update(self, id_: int, data, schema: List[str]):
+        return await self.run(self.controller.update, id_, data, schema)
+
+    # Update many records at once, see Controller.update_many.
+    async def update_many(self, data, schema: List[str]):
+        return await self.run(self.controller.update_many, data, schema)
+
+    # Delete the record with the given id, see Controller.delete.
+    async def delete(self, id_: int):
+        return await self.run(self.controller.delete, id_)
+
+    # Delete many records at once, see Controller.delete_many.
+    async def delete_many(self, ids: List[int]):
+        return await self.run(self.controller.delete_many, ids)
+
+    # Iterate over the records with an id between lo and hi (both included) in order of their id, see Controller.range.
+    def range(self, lo: int, hi: int, schema: List[str]):
+        return self.iterate(self.controller.range(lo, hi, schema))
+
+    # Iterate over all records in the order they are stored in the file, see Controller.scan. The records are decoded
+    # on an I/O thread in batches of SCAN_BATCH records. The scan reads copies of the pages (HeapFile.data_pages) and
+    # holds no page latch between batches, so the loop over the records can change them.
+    def scan(self, schema: List[str], predicate: Dict[int, Callable] = None, columns: List[int] = None):
+        return self.iterate(self.controller.scan(schema, predicate, columns))
+
+    # Iterates over the items of a blocking iterator, taken in batches of SCAN_BATCH items on an I/O thread. When the
+    # iteration is closed early (aclose), the iterator is closed too and releases the page it holds.
+    async def iterate(self, iterator):
+        try:
+            while True:
+                batch = await self.run(lambda: list(islice(iterator, SCAN_BATCH)))
+                for item in batch:
+                    yield item
+                if len(batch) < SCAN_BATCH:
+                    return
+        finally:
+            iterator.close()
+
+    # Commit the changes, see Controller.commit.
+    async def commit(self):
+        return await self.run(self.controller.commit)
+
+    # Commit the changes and close the file, waiting for the calls that are still running.
+    async def close(self):
+        stats = await self.run(self.controller.close)
+        self.executor.shutdown()
+        return stats
@@ -1,161 +1,892 @@
 # * Imports
 from src.main.utils.constants import *
+from array import array
+from typing import Optional
+import bisect
+import sys
+import threading
 
+# Node types, written in the first byte of an index page
+LEAF_NODE = 0
+INTERNAL_NODE = 1
+META_NODE = 2
 
-# * The BPlusTreeIndex class represents the top-level B+ tree structure and provides methods for inserting and
-# searching for keys.
+# Keys are kept in arrays of unsigned ints of KEY_SIZE bytes, or of 8 bytes for composite keys
+KEY_TYPECODE = 'I'
+KEY_TYPECODES = {KEY_SIZE: KEY_TYPECODE, 8: 'Q'}
+
+# Record id of a key that is deleted lazily, no page has this many slots
+TOMBSTONE = (0, 2 ** (8 * SLOT_ID_SIZE) - 1)
+# Number of lazy deletes after which the tombstones are removed from the three
+VACUUM_THRESHOLD = 1024
+LAZY_DELETES_SIZE = 4  # Number of lazy deletes since the last vacuum, on the meta page
+
+
+
+# Returns the maximum number of keys in a leaf and in an internal node, so that a node still fits on a page of the
+# given size and key size: a leaf holds a key and a record id per key, an internal node a key and a child page number
+# per key and one extra child page number.
+def node_capacities(page_size: int = PAGE_SIZE, key_size: int = KEY_SIZE) -> (int, int):
+    return ((page_size - NODE_HEADER_SIZE) // (key_size + RECORD_ID_SIZE),
+            (page_size - NODE_HEADER_SIZE - PAGE_NUM_SIZE) // (key_size + PAGE_NUM_SIZE))
+
+
+LEAF_CAPACITY, INTERNAL_CAPACITY = node_capacities(PAGE_SIZE)
+
+
+# Returns the most pages an operation on a B+ tree with the given node capacities keeps pinned at once. The tree is at
+# most as high as a tree of all ids with half-full nodes (every record has one key in every index). An insert pins the
+# meta page, the path and a new node per level and a new root, a delete the meta page, the path and two siblings per
+# level above the leaf.
+def max_pinned_pages(leaf_capacity: int, internal_capacity: int, keys: int = 2 ** (8 * KEY_SIZE)) -> int:
+    least_keys, least_children = max(1, leaf_capacity // 2), internal_capacity // 2 + 1
+    height, least = 1, 2 * least_keys  # The fewest keys of a tree one level higher
+    while least <= keys:
+        height, least = height + 1, least * least_children
+    return 1 + max(2 * height + 1, 3 * height - 2)
+
+
+# Returns max_pinned_pages for a new tree with the given fan-out (by default as many children as fit on a page) and key
+# size
+def tree_pinned_pages(fan_out: int = None, key_size: int = KEY_SIZE) -> int:
+    if fan_out is None:
+        return max_pinned_pages(*node_capacities(PAGE_SIZE, key_size))
+    return max_pinned_pages(fan_out - 1, fan_out - 1)
+
+
+# * The BPlusTreeIndex class represents the top-level B+ tree structure and provides methods for inserting,
+# searching and deleting keys. The nodes are kept in a node store, which keeps them in memory or on pages of the heap
+# file. Children are referenced by page number, so the tree can be reloaded from its meta page. The nodes used by an
+# operation are released in the store when the operation is done. The capacity of the nodes follows from the page size
+# of the store, or from the fan-out the three is created with, and is stored on the meta page. Deletes keep the three
+# balanced, either right away or in batches when deleted keys are first replaced by tombstones (lazy deletion).
 class BPlusTreeIndex:
-    # Initialize a three with empty root node
-    def __init__(self):
-        self.root = BPlusTreeNode()
+    # Initialize a three with empty root node, or load an existing three from its meta page
+    def __init__(self, store=None, meta_page: int = None, fan_out: int = None, lazy_delete: bool = False,
+                 vacuum_threshold: int = VACUUM_THRESHOLD):
+        """
+        :param store: Node store, an in-memory NodeStore by default
+        :param meta_page: Page number of the meta page of an existing three
+        :param fan_out: Maximum number of children of a node of a new three, by default as many as fit on a page
+        :param lazy_delete: Replace deleted keys by tombstones, which are removed once there are vacuum_threshold
+        :param vacuum_threshold: Number of lazy deletes after which the three is vacuumed
+        """
+        self.store = NodeStore() if store is None else store
+        self.lazy_delete = lazy_delete
+        self.vacuum_threshold = vacuum_threshold
+        self.lazy_deletes = 0  # Lazy deletes since the last vacuum
+        # Type of the key arrays of the nodes, the key size is set by the store
+        self.key_typecode = KEY_TYPECODES[self.store.key_size]
+        max_leaf, max_internal = node_capacities(self.store.page_size, self.store.key_size)
+        if meta_page is None:
+            if fan_out is None:
+                self.leaf_capacity, self.internal_capacity = max_leaf, max_internal
+            elif fan_out < 3 or fan_out - 1 > min(max_leaf, max_internal):
+                raise ValueError(f"A fan-out of {fan_out} does not fit on a page of {self.store.page_size} bytes!")
+            else:
+                self.leaf_capacity = self.internal_capacity = fan_out - 1
+            root = self.store.new(BPlusTreeNode(array(self.key_typecode)))
+            meta_page = self.store.new(
+                BPlusTreeMeta(root.page_number, self.leaf_capacity, self.internal_capacity)).page_number
+            self.store.release()
+        else:
+            # Threes stored before the capacity was on the meta page use the capacity of a page
+            meta = self.store.get(meta_page)
+            self.leaf_capacity = meta.leaf_capacity or max_leaf
+            self.internal_capacity = meta.internal_capacity or max_internal
+            self.lazy_deletes = meta.lazy_deletes
+            self.store.release()
+        # Page number of the meta page, which is all that is needed to reload the three
+        self.meta_page = meta_page
+
+    # Returns the meta page of the three
+    @property
+    def meta(self):
+        return self.store.get(self.meta_page)
+
+    # Returns the root node of the three
+    @property
+    def root(self):
+        return self.store.get(self.meta.root)
+
+    #  Insert key and record id to the three, handle node splits (and root node split) if needed.
+    def insert(self, key, record_id):
+        """
+        Insert a key with its record id. If the key already exists, its record id is replaced.
+
+        :param key: Key of the record
+        :param record_id: (page number, slot id) of the record
+        """
+        try:
+            path = self.find_path(key, True, lambda node: len(node.keys) < self.capacity(node))
+            node = path.pop()
+            node.insert(key, record_id)
+            self.store.mark_dirty(node)
+
+            # Walk back up as long as the nodes overflow
+            while node.is_overflowing(self.capacity(node)):
+                separator, new_node = node.split(self.store)
+                if not path:
+                    new_root = self.store.new(
+                        BPlusTreeInternalNode(array(self.key_typecode, [separator]),
+                                              [node.page_number, new_node.page_number]))
+                    meta = self.meta
+                    meta.root = new_root.page_number
+                    self.store.mark_dirty(meta)
+                    return
+                node = path.pop()
+                node.insert_child(separator, new_node.page_number)
+                self.store.mark_dirty(node)
+        finally:
+            self.store.release()
 
-    #  Insert key and page number to the three, handle root node split if needed.
-    def insert(self, key, page_number):
-        new_root = self.root.insert(key, page_number)
-        if new_root:
-            new_internal_node = BPlusTreeInternalNode([new_root.keys[0]], [self.root, new_root])
-            self.root = new_internal_node
+    # Insert many (key, record id) pairs, the keys that fit in the same leaf are inserted with one descent.
+    def insert_many(self, items):
+        """
+        The pairs are inserted in key order. All keys up to the bound of a leaf are inserted into the leaf as long as
+        it does not overflow, a key that would split the leaf is inserted on its own.
+
+        :param items: (key, record id) pairs, the last record id of a key is kept
+        """
+        items = sorted(dict(items).items())
+        i = 0
+        while i < len(items):
+            start = i
+            try:
+                leaf, bound = self.find_leaf_bound(items[i][0], exclusive=True)
+                capacity = self.capacity(leaf)
+                while i < len(items) and (bound is None or items[i][0] < bound) and len(leaf.keys) < capacity:
+                    leaf.insert(*items[i])
+                    i += 1
+                if i > start:
+                    self.store.mark_dirty(leaf)
+            finally:
+                self.store.release()
+            if i == start:
+                self.insert(*items[i])
+                i += 1
 
     # Search for a key in the B+ tree.
     def search(self, key):
-        return self.root.search(key)
+        try:
+            record_id = self.find_leaf(key).search(key)
+            return None if record_id == TOMBSTONE else record_id
+        finally:
+            self.store.release()
 
+    # Search for many keys at once, returns a dict from every key that is in the three to its record id.
+    def search_many(self, keys) -> dict:
+        """
+        The keys are searched in sorted order, so the keys in the same leaf are found with one descent: the tree is
+        only descended again for a key past the leaf (from the smallest key of the leaves after it).
 
-# * The BPlusTreeNode and BPlusTreeInternalNode classes represent the nodes in the B+ tree. The BPlusTreeNode class
-# is used for leaf nodes, while the BPlusTreeInternalNode class is used for internal nodes.
-class BPlusTreeNode:
-    # Initialize an empty leaf node.
-    def __init__(self):
-        self.keys = []
-        self.children = []
-        self.is_leaf = True
-        self.next_leaf = None
+        :param keys: Keys to search for, in any order
+        :return: Record id of every key that was found
+        """
+        found = {}
+        leaf, bound = None, None
+        try:
+            for key in sorted(set(keys)):
+                if leaf is None or (bound is not None and key >= bound):
+                    self.store.release()
+                    leaf, bound = self.find_leaf_bound(key)
+                record_id = leaf.search(key)
+                if record_id is not None and record_id != TOMBSTONE:
+                    found[key] = record_id
+        finally:
+            self.store.release()
+        return found
+
+    # Yield the (key, record id) pairs with lo <= key <= hi in key order.
+    def range_search(self, lo, hi):
+        """
+        Descend once to the leaf of lo and follow the linked leaves from there. The leaves are read one at a time and
+        released before their keys are yielded. When threads share the three a leaf can be merged away between two
+        leaves, then every next leaf is found from the root again, by the smallest key that can be in it.
+
+        :param lo: Smallest key of the range
+        :param hi: Largest key of the range
+        """
+        leaf_page = None
+        while True:
+            try:
+                if self.store.concurrent:
+                    leaf, bound = self.find_leaf_bound(lo)
+                else:
+                    leaf = self.find_leaf(lo) if leaf_page is None else self.store.get(leaf_page)
+                start, stop = bisect.bisect_left(leaf.keys, lo), bisect.bisect_right(leaf.keys, hi)
+                items = [(key, record_id) for key, record_id in zip(leaf.keys[start:stop], leaf.children[start:stop])
+                         if record_id != TOMBSTONE]
+                leaf_page = leaf.next_leaf
+                done = stop < len(leaf.keys) or leaf_page is None
+                if self.store.concurrent:
+                    done, lo = bound is None or bound > hi, bound
+            finally:
+                self.store.release()
+            yield from items
+            if done:
+                return
+
+    # Delete a key from the B+ tree.
+    def delete(self, key) -> bool:
+        """
+        Delete a key from its leaf and rebalance the three. In lazy mode the record id of the key is replaced by a
+        tombstone instead, and the tombstones are removed in one pass after vacuum_threshold lazy deletes.
+
+        :param key: Key of the record
+        :return: True if the key was found and deleted
+        """
+        if not self.lazy_delete:
+            return self.remove(key)
+        try:
+            leaf = self.find_leaf(key, exclusive=True)
+            index = leaf.find_key_index(key)
+            if index == -1 or leaf.children[index] == TOMBSTONE:
+                return False
+            leaf.children[index] = TOMBSTONE
+            self.store.mark_dirty(leaf)
+        finally:
+            self.store.release()
+        self.lazy_deletes += 1
+        if self.lazy_deletes >= self.vacuum_threshold:
+            self.vacuum()
+        else:
+            self.write_lazy_deletes()
+        return True
+
+    # Delete many keys, the keys in the same leaf are deleted with one descent. Returns the number of deleted keys.
+    def delete_many(self, keys) -> int:
+        """
+        The keys are deleted in key order. All keys up to the bound of a leaf are deleted from the leaf as long as it
+        stays more than half full (or get a tombstone in lazy mode), a key that would make the leaf borrow or merge is
+        deleted on its own.
+
+        :param keys: Keys to delete, in any order
+        :return: The number of keys that were found and deleted
+        """
+        keys = sorted(set(keys))
+        i, deleted = 0, 0
+        while i < len(keys):
+            start, found = i, deleted
+            try:
+                leaf, bound = self.find_leaf_bound(keys[i], exclusive=True)
+                half = self.capacity(leaf) // 2
+                while i < len(keys) and (bound is None or keys[i] < bound):
+                    index = leaf.find_key_index(keys[i])
+                    if self.lazy_delete:
+                        if index != -1 and leaf.children[index] != TOMBSTONE:
+                            leaf.children[index] = TOMBSTONE
+                            self.lazy_deletes += 1
+                            deleted += 1
+                    elif index != -1:
+                        if len(leaf.keys) <= half:
+                            break
+                        del leaf.keys[index]
+                        del leaf.children[index]
+                        deleted += 1
+                    i += 1
+                if deleted > found:
+                    self.store.mark_dirty(leaf)
+            finally:
+                self.store.release()
+            if i == start:
+                deleted += self.remove(keys[i])
+                i += 1
+        if self.lazy_delete and self.lazy_deletes >= self.vacuum_threshold:
+            self.vacuum()
+        elif self.lazy_delete and deleted:
+            self.write_lazy_deletes()
+        return deleted
+
+    # Remove the keys with a tombstone from the three, returns the number of removed keys.
+    def vacuum(self) -> int:
+        keys = []
+        leaf_page = None
+        while True:
+            try:
+                # All keys are unsigned, so the leaf of key 0 is the first leaf
+                leaf = self.find_leaf(0) if leaf_page is None else self.store.get(leaf_page)
+                keys.extend(key for key, record_id in zip(leaf.keys, leaf.children) if record_id == TOMBSTONE)
+                leaf_page = leaf.next_leaf
+            finally:
+                self.store.release()
+            if leaf_page is None:
+                break
+        for key in keys:
+            self.remove(key)
+        if self.lazy_deletes:
+            self.lazy_deletes = 0
+            self.write_lazy_deletes()
+        return len(keys)
+
+    # Stores the number of lazy deletes on the meta page, so a reloaded three is vacuumed after the same number of lazy
+    # deletes in total.
+    def write_lazy_deletes(self):
+        try:
+            meta = self.store.get(self.meta_page, exclusive=True)
+            meta.lazy_deletes = self.lazy_deletes
+            self.store.mark_dirty(meta)
+        finally:
+            self.store.release()
+
+    # Delete a key from its leaf, then borrow keys from a sibling or merge with a sibling for every node on the path
+    # that holds less than half of its capacity. Returns True if the key was found.
+    def remove(self, key) -> bool:
+        try:
+            path = self.find_path(key, True, lambda node: len(node.keys) > self.capacity(node) // 2)
+            if not path[-1].delete(key):
+                return False
+            self.store.mark_dirty(path[-1])
+
+            for depth in range(len(path) - 1, 0, -1):
+                node, parent = path[depth], path[depth - 1]
+                if len(node.keys) >= self.capacity(node) // 2:
+                    return True
+                index = parent.find_child_index(key)
+                left = self.store.get(parent.children[index - 1]) if index > 0 else None
+                right = self.store.get(parent.children[index + 1]) if index + 1 < len(parent.children) else None
+                if left is not None and len(left.keys) > self.capacity(left) // 2:
+                    self.borrow_from_left(parent, index, left, node)
+                    return True
+                if right is not None and len(right.keys) > self.capacity(right) // 2:
+                    self.borrow_from_right(parent, index, node, right)
+                    return True
+                if left is not None:
+                    self.merge(parent, index - 1, left, node)
+                else:
+                    self.merge(parent, index, node, right)
+
+            # The root is an internal node with one child left, that child becomes the root
+            root = path[0]
+            if not root.is_leaf and not root.keys:
+                meta = self.meta
+                meta.root = root.children[0]
+                self.store.mark_dirty(meta)
+                self.store.free(root)
+            return True
+        finally:
+            self.store.release()
 
-    # Insert key and page number to the node, handle leaf node split if needed.
-    def insert(self, key, page_number):
-        if self.is_leaf:
-            self.keys = list(self.keys)
-            self.children = list(self.children)
+    # Move the last key of the left sibling to the node, the child is at the given index of the parent.
+    def borrow_from_left(self, parent, index: int, left, node):
+        if node.is_leaf:
+            node.keys.insert(0, left.keys.pop())
+            node.children.insert(0, left.children.pop())
+            parent.keys[index - 1] = node.keys[0]
+        else:
+            # The separator moves down to the node, the last key of the sibling moves up
+            node.keys.insert(0, parent.keys[index - 1])
+            node.children.insert(0, left.children.pop())
+            parent.keys[index - 1] = left.keys.pop()
+        for changed in (parent, left, node):
+            self.store.mark_dirty(changed)
 
-            self.keys.append(key)
-            self.children.append(page_number)
-            self.sort_node()
+    # Move the first key of the right sibling to the node, the child is at the given index of the parent.
+    def borrow_from_right(self, parent, index: int, node, right):
+        if node.is_leaf:
+            node.keys.append(right.keys.pop(0))
+            node.children.append(right.children.pop(0))
+            parent.keys[index] = right.keys[0]
+        else:
+            node.keys.append(parent.keys[index])
+            node.children.append(right.children.pop(0))
+            parent.keys[index] = right.keys.pop(0)
+        for changed in (parent, node, right):
+            self.store.mark_dirty(changed)
 
-            if len(self.keys) > PAGE_SIZE // LENGTH_SIZE:
-                return self.split()
+    # Merge the right node into the left node, they are separated by the key at the given index of the parent.
+    def merge(self, parent, index: int, left, right):
+        if left.is_leaf:
+            left.next_leaf = right.next_leaf
         else:
-            # If not a leaf, find the appropriate child and recursively insert.
-            index = self.find_child_index(key)
-            child = self.children[index]
-            new_child = child.insert(key, page_number)
+            left.keys.append(parent.keys[index])
+        left.keys.extend(right.keys)
+        left.children.extend(right.children)
+        del parent.keys[index]
+        del parent.children[index + 1]
+        self.store.mark_dirty(left)
+        self.store.mark_dirty(parent)
+        self.store.free(right)
+
+    # Build the three bottom-up from (key, record id) pairs sorted on key, instead of inserting them one by one.
+    def bulk_load(self, items, fill_factor: float = 1.0) -> int:
+        """
+        Fill the leaves from left to right, link them, and build each internal level on the level below it. The three
+        has to be empty.
+
+        :param items: (key, record id) pairs, sorted on key without duplicates
+        :param fill_factor: Fraction of the node capacity that is filled, leaves room for later inserts
+        :return: The number of keys loaded
+        """
+        if not 0 < fill_factor <= 1:
+            raise ValueError('The fill factor must be between 0 and 1!')
+        if not self.is_empty():
+            raise ValueError('Only an empty index can be bulk loaded!')
+        # A three with only tombstones left is emptied first, so the first leaf is the empty root
+        self.vacuum()
+        leaf_size = max(1, int(self.leaf_capacity * fill_factor))
+        fan_out = max(2, int(self.internal_capacity * fill_factor) + 1)
+
+        try:
+            # (first key, page number) of the nodes of the level that is being built
+            level = []
+            keys, children = [], []
+            count = 0
+            last_key = None
+            for key, record_id in items:
+                if last_key is not None and key <= last_key:
+                    raise ValueError('Keys must be sorted without duplicates to bulk load the index!')
+                keys.append(key)
+                children.append(record_id)
+                last_key = key
+                count += 1
+                if len(keys) == leaf_size:
+                    self.add_leaf(level, keys, children)
+                    keys, children = [], []
+            if keys:
+                self.add_leaf(level, keys, children)
+
+            while len(level) > 1:
+                # Spread the children evenly over the parents, so the last parent is not almost empty
+                parent_count = -(-len(level) // fan_out)
+                parents = []
+                for i in range(parent_count):
+                    group = level[i * len(level) // parent_count:(i + 1) * len(level) // parent_count]
+                    node = self.store.new(
+                        BPlusTreeInternalNode(array(self.key_typecode, [key for key, _ in group[1:]]),
+                                              [page for _, page in group]))
+                    parents.append((group[0][0], node.page_number))
+                    self.store.release()
+                level = parents
+
+            if level and level[0][1] != self.meta.root:
+                meta = self.meta
+                meta.root = level[0][1]
+                self.store.mark_dirty(meta)
+            return count
+        finally:
+            self.store.release()
+
+    # Add the next leaf of a bulk load to the level and link the previous leaf to it. The first leaf reuses the empty
+    # root.
+    def add_leaf(self, level: list, keys: list, children: list):
+        if level:
+            node = self.store.new(BPlusTreeNode(array(self.key_typecode, keys), children))
+            previous = self.store.get(level[-1][1])
+            previous.next_leaf = node.page_number
+            self.store.mark_dirty(previous)
+        else:
+            node = self.root
+            node.keys, node.children = array(self.key_typecode, keys), children
+            self.store.mark_dirty(node)
+        level.append((keys[0], node.page_number))
+        self.store.release()
+
+    # Returns the maximum number of keys in the node
+    def capacity(self, node) -> int:
+        return self.leaf_capacity if node.is_leaf else self.internal_capacity
+
+    # Returns the number of levels of the three, 1 if the root is a leaf
+    def height(self) -> int:
+        try:
+            node, height = self.root, 1
+            while not node.is_leaf:
+                node, height = self.store.get(node.children[0]), height + 1
+            return height
+        finally:
+            self.store.release()
+
+    # Returns the most pages an operation on the three keeps pinned at once
+    def pinned_pages(self) -> int:
+        return max_pinned_pages(self.leaf_capacity, self.internal_capacity)
+
+    # Checks if the three holds no keys, keys with a tombstone do not count. Only the leaves up to the first key without
+    # a tombstone are read.
+    def is_empty(self) -> bool:
+        return next(self.range_search(0, (1 << 8 * self.store.key_size) - 1), None) is None
 
-            self.keys = list(self.keys)
-            self.children = list(self.children)
-            self.children[index] = new_child
+    # Find the leaf node the key belongs to, latched exclusive to change it.
+    def find_leaf(self, key, exclusive: bool = False):
+        if self.store.concurrent:
+            return self.find_path(key, exclusive)[-1]
+        node = self.root
+        while not node.is_leaf:
+            node = self.store.get(node.children[node.find_child_index(key)])
+        return node
 
-            if len(new_child.keys) > PAGE_SIZE // LENGTH_SIZE:
-                return self.split_child(index)
+    # Find the leaf node the key belongs to, latched exclusive to change it, with the smallest key that belongs to the
+    # leaves after it (None for the last leaf).
+    def find_leaf_bound(self, key, exclusive: bool = False) -> tuple:
+        meta = self.store.get(self.meta_page, exclusive)
+        node, bound = self.store.get(meta.root, exclusive), None
+        self.store.unlatch([meta])
+        while not node.is_leaf:
+            index = node.find_child_index(key)
+            if index < len(node.keys):
+                bound = node.keys[index]  # The bound of a lower node is never larger
+            child = self.store.get(node.children[index], exclusive)
+            self.store.unlatch([node])
+            node = child
+        return node, bound
 
-        return self
+    # Find the nodes from the root to the leaf the key belongs to, that an insert or delete may change.
+    def find_path(self, key, exclusive: bool = False, safe=None) -> list:
+        """
+        The nodes are latched top-down (latch crabbing): a child is latched before its parent is released. To read, the
+        parent is released right away. To change the three, the ancestors of a node stay latched exclusive until the
+        node is safe: it can take the change without a split or merge reaching its parent. Only the nodes below the
+        last safe node are returned, the meta page stays latched as long as the root may change.
 
-    #  Split a leaf node.
-    def split(self):
-        new_node = BPlusTreeNode()
+        :param key: Key to search for
+        :param exclusive: Latch the nodes exclusive, to change them
+        :param safe: Test of a node that is safe for the change, every node is safe if not given
+        :return: The latched nodes from the last safe node to the leaf
+        """
+        if not self.store.concurrent:
+            node = self.root
+            path = [node]
+            while not node.is_leaf:
+                node = self.store.get(node.children[node.find_child_index(key)])
+                path.append(node)
+            return path
+
+        meta = self.store.get(self.meta_page, exclusive)
+        node = self.store.get(meta.root, exclusive)
+        held, path = [meta], [node]
+        while True:
+            if safe is None or safe(node):
+                self.store.unlatch(held)
+                held, path = [], [node]
+            if node.is_leaf:
+                return path
+            held.append(node)
+            node = self.store.get(node.children[node.find_child_index(key)], exclusive)
+            path.append(node)
+
+
+# * The BPlusTreeNode and BPlusTreeInternalNode classes represent the nodes in the B+ tree. The BPlusTreeNode class
+# is used for leaf nodes, while the BPlusTreeInternalNode class is used for internal nodes. The keys are kept sorted in
+# a compact array and are searched with a binary search.
+class BPlusTreeNode:
+    __slots__ = ('keys', 'children', 'is_leaf', 'next_leaf', 'page_number')
+
+    # Initialize a leaf node, children are the record ids of the keys. Keys given as an array are kept as they are.
+    def __init__(self, keys=None, children: list = None):
+        self.keys = keys if isinstance(keys, array) else array(KEY_TYPECODE, [] if keys is None else keys)
+        self.children = [] if children is None else children
+        self.is_leaf = True
+        self.next_leaf = None
+        self.page_number = None
+
+    # Checks if the node holds more keys than its capacity
+    def is_overflowing(self, capacity: int):
+        return len(self.keys) > capacity
+
+    # Insert key and record id to the leaf node at its sorted position, or replace the record id if the key already
+    # exists.
+    def insert(self, key, record_id):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            self.children[index] = record_id
+            return
+        self.keys.insert(index, key)
+        self.children.insert(index, record_id)
+
+    # Delete a key and its record id from the leaf node.
+    def delete(self, key) -> bool:
+        index = self.find_key_index(key)
+        if index == -1:
+            return False
+        del self.keys[index]
+        del self.children[index]
+        return True
+
+    #  Split a leaf node, returns the separator key for the parent and the new right node.
+    def split(self, store):
         split_index = len(self.keys) // 2
-        new_node.keys = self.keys[split_index:]
-        new_node.children = self.children[split_index:]
+        new_node = BPlusTreeNode(self.keys[split_index:], self.children[split_index:])
         self.keys = self.keys[:split_index]
         self.children = self.children[:split_index]
+        store.new(new_node)
         # Here we use some pointers
         new_node.next_leaf = self.next_leaf
-        self.next_leaf = new_node
-        return BPlusTreeInternalNode([new_node.keys[0]], [self, new_node])
-
-    # Split a child node.
-    def split_child(self, child_index):
-        # It is called upon at the insert module
-        new_node = BPlusTreeNode()
-        split_index = len(self.children[child_index].keys) // 2
-        new_node.keys = self.children[child_index].keys[split_index:]
-        new_node.children = self.children[child_index].children[split_index:]
-        self.children[child_index].keys = self.children[child_index].keys[:split_index]
-        self.children[child_index].children = self.children[child_index].children[:split_index]
-        # The new node has to be inserted into the parent
-        self.keys.insert(child_index, new_node.keys[0])
-        self.children.insert(child_index + 1, new_node)
-        return self
-
-    # Search for a key in leaf nodes.
+        self.next_leaf = new_node.page_number
+        store.mark_dirty(self)
+        return new_node.keys[0], new_node
+
+    # Search for a key in the leaf node.
     def search(self, key):
-        if self.is_leaf:
-            index = self.find_key_index(key)
-            if index != -1:
-                return self.children[index]
-            else:
-                return None
-        else:  # If not a leaf, recursively search in the appropriate child.
-            "We search the node and dive deeper and search the child"
-            index = self.find_child_index(key)
-            return self.children[index].search(key)
+        index = self.find_key_index(key)
+        if index != -1:
+            return self.children[index]
+        else:
+            return None
 
-    # Find the index of a key in the node.
+    # Find the index of a key in the node, -1 if the node does not hold the key.
     def find_key_index(self, key):
-        for i, node_key in enumerate(self.keys):
-            if key == node_key:
-                return i
-            elif key < node_key:
-                return -1
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
         return -1
 
-    # Find the index of the child to dive deeper into.
+    # Find the index of the child to dive deeper into, the first child whose keys are all smaller than the next key.
     def find_child_index(self, key):
-        "Which child do we need to dive deeper into"
-        for i, node_key in enumerate(self.keys):
-            if key < node_key:
-                return i
-        return len(self.children) - 1
+        return bisect.bisect_right(self.keys, key)
+
+    # Returns the node serialized into a page
+    @property
+    def data(self) -> bytearray:
+        data = bytearray(PAGE_SIZE)
+        offset = self.write_keys(data, LEAF_NODE)
+        for page_number, slot_id in self.children:
+            data[offset:offset + PAGE_NUM_SIZE] = page_number.to_bytes(PAGE_NUM_SIZE, 'little')
+            data[offset + PAGE_NUM_SIZE:offset + RECORD_ID_SIZE] = slot_id.to_bytes(SLOT_ID_SIZE, 'little')
+            offset += RECORD_ID_SIZE
+        return data
+
+    # Writes the (node type, number of keys, next leaf) header and the keys, returns the offset after the keys
+    def write_keys(self, data: bytearray, node_type: int) -> int:
+        next_leaf = 0 if self.next_leaf is None else self.next_leaf
+        data[0:NODE_HEADER_SIZE] = bytearray(
+            node_type.to_bytes(NODE_TYPE_SIZE, 'little') + len(self.keys).to_bytes(NUMBER_SLOTS_SIZE, 'little') +
+            next_leaf.to_bytes(PAGE_NUM_SIZE, 'little'))
+        keys = self.keys
+        if sys.byteorder == 'big':
+            keys = array(keys.typecode, keys)
+            keys.byteswap()
+        data[NODE_HEADER_SIZE:NODE_HEADER_SIZE + len(keys) * keys.itemsize] = keys.tobytes()
+        return NODE_HEADER_SIZE + len(keys) * keys.itemsize
 
-    # Sort keys and children in the node.
-    def sort_node(self):
-        combined = sorted(zip(self.keys, self.children), key=lambda x: x[0])
-        self.keys, self.children = zip(*combined)
+    # Reads a node (leaf, internal or meta) with keys of the given array type from the data of its page
+    @staticmethod
+    def from_data(data: bytearray, key_typecode: str = KEY_TYPECODE):
+        node_type = data[0]
+        if node_type == META_NODE:
+            offset = NODE_TYPE_SIZE + PAGE_NUM_SIZE
+            capacities = data[offset:offset + 2 * NUMBER_SLOTS_SIZE]
+            offset += 2 * NUMBER_SLOTS_SIZE
+            return BPlusTreeMeta(int.from_bytes(data[NODE_TYPE_SIZE:NODE_TYPE_SIZE + PAGE_NUM_SIZE], 'little'),
+                                 int.from_bytes(capacities[:NUMBER_SLOTS_SIZE], 'little'),
+                                 int.from_bytes(capacities[NUMBER_SLOTS_SIZE:], 'little'),
+                                 int.from_bytes(data[offset:offset + LAZY_DELETES_SIZE], 'little'))
 
-        if not self.is_leaf:
-            for child in self.children:
-                child.sort_node()
+        key_count = int.from_bytes(data[NODE_TYPE_SIZE:NODE_TYPE_SIZE + NUMBER_SLOTS_SIZE], 'little')
+        next_leaf = int.from_bytes(data[NODE_TYPE_SIZE + NUMBER_SLOTS_SIZE:NODE_HEADER_SIZE], 'little')
+        keys = array(key_typecode)
+        offset = NODE_HEADER_SIZE + key_count * keys.itemsize
+        keys.frombytes(data[NODE_HEADER_SIZE:offset])
+        if sys.byteorder == 'big':
+            keys.byteswap()
+
+        children = []
+        if node_type == LEAF_NODE:
+            for _ in range(key_count):
+                children.append((int.from_bytes(data[offset:offset + PAGE_NUM_SIZE], 'little'),
+                                 int.from_bytes(data[offset + PAGE_NUM_SIZE:offset + RECORD_ID_SIZE], 'little')))
+                offset += RECORD_ID_SIZE
+            node = BPlusTreeNode(keys, children)
+            node.next_leaf = next_leaf if next_leaf != 0 else None
+            return node
+
+        for _ in range(key_count + 1):
+            children.append(int.from_bytes(data[offset:offset + PAGE_NUM_SIZE], 'little'))
+            offset += PAGE_NUM_SIZE
+        return BPlusTreeInternalNode(keys, children)
 
 
 # * The BPlusTreeNode and BPlusTreeInternalNode classes represent the nodes in the B+ tree. The BPlusTreeNode class
 # is used for leaf nodes, while the BPlusTreeInternalNode class is used for internal nodes.
 class BPlusTreeInternalNode(BPlusTreeNode):
-    # Initialize an internal node with keys and children.
+    __slots__ = ()
+
+    # Initialize an internal node with keys and the page numbers of its children.
     def __init__(self, keys, children):
-        super().__init__()
-        self.keys = keys
-        self.children = children
+        super().__init__(keys, children)
         self.is_leaf = False
 
-    # Insert key and page number, handle child node split if needed.
-    def insert(self, key, page_number):
-        index = self.find_child_index(key)
-        self.children[index] = self.children[index].insert(key, page_number)
-        "If the child is full we split again"
-        if len(self.children[index].keys) > PAGE_SIZE // LENGTH_SIZE:
-            return self.split_child(index)
-
-        return self
-
-    # Split a child node for internal nodes.
-    def split_child(self, child_index):
-        "Code to split the child"
-        new_node = BPlusTreeInternalNode([], [])
-        split_index = len(self.children[child_index].keys) // 2
-        new_node.keys = self.children[child_index].keys[split_index:]
-        new_node.children = self.children[child_index].children[split_index:]
-        self.children[child_index].keys = self.children[child_index].keys[:split_index]
-        self.children[child_index].children = self.children[child_index].children[:split_index]
-        "The newly created node has to be added to the parent level"
-        self.keys.insert(child_index, new_node.keys[0])
-        self.children.insert(child_index + 1, new_node)
-
-        return self
+    # Insert the separator key and the page number of the new right child after a child split.
+    def insert_child(self, separator, page_number):
+        index = self.find_child_index(separator)
+        self.keys.insert(index, separator)
+        self.children.insert(index + 1, page_number)
+
+    # Split an internal node, the middle key moves up to the parent.
+    def split(self, store):
+        "Code to split the node"
+        split_index = len(self.keys) // 2
+        separator = self.keys[split_index]
+        new_node = BPlusTreeInternalNode(self.keys[split_index + 1:], self.children[split_index + 1:])
+        self.keys = self.keys[:split_index]
+        self.children = self.children[:split_index + 1]
+        store.new(new_node)
+        store.mark_dirty(self)
+        return separator, new_node
+
+    # Returns the node serialized into a page
+    @property
+    def data(self) -> bytearray:
+        data = bytearray(PAGE_SIZE)
+        offset = self.write_keys(data, INTERNAL_NODE)
+        for page_number in self.children:
+            data[offset:offset + PAGE_NUM_SIZE] = page_number.to_bytes(PAGE_NUM_SIZE, 'little')
+            offset += PAGE_NUM_SIZE
+        return data
+
+
+# * The BPlusTreeMeta class represents the meta page of a B+ tree, which points to the current root node and holds the
+# capacity of the leaves and internal nodes (0 if unknown) and the number of lazy deletes since the last vacuum.
+class BPlusTreeMeta:
+    __slots__ = ('root', 'leaf_capacity', 'internal_capacity', 'lazy_deletes', 'page_number')
+
+    # Initialize the meta page with the page number of the root node, the node capacities and the lazy deletes.
+    def __init__(self, root: Optional[int] = None, leaf_capacity: int = 0, internal_capacity: int = 0,
+                 lazy_deletes: int = 0):
+        self.root = root
+        self.leaf_capacity = leaf_capacity
+        self.internal_capacity = internal_capacity
+        self.lazy_deletes = lazy_deletes
+        self.page_number = None
+
+    # Returns the meta page serialized into a page
+    @property
+    def data(self) -> bytearray:
+        data = bytearray(PAGE_SIZE)
+        data[0:NODE_TYPE_SIZE + PAGE_NUM_SIZE + 2 * NUMBER_SLOTS_SIZE + LAZY_DELETES_SIZE] = bytearray(
+            META_NODE.to_bytes(NODE_TYPE_SIZE, 'little') + self.root.to_bytes(PAGE_NUM_SIZE, 'little') +
+            self.leaf_capacity.to_bytes(NUMBER_SLOTS_SIZE, 'little') +
+            self.internal_capacity.to_bytes(NUMBER_SLOTS_SIZE, 'little') +
+            self.lazy_deletes.to_bytes(LAZY_DELETES_SIZE, 'little'))
+        return data
+
+
+# * The NodeStore class keeps the nodes of an in-memory B+ tree. Page numbers are only used as node identifiers, the
+# page size only limits the capacity of the nodes.
+class NodeStore:
+    # Initialize an empty store for nodes with keys of key_size bytes.
+    def __init__(self, page_size: int = PAGE_SIZE, key_size: int = KEY_SIZE):
+        self.page_size = page_size
+        self.key_size = key_size
+        self.concurrent = False  # Whether nodes are latched, so several threads can use the three
+        self.nodes = {}
+        self.next_page_number = 0
+
+    # Returns the node with the given page number, latched exclusive to change it.
+    def get(self, page_number, exclusive: bool = False):
+        return self.nodes[page_number]
+
+    # Releases the latches of nodes before the end of an operation, nothing to do for nodes that are not latched.
+    def unlatch(self, nodes: list):
+        pass
+
+    # Adds a new node to the store and gives it a page number.
+    def new(self, node):
+        node.page_number = self.allocate_page()
+        self.nodes[node.page_number] = node
+        self.mark_dirty(node)
+        return node
+
+    # Removes a node that is no longer part of the three.
+    def free(self, node):
+        del self.nodes[node.page_number]
+
+    # Returns a page number for a new node.
+    def allocate_page(self) -> int:
+        self.next_page_number += 1
+        return self.next_page_number
+
+    # Marks a node as changed, nothing to do for nodes that only live in memory.
+    def mark_dirty(self, node):
+        pass
+
+    # Releases the nodes used by an operation, nothing to do for nodes that only live in memory.
+    def release(self):
+        pass
+
+
+# * The Operation class keeps the pages an operation on a PageNodeStore has pinned, latched (with whether they are
+# latched exclusive) and freed. A ThreadOperation keeps them for each thread apart.
+class Operation:
+    # Initialize an operation that holds no pages
+    def __init__(self):
+        self.pinned = []
+        self.latched = {}
+        self.freed = []
+
+
+class ThreadOperation(Operation, threading.local):
+    pass
+
+
+# * The PageNodeStore class keeps the nodes of a B+ tree on pages of the heap file, through its buffer pool. The nodes
+# used by an operation stay pinned until they are released. The pages of removed nodes are reused for new nodes while
+# the file is open. With a concurrent buffer pool the nodes are also latched, every thread keeps track of its own
+# operation.
+class PageNodeStore(NodeStore):
+    # Initialize the store on a heap file, which hands out the pages for new nodes.
+    def __init__(self, heap_file, key_size: int = KEY_SIZE):
+        super().__init__(key_size=key_size)
+        self.heap_file = heap_file
+        self.buffer_pool = heap_file.buffer_pool
+        self.concurrent = self.buffer_pool.concurrent
+        # Pinned, latched and freed pages of the current operation, of each thread if the store is concurrent
+        self.operation = ThreadOperation() if self.concurrent else Operation()
+        self.free_pages = []  # Pages of removed nodes that can be reused
+        self.free_pages_mutex = threading.Lock()
+
+    # Returns the node with the given page number, reading it from the file if not in the buffer pool. A node that is
+    # already latched by the operation is not latched again.
+    def get(self, page_number, exclusive: bool = False):
+        node = self.buffer_pool.fetch(page_number, self.read_node)
+        node.page_number = page_number
+        operation = self.operation
+        operation.pinned.append(page_number)
+        if self.concurrent and page_number not in operation.latched:
+            self.buffer_pool.latch(page_number).acquire(exclusive)
+            operation.latched[page_number] = exclusive
+        return node
+
+    # Releases the latches of nodes before the end of the operation, they stay pinned.
+    def unlatch(self, nodes: list):
+        if not self.concurrent:
+            return
+        latched = self.operation.latched
+        for node in nodes:
+            exclusive = latched.pop(node.page_number, None)
+            if exclusive is not None:
+                self.buffer_pool.latch(node.page_number).release(exclusive)
+
+    # Reads a node from the data of its page.
+    def read_node(self, data: bytearray):
+        return BPlusTreeNode.from_data(data, KEY_TYPECODES[self.key_size])
+
+    # Adds a new node on the page of a removed node, or on a page reserved in the page directories of the heap file.
+    def new(self, node):
+        with self.free_pages_mutex:
+            page_number = self.free_pages.pop() if self.free_pages else None
+        node.page_number = self.heap_file.allocate_page() if page_number is None else page_number
+        self.buffer_pool.new(node.page_number, node)
+        self.operation.pinned.append(node.page_number)
+        return node
+
+    # Marks a node as changed, so it is written back to the file.
+    def mark_dirty(self, node):
+        self.buffer_pool.mark_dirty(node.page_number)
+
+    # Removes a node that is no longer part of the three, its page can be reused once the node is unpinned.
+    def free(self, node):
+        self.operation.freed.append(node.page_number)
+
+    # Unlatches and unpins the nodes used by an operation.
+    def release(self):
+        operation = self.operation
+        if operation.latched:
+            for page_number, exclusive in operation.latched.items():
+                self.buffer_pool.latch(page_number).release(exclusive)
+            operation.latched.clear()
+        for page_number in operation.pinned:
+            self.buffer_pool.unpin(page_number)
+        operation.pinned.clear()
+        if operation.freed:
+            with self.free_pages_mutex:
+                self.free_pages.extend(operation.freed)
+            operation.freed.clear()
@@ -0,0 +1,320 @@
+# * Imports
+from src.main.utils.constants import *
+from src.main.database.lock_manager import ReadWriteLatch
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+import threading
+
+
+# * The Frame class holds a page in the buffer pool, together with its pin count and dirty bit.
+class Frame:
+    # Initialization of a Frame for the given page (any object with a data attribute of PAGE_SIZE bytes)
+    def __init__(self, page):
+        self.page = page
+        self.pin_count = 0
+        self.dirty = False
+        self.logged = False  # Committed to the write-ahead log, but not written to the file yet
+        self.latch = None  # Read/write latch of the page in a concurrent pool, created when it is first latched
+        self.referenced = True  # Reference bit of the CLOCK policy
+
+
+# * The BufferPool class keeps a bounded number of pages in memory. Every page access goes through the pool, which
+# reads pages on a miss and evicts an unpinned page when the pool is full, writing it back first if it is dirty.
+class BufferPool:
+    # Initialization of a BufferPool with the functions to read and write pages and a capacity in pages
+    def __init__(self, read_page, write_pages, capacity: int = CACHE_SIZE, policy: str = 'lru', read_pages=None,
+                 log_undo=None):
+        """
+        :param read_page: Function that reads the data of a page number from the file
+        :param write_pages: Function that writes a list of (page number, data) pairs to the file
+        :param capacity: Maximum number of pages kept in memory
+        :param policy: Eviction policy, 'lru' or 'clock'
+        :param read_pages: Function that reads (first page number, count) consecutive pages in one read, optional
+        :param log_undo: Function called with the page numbers of uncommitted pages before they are written, optional
+        """
+        if capacity < 1:
+            raise ValueError('The buffer pool needs room for at least one page!')
+        self.read_page = read_page
+        self.write_pages = write_pages
+        self.read_pages = read_pages
+        self.log_undo = log_undo
+        self.capacity = capacity
+        self.frames = {}  # Page number -> Frame
+        # Pages written to the file with uncommitted changes (after logging their undo image), the next commit logs
+        # their current image so it does not depend on these unsynced writes nor on older committed images in the log
+        self.written = set()
+        self.concurrent = False  # Whether several threads can use the pool
+        if policy == 'lru':
+            self.replacer = LRUReplacer()
+        elif policy == 'clock':
+            self.replacer = ClockReplacer()
+        else:
+            raise ValueError(f"Unknown eviction policy {policy}")
+
+    # Returns the page with the given page number pinned, reading it with the factory (e.g. Page) on a miss
+    def fetch(self, page_number: int, factory):
+        frame = self.frames.get(page_number)
+        if frame is None:
+            self.make_room()
+            frame = Frame(factory(self.read_page(page_number)))
+            self.frames[page_number] = frame
+        frame.pin_count += 1
+        self.replacer.access(page_number, frame)
+        return frame.page
+
+    # Reads the pages that are not in the pool yet ahead of their use, consecutive pages in one read. The pages are not
+    # pinned.
+    def prefetch(self, page_numbers: list, factory):
+        missing = sorted(set(page_number for page_number in page_numbers if page_number not in self.frames))
+        start = 0
+        while start < len(missing):
+            end = start + 1
+            while end < len(missing) and missing[end] == missing[end - 1] + 1:
+                end += 1
+            if self.read_pages is None:
+                pages = [self.read_page(page_number) for page_number in missing[start:end]]
+            else:
+                pages = self.read_pages(missing[start], end - start)
+            for page_number, data in zip(missing[start:end], pages):
+                self.make_room()
+                frame = Frame(factory(data))
+                self.frames[page_number] = frame
+                self.replacer.access(page_number, frame)
+            start = end
+
+    # Adds a new page to the pool, it is pinned and dirty since it is not in the file yet
+    def new(self, page_number: int, page):
+        self.make_room()
+        frame = Frame(page)
+        frame.pin_count = 1
+        frame.dirty = True
+        self.frames[page_number] = frame
+        self.replacer.access(page_number, frame)
+        return page
+
+    # Releases one pin on a page, optionally marking it dirty
+    def unpin(self, page_number: int, dirty: bool = False):
+        frame = self.frames[page_number]
+        if frame.pin_count <= 0:
+            raise ValueError(f"Page {page_number} is not pinned!")
+        frame.pin_count -= 1
+        frame.dirty |= dirty
+
+    # Marks a page as changed, it has to be in the pool (pinned)
+    def mark_dirty(self, page_number: int):
+        self.frames[page_number].dirty = True
+
+    # Pins a page for the duration of a with block. In a concurrent pool the page is also latched if latch is given:
+    # shared (False) to read it or exclusive (True) to change it.
+    @contextmanager
+    def pin(self, page_number: int, factory, latch: Optional[bool] = None):
+        page = self.fetch(page_number, factory)
+        try:
+            if latch is None or not self.concurrent:
+                yield page
+            else:
+                with self.latch(page_number).hold(latch):
+                    yield page
+        finally:
+            self.unpin(page_number)
+
+    # Checks if a page is in the pool
+    def contains(self, page_number: int) -> bool:
+        return page_number in self.frames
+
+    # Evicts a page if the pool is full
+    def make_room(self):
+        if len(self.frames) < self.capacity:
+            return
+        page_number = self.replacer.victim(self.frames)
+        if page_number is None:
+            raise RuntimeError('Buffer pool is full, all pages are pinned!')
+        frame = self.frames.pop(page_number)
+        if frame.dirty and self.log_undo is not None:
+            self.log_undo([page_number])
+            self.written.add(page_number)
+        if frame.dirty or frame.logged:
+            self.write_pages([(page_number, frame.page.data)])
+
+    # Writes the dirty pages (and the pages committed to the log) back to the file in one call of write_pages and
+    # returns its result, the pages stay in the pool
+    def flush(self):
+        dirty = sorted(page_number for page_number, frame in self.frames.items() if frame.dirty or frame.logged)
+        if self.log_undo is not None:
+            uncommitted = [page_number for page_number in dirty if self.frames[page_number].dirty]
+            if uncommitted:
+                self.log_undo(uncommitted)
+                self.written.update(uncommitted)
+        result = self.write_pages([(page_number, self.frames[page_number].page.data) for page_number in dirty])
+        for page_number in dirty:
+            self.frames[page_number].dirty = self.frames[page_number].logged = False
+        return result
+
+    # Returns the (page number, data) of the pages changed since the last commit, for the write-ahead log: the dirty
+    # pages and the pages that were written with uncommitted changes, read from the file if they left the pool. The
+    # pages in the pool are marked as logged instead of dirty, they are written to the file on eviction or on the next
+    # flush.
+    def commit(self) -> list:
+        changed = sorted(self.written.union(page_number for page_number, frame in self.frames.items() if frame.dirty))
+        pages = []
+        for page_number in changed:
+            frame = self.frames.get(page_number)
+            if frame is None:
+                pages.append((page_number, self.read_page(page_number)))
+                continue
+            pages.append((page_number, frame.page.data))
+            frame.dirty = False
+            frame.logged = True
+        self.written.clear()
+        return pages
+
+
+# * The ConcurrentBufferPool class is a buffer pool that can be used by several threads. The frames are guarded by a
+# mutex and the content of a pinned page by the latch of its frame; a page stays in the pool while it is pinned, so its
+# latch does too. A page is read on a miss without holding the mutex, threads that miss the same page meanwhile wait
+# for that one read. A flush writes the pages without holding the mutex either, so pages are fetched while it writes.
+class ConcurrentBufferPool(BufferPool):
+    # Initialization of a ConcurrentBufferPool with the arguments of a BufferPool
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrent = True
+        self.mutex = threading.RLock()
+        self.reading = {}  # Page number -> event set once the page that is being read is in the pool
+        self.reads = 0  # Number of pages read on a miss
+
+    def fetch(self, page_number: int, factory):
+        while True:
+            with self.mutex:
+                frame = self.frames.get(page_number)
+                if frame is not None:
+                    frame.pin_count += 1
+                    self.replacer.access(page_number, frame)
+                    return frame.page
+                read = self.reading.get(page_number)
+                if read is None:
+                    read = self.reading[page_number] = threading.Event()
+                    self.reads += 1
+                    break
+            # Another thread reads the page, it is in the pool once the read is done (unless it failed)
+            read.wait()
+
+        try:
+            page = factory(self.read_page(page_number))
+            with self.mutex:
+                frame = self.frames.get(page_number)
+                if frame is None:
+                    self.make_room()
+                    frame = self.frames[page_number] = Frame(page)
+                frame.pin_count += 1
+                self.replacer.access(page_number, frame)
+                return frame.page
+        finally:
+            with self.mutex:
+                del self.reading[page_number]
+            read.set()
+
+    def prefetch(self, page_numbers: list, factory):
+        with self.mutex:
+            super().prefetch([page_number for page_number in page_numbers if page_number not in self.reading], factory)
+
+    def new(self, page_number: int, page):
+        with self.mutex:
+            return super().new(page_number, page)
+
+    def unpin(self, page_number: int, dirty: bool = False):
+        with self.mutex:
+            super().unpin(page_number, dirty)
+
+    def mark_dirty(self, page_number: int):
+        with self.mutex:
+            super().mark_dirty(page_number)
+
+    # Writes the dirty pages like a BufferPool, the pages stay pinned while they are written. The pages must not change
+    # meanwhile, the heap file holds its operation latch exclusive.
+    def flush(self):
+        with self.mutex:
+            dirty = sorted(page_number for page_number, frame in self.frames.items() if frame.dirty or frame.logged)
+            frames = [self.frames[page_number] for page_number in dirty]
+            for frame in frames:
+                frame.pin_count += 1
+        try:
+            if self.log_undo is not None:
+                uncommitted = [page_number for page_number, frame in zip(dirty, frames) if frame.dirty]
+                if uncommitted:
+                    self.log_undo(uncommitted)
+                    with self.mutex:
+                        self.written.update(uncommitted)
+            result = self.write_pages([(page_number, frame.page.data) for page_number, frame in zip(dirty, frames)])
+            for frame in frames:
+                frame.dirty = frame.logged = False
+            return result
+        finally:
+            with self.mutex:
+                for frame in frames:
+                    frame.pin_count -= 1
+
+    def commit(self) -> list:
+        with self.mutex:
+            return super().commit()
+
+    # Returns the latch of a pinned page
+    def latch(self, page_number: int) -> ReadWriteLatch:
+        with self.mutex:
+            frame = self.frames[page_number]
+            if frame.latch is None:
+                frame.latch = ReadWriteLatch()
+            return frame.latch
+
+
+# * The LRUReplacer class chooses the least recently used unpinned page as victim.
+class LRUReplacer:
+    # Initialization of an empty LRU list
+    def __init__(self):
+        self.order = OrderedDict()
+
+    # Moves a page to the most recently used end
+    def access(self, page_number: int, frame: Frame):
+        self.order[page_number] = None
+        self.order.move_to_end(page_number)
+
+    # Returns (and forgets) the least recently used unpinned page, or None if all pages are pinned
+    def victim(self, frames: dict) -> Optional[int]:
+        for page_number in self.order:
+            if frames[page_number].pin_count == 0:
+                del self.order[page_number]
+                return page_number
+        return None
+
+
+# * The ClockReplacer class approximates LRU: the hand sweeps over the pages and evicts the first unpinned page
+# without its reference bit set, clearing the bits it passes.
+class ClockReplacer:
+    # Initialization of an empty clock
+    def __init__(self):
+        self.ring = []
+        self.in_ring = set()
+        self.hand = 0
+
+    # Sets the reference bit of a page, adding it to the clock if it is new
+    def access(self, page_number: int, frame: Frame):
+        if page_number not in self.in_ring:
+            self.in_ring.add(page_number)
+            self.ring.append(page_number)
+        frame.referenced = True
+
+    # Returns (and forgets) the victim page, or None if all pages are pinned
+    def victim(self, frames: dict) -> Optional[int]:
+        # Two sweeps clear all reference bits, after that only pinned pages can be left
+        for _ in range(2 * len(self.ring)):
+            self.hand %= len(self.ring)
+            page_number = self.ring[self.hand]
+            frame = frames[page_number]
+            if frame.pin_count == 0:
+                if not frame.referenced:
+                    self.ring.pop(self.hand)
+                    self.in_ring.discard(page_number)
+                    return page_number
+                frame.referenced = False
+            self.hand += 1
+        return None
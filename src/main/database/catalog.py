@@ -0,0 +1,41 @@
+# * Imports
+from src.main.database.page import Page
+import src.main.utils.utils as utils
+from typing import Optional
+
+# (name, page number) of a catalog entry
+CATALOG_SCHEMA = ['var_str', 'int']
+
+
+# * The Catalog class is a page that remembers where the structures of the database (like the primary key index) are
+# stored. Each record maps a name to a page number.
+class Catalog(Page):
+    # Initialization of a Catalog instance with optional existing data
+    def __init__(self, data: bytearray = None):
+        super().__init__(data)
+        self.entries = {}
+        for slot_id, (offset, length) in enumerate(self.page_footer.slot_dir):
+            if length != 0:
+                name, page_number = utils.decode_record(self.data[offset:offset + length], CATALOG_SCHEMA)
+                self.entries[name] = (slot_id, page_number)
+
+    # Returns the page number stored under the given name, or None if there is no such entry
+    def get(self, name: str) -> Optional[int]:
+        if name not in self.entries:
+            return None
+        return self.entries[name][1]
+
+    # Returns the names of the entries that start with the given prefix
+    def names(self, prefix: str = '') -> list:
+        return [name for name in self.entries if name.startswith(prefix)]
+
+    # Stores a page number under the given name, overwriting an existing entry
+    def set(self, name: str, page_number: int):
+        record = utils.encode_record([name, page_number], CATALOG_SCHEMA)
+        if name in self.entries:
+            slot_id = self.update_record(self.entries[name][0], record)
+        else:
+            slot_id = self.insert_record(record)
+        if slot_id is None:
+            raise ValueError('Catalog page is full!')
+        self.entries[name] = (slot_id, page_number)
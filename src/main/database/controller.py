@@ -1,7 +1,9 @@
 # * Imports
 from src.main.database.heap_file import HeapFile
+from src.main.database.parallel_query import ParallelQuery
 from src.main.utils import utils
-from typing import List
+from src.main.utils.constants import CACHE_SIZE
+from typing import Callable, Dict, List
 
 # TODO Make schema a initialized attribute of the controller class instead of with Insert. Otherwise data from
 #  different schemas will be in one file.
@@ -9,10 +11,25 @@ from typing import List
 # * The Controller class acts as an interface for interacting with the database. It provides methods for inserting,
 # updating, reading, and deleting records.
 class Controller:
-    # Initialize the Controller with a HeapFile instance for file manipulation.
-    def __init__(self, filepath):
-        self.schema = None
-        self.heap_file = HeapFile(filepath)
+    # Initialize the Controller with a HeapFile instance for file manipulation, which keeps at most cache_size pages in
+    # memory and evicts them with the given policy ('lru' or 'clock'). With use_mmap the file is memory-mapped. The
+    # index_fan_out sets the maximum number of children of the index nodes of a new file. The index_type of a new file
+    # is 'btree', or 'hash' for a hash index that only serves point lookups fast. With column_names the fields of the
+    # schema can be referred to by name. The compaction policy ('eager', 'lazy' or 'threshold') sets when a page
+    # reclaims the space of deleted records. With wal a commit is written to a write-ahead log, which makes it atomic
+    # and durable. A concurrent controller can be shared by several threads. With compression ('zlib' or 'lzma') the
+    # full data pages can be compressed (compress). The layout of the data pages of a new file is 'nsm' (slotted pages)
+    # or 'pax', which stores the records of a page by column so a scan only reads the fields it needs; a PAX file needs
+    # the schema of its records, which it keeps. With lazy_delete the B+ tree index replaces deleted ids by tombstones,
+    # which are removed in batches.
+    def __init__(self, filepath, cache_size: int = CACHE_SIZE, eviction_policy: str = 'lru', use_mmap: bool = False,
+                 index_fan_out: int = None, column_names: List[str] = None, index_type: str = 'btree',
+                 compaction: str = 'eager', wal: bool = False, concurrent: bool = False, compression: str = None,
+                 layout: str = 'nsm', schema: List[str] = None, lazy_delete: bool = False):
+        self.column_names = column_names
+        self.heap_file = HeapFile(filepath, cache_size, eviction_policy, use_mmap, index_fan_out, index_type,
+                                  compaction, wal, concurrent, compression, layout, schema, lazy_delete)
+        self.schema = self.heap_file.schema
         self.filepath = filepath
 
     # Insert a record into the heap file by encoding the data using the provided schema.
@@ -20,23 +37,141 @@ class Controller:
         self.schema = schema  # ! Wat als er verschillende schemas worden gebruikt?
         self.heap_file.insert_record(utils.encode_record(data, schema))
 
+    # Insert many records at once: the records that fit on a page are stored on it together and the index is updated
+    # in one pass in order of the ids.
+    def insert_many(self, data, schema: List[str]):
+        self.schema = schema
+        codec = utils.compile_schema(tuple(schema))
+        self.heap_file.insert_many([codec.encode(row) for row in data])
+
+    # Load many records sorted on their id at once, by packing them into new pages and building the index bottom-up.
+    # Returns the number of records loaded.
+    def bulk_load(self, data, schema: List[str], fill_factor: float = 1.0) -> int:
+        self.schema = schema
+        return self.heap_file.bulk_load((utils.encode_record(row, schema) for row in data), fill_factor)
+
     # Update a record identified by the given id by encoding the new data and id using their respective schemas.
     def update(self, id_: int, data, schema: List[str]):
         self.heap_file.update_record(utils.encode_record([id_], ['int']), utils.encode_record(data, schema))
 
+    # Update many records at once, every record replaces the record with its id (the first field). The records are
+    # changed page by page and every page is compacted and updates its free space once. Returns the number of updated
+    # records.
+    def update_many(self, data, schema: List[str]) -> int:
+        codec = utils.compile_schema(tuple(schema))
+        return self.heap_file.update_many([codec.encode(row) for row in data])
+
     # Read a record identified by the given id by encoding the id using its schema.
     def read(self, id_: int):
         byte_id = utils.encode_record([id_], ['int'])
         return utils.decode_record(self.heap_file.read_record(byte_id), self.schema)  # ! Hier decode aan toegevoegd
 
+    # Read many records by their id at once, in the order of the ids. The ids are looked up in one sorted pass over the
+    # index and every page is read once, in page order. An id that is not found gives None instead of a record.
+    def read_many(self, ids: List[int], schema: List[str] = None) -> list:
+        codec = utils.compile_schema(tuple(self.schema if schema is None else schema))
+        return [None if record is None else codec.decode(record) for record in self.heap_file.read_many(list(ids))]
+
+    # Iterate over all records in the order they are stored in the file. The predicate maps field indices to a test of
+    # the field value, only records that pass all tests are returned, and only the fields in columns if given. Fields
+    # are decoded only when they are needed. On PAX pages only the minipages of the tested and returned fields are read.
+    def scan(self, schema: List[str], predicate: Dict[int, Callable] = None, columns: List[int] = None):
+        codec = utils.compile_schema(tuple(schema))
+        tested = list(predicate) if predicate else []
+        tests = [predicate[field] for field in tested]
+        if self.heap_file.layout == 'pax':
+            yield from self.scan_columns(len(schema), tested, tests, columns)
+            return
+        for page in self.heap_file.data_pages():
+            data = page.data
+            for offset, length in page.page_footer.slot_dir:
+                if length == 0:
+                    continue  # Deleted record
+                if tests and not all(test(value) for test, value in
+                                     zip(tests, codec.decode_fields(data, tested, offset))):
+                    continue
+                yield codec.decode(data, offset) if columns is None else codec.decode_fields(data, columns, offset)
+
+    # Iterates over the records of a PAX file like scan, reading the needed fields of a page column by column
+    def scan_columns(self, field_count: int, tested: List[int], tests: List[Callable], columns: List[int] = None):
+        returned = list(range(field_count)) if columns is None else columns
+        fields = sorted(set(tested) | set(returned)) or [0]
+        for page in self.heap_file.data_pages():
+            values = dict(zip(fields, page.read_columns(fields)))
+            rows = range(len(values[fields[0]]))
+            for test, field in zip(tests, tested):
+                rows = [row for row in rows if test(values[field][row])]
+            selected = [values[field] for field in returned]
+            yield from [tuple(column[row] for column in selected) for row in rows]
+
+    # Read all records at once into columns: a NumPy array per int, short or byte field and a StringColumn per var_str
+    # field, in the order of the schema.
+    def read_columns(self, schema: List[str] = None) -> list:
+        return utils.decode_pages(self.heap_file.data_pages(), self.schema if schema is None else schema)
+
+    # Iterate over the records with an id between lo and hi (both included), in order of their id.
+    def range(self, lo: int, hi: int, schema: List[str]):
+        codec = utils.compile_schema(tuple(schema))
+        for record in self.heap_file.read_range(lo, hi):
+            yield codec.decode(record)
+
+    # Returns the index in the schema of a field given by its name or index.
+    def column_index(self, column) -> int:
+        if isinstance(column, int):
+            return column
+        if self.column_names is None or column not in self.column_names:
+            raise ValueError(f"Column {column} is not known!")
+        return self.column_names.index(column)
+
+    # Create a secondary index on a field (by name or index in the schema), which is kept up to date on every insert,
+    # update and delete. Values do not have to be unique. Returns the number of records in the index.
+    def create_index(self, column, schema: List[str]) -> int:
+        self.schema = schema
+        return self.heap_file.create_index(self.column_index(column), schema)
+
+    # Find the records of which a field (by name or index in the schema) has the given value, using its secondary index.
+    def find_by(self, column, value, schema: List[str] = None) -> list:
+        codec = utils.compile_schema(tuple(self.schema if schema is None else schema))
+        return [codec.decode(record) for record in self.heap_file.find_by(self.column_index(column), value)]
+
+    # Aggregate all records in parallel worker processes (by default one per core). The aggregates are (function,
+    # column) pairs with a function of 'count', 'sum', 'min' or 'max', the filters are (column, operator, value) tuples
+    # with an operator of '==', '!=', '<', '<=', '>' or '>='. Columns are names or indices in the schema. Returns a
+    # tuple of the aggregates, or a dict from every value of the group_by field to such a tuple. The workers read the
+    # file, so the changes made so far are written to it first: an aggregate commits them like commit does (with a
+    # write-ahead log by a checkpoint), they are not undone after a crash.
+    def aggregate(self, aggregates: list, filters: list = None, group_by=None, schema: List[str] = None,
+                  workers: int = None):
+        aggregates = [(function, None if column is None else self.column_index(column))
+                      for function, column in aggregates]
+        filters = [(self.column_index(column), op, value) for column, op, value in filters or []]
+        group_by = None if group_by is None else self.column_index(group_by)
+        return ParallelQuery(self.heap_file, workers).aggregate(self.schema if schema is None else schema, aggregates,
+                                                                filters, group_by)
+
+    # Delete the records with the given ids at once, page by page like update_many. Returns the number of deleted
+    # records, ids that are not found are skipped.
+    def delete_many(self, ids: List[int]) -> int:
+        return self.heap_file.delete_many(list(ids))
+
     # Find the record in the heap file using the encoded id, and delete it if found.
     def delete(self, id_: int):
-        (page, slot_id) = self.heap_file.find_record(utils.encode_record([id_], ['int']))
-        if page is None:  # Print a message if the record is not found.
-            print('Record not found!')
-            return
-        page.delete_record(slot_id)
+        if not self.heap_file.delete_record(utils.encode_record([id_], ['int'])):
+            print('Record not found!')  # Print a message if the record is not found.
+
+    # Compact all pages with space of deleted records left, once per page. Returns the number of compacted pages.
+    def vacuum(self) -> int:
+        return self.heap_file.vacuum()
 
-    # Close the heap file, committing any changes made.
+    # Compress the full data pages of a file with compression, which are decompressed again when they are read. Returns
+    # the number of pages that were emptied and are reused for new records.
+    def compress(self) -> int:
+        return self.heap_file.compress()
+
+    # Close the heap file, committing any changes made. Returns the number of pages and bytes that were written.
     def commit(self):
-        self.heap_file.close()
+        return self.heap_file.close()
+
+    # Commit any changes made and close the database file.
+    def close(self):
+        return self.heap_file.close_file()
@@ -0,0 +1,126 @@
+# * Imports
+from src.main.utils.constants import *
+from typing import NamedTuple
+import mmap
+import os
+import threading
+
+
+# * The FlushStats class reports how many pages and bytes were written by a flush, in how many sequential writes.
+class FlushStats(NamedTuple):
+    pages: int
+    bytes: int
+    writes: int
+
+
+# * The DiskManager class does all page I/O of a database file through one file handle that stays open for the
+# lifetime of the database. Optionally the file is memory-mapped, so reading a page returns a read-only memoryview
+# over the mapped file instead of a copy. Pages are written through the file handle, never through the mapping. The
+# handle is used by one thread at a time, so pages can be read and written from several threads.
+class DiskManager:
+    # Opens (or creates) the database file, and maps it if use_mmap is set. A read-only file is opened for reading
+    # only, e.g. by the worker processes of a parallel query.
+    def __init__(self, file_path: str, use_mmap: bool = False, read_only: bool = False):
+        self.file_path = file_path
+        if read_only:
+            self.file = open(file_path, 'rb')
+        else:
+            self.file = open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b')
+        self.use_mmap = use_mmap
+        self.lock = threading.RLock()  # Guards the position of the file handle and the mapping
+        self.map = None
+        self.old_maps = []  # Mappings of a smaller file that pages still referred to when the file was mapped again
+
+    # Returns the size of the file in bytes
+    def size(self) -> int:
+        return os.fstat(self.file.fileno()).st_size
+
+    # Checks if the file holds no pages yet
+    def is_empty(self) -> bool:
+        return self.size() == 0
+
+    # Reads a page, as a memoryview over the mapped file or as a bytearray. Pages after the end of the file are empty.
+    def read_page(self, page_number: int):
+        with self.lock:
+            start = page_number * PAGE_SIZE
+            if self.use_mmap:
+                if self.map is None or start + PAGE_SIZE > len(self.map):
+                    self.remap()
+                if self.map is not None and start + PAGE_SIZE <= len(self.map):
+                    return memoryview(self.map)[start:start + PAGE_SIZE]
+                return bytearray(PAGE_SIZE)
+
+            data = bytearray(PAGE_SIZE)
+            self.file.seek(start)
+            self.file.readinto(data)
+            return data
+
+    # Reads count consecutive pages starting at the first page number in one read and returns their data
+    def read_pages(self, first: int, count: int) -> list:
+        with self.lock:
+            start = first * PAGE_SIZE
+            if self.use_mmap:
+                if self.map is None or start + count * PAGE_SIZE > len(self.map):
+                    self.remap()
+                if self.map is not None and start + count * PAGE_SIZE <= len(self.map):
+                    view = memoryview(self.map)
+                    return [view[start + i * PAGE_SIZE:start + (i + 1) * PAGE_SIZE] for i in range(count)]
+                return [self.read_page(first + i) for i in range(count)]
+
+            data = bytearray(count * PAGE_SIZE)
+            self.file.seek(start)
+            self.file.readinto(data)
+            return [data[i * PAGE_SIZE:(i + 1) * PAGE_SIZE] for i in range(count)]
+
+    # Maps the file again after it has grown. An old mapping stays open as long as pages refer to it, the old mappings
+    # that no page refers to anymore are closed.
+    def remap(self):
+        size = self.size()
+        if size == 0 or (self.map is not None and len(self.map) == size):
+            return
+        if self.map is not None:
+            self.old_maps.append(self.map)
+        self.old_maps = [old_map for old_map in self.old_maps if not self.release(old_map)]
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+
+    # Closes a mapping if no page refers to it anymore, returns whether it was closed
+    @staticmethod
+    def release(old_map: mmap.mmap) -> bool:
+        try:
+            old_map.close()
+        except BufferError:
+            return False  # Still referenced by a page
+        return True
+
+    # Writes the given (page number, data) pairs to the file. Pages with consecutive page numbers are written together
+    # in one sequential write.
+    def write_pages(self, pages: list) -> FlushStats:
+        with self.lock:
+            pages = sorted(pages, key=lambda page: page[0])
+            writes = 0
+            start = 0
+            while start < len(pages):
+                end = start + 1
+                while end < len(pages) and pages[end][0] == pages[end - 1][0] + 1:
+                    end += 1
+                self.file.seek(pages[start][0] * PAGE_SIZE)
+                self.file.write(b''.join(data for _, data in pages[start:end]))
+                writes += 1
+                start = end
+            # Make the written pages visible to the mapping
+            self.file.flush()
+            return FlushStats(len(pages), sum(len(data) for _, data in pages), writes)
+
+    # Syncs the written pages to the disk
+    def sync(self):
+        with self.lock:
+            self.file.flush()
+        os.fsync(self.file.fileno())
+
+    # Closes the mappings and the file handle
+    def close(self):
+        for old_map in self.old_maps + ([self.map] if self.map is not None else []):
+            self.release(old_map)  # A mapping still referenced by a page is released once no page refers to it
+        self.map = None
+        self.old_maps = []
+        self.file.close()
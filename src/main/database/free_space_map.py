@@ -0,0 +1,120 @@
+# * Imports
+from src.main.utils.constants import *
+from typing import Optional
+import struct
+
+# Number of pages of which a page of the free space map holds the free space, after the next page number
+FSM_PAGE_ENTRIES = (PAGE_SIZE - PAGE_NUM_SIZE) // FSM_ENTRY_SIZE
+FSM_BUCKETS = PAGE_SIZE // FSM_BUCKET_SIZE
+FSM_ENTRIES_FORMAT = struct.Struct(f'<{FSM_PAGE_ENTRIES}H')
+
+
+# * The FreeSpaceMap class finds a data page with enough free space for a record in constant time. In memory the data
+# pages with free space are kept in buckets per free space class of FSM_BUCKET_SIZE bytes, with a bit mask of the
+# buckets that are not empty. The free space of every page is also stored on a chain of map pages in the heap file,
+# the n-th map page holds the free space of the pages n * FSM_PAGE_ENTRIES up to (n + 1) * FSM_PAGE_ENTRIES.
+class FreeSpaceMap:
+    # Initialize an empty map with one map page, or load an existing map from its first page
+    def __init__(self, heap_file, first_page: int = None):
+        self.heap_file = heap_file
+        self.buffer_pool = heap_file.buffer_pool
+        self.free = {}  # Page number -> free space, of the data pages that have free space
+        self.buckets = [set() for _ in range(FSM_BUCKETS)]
+        self.mask = 0  # Bit i is set if bucket i is not empty
+        self.pages = []  # Page numbers of the map pages, in the order of the chain
+        if first_page is None:
+            self.add_page()
+            return
+
+        page_number = first_page
+        while page_number != 0:
+            self.pages.append(page_number)
+            with self.buffer_pool.pin(page_number, FreeSpaceMapPage) as page:
+                first = (len(self.pages) - 1) * FSM_PAGE_ENTRIES
+                for i, free_space in enumerate(page.entries):
+                    if free_space > 0:
+                        self.add(first + i, free_space)
+                page_number = page.next_page
+
+    # Returns the page number of the first map page, stored in the catalog
+    @property
+    def first_page(self) -> int:
+        return self.pages[0]
+
+    # Returns a data page with at least the needed free space, or None if there is no such page
+    def find(self, needed_space: int) -> Optional[int]:
+        # Every page in bucket i has at least i * FSM_BUCKET_SIZE bytes free, take the smallest bucket that fits
+        first_bucket = -(-needed_space // FSM_BUCKET_SIZE)
+        mask = self.mask >> first_bucket
+        if mask == 0:
+            return None
+        bucket = first_bucket + (mask & -mask).bit_length() - 1
+        return next(iter(self.buckets[bucket]))
+
+    # Returns the free space of a data page, 0 if it is full or not a data page
+    def free_space(self, page_number: int) -> int:
+        return self.free.get(page_number, 0)
+
+    # Sets the free space of a data page, in memory and on its map page
+    def update(self, page_number: int, free_space: int):
+        if self.free_space(page_number) == free_space:
+            return
+        self.remove(page_number)
+        if free_space > 0:
+            self.add(page_number, free_space)
+
+        index, entry = divmod(page_number, FSM_PAGE_ENTRIES)
+        while index >= len(self.pages):
+            self.add_page()
+        with self.buffer_pool.pin(self.pages[index], FreeSpaceMapPage) as page:
+            page.entries[entry] = free_space
+            self.buffer_pool.mark_dirty(self.pages[index])
+
+    # Adds a data page to the bucket of its free space
+    def add(self, page_number: int, free_space: int):
+        bucket = free_space // FSM_BUCKET_SIZE
+        self.free[page_number] = free_space
+        self.buckets[bucket].add(page_number)
+        self.mask |= 1 << bucket
+
+    # Removes a data page from its bucket
+    def remove(self, page_number: int):
+        free_space = self.free.pop(page_number, None)
+        if free_space is None:
+            return
+        bucket = free_space // FSM_BUCKET_SIZE
+        self.buckets[bucket].discard(page_number)
+        if not self.buckets[bucket]:
+            self.mask &= ~(1 << bucket)
+
+    # Adds a map page at the end of the chain
+    def add_page(self):
+        page_number = self.heap_file.allocate_page()
+        self.buffer_pool.new(page_number, FreeSpaceMapPage())
+        self.buffer_pool.unpin(page_number)
+        if self.pages:
+            with self.buffer_pool.pin(self.pages[-1], FreeSpaceMapPage) as page:
+                page.next_page = page_number
+                self.buffer_pool.mark_dirty(self.pages[-1])
+        self.pages.append(page_number)
+
+
+# * The FreeSpaceMapPage class is a page of the free space map: the page number of the next map page, followed by the
+# free space of FSM_PAGE_ENTRIES consecutive pages.
+class FreeSpaceMapPage:
+    # Initialization of a map page with optional existing data
+    def __init__(self, data: bytearray = None):
+        if data is None:
+            self.next_page = 0
+            self.entries = [0] * FSM_PAGE_ENTRIES
+        else:
+            self.next_page = int.from_bytes(data[:PAGE_NUM_SIZE], 'little')
+            self.entries = list(FSM_ENTRIES_FORMAT.unpack_from(data, PAGE_NUM_SIZE))
+
+    # Returns the map page serialized into a page
+    @property
+    def data(self) -> bytearray:
+        data = bytearray(PAGE_SIZE)
+        data[:PAGE_NUM_SIZE] = self.next_page.to_bytes(PAGE_NUM_SIZE, 'little')
+        FSM_ENTRIES_FORMAT.pack_into(data, PAGE_NUM_SIZE, *self.entries)
+        return data
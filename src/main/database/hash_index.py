@@ -0,0 +1,369 @@
+# * Imports
+from src.main.utils.constants import *
+from contextlib import nullcontext
+from typing import Optional
+import struct
+import threading
+
+# Bucket page: next overflow page and number of entries, then the keys, page numbers and slot ids of the record ids
+BUCKET_HEADER_SIZE = PAGE_NUM_SIZE + NUMBER_SLOTS_SIZE
+BUCKET_ENTRY_SIZE = KEY_SIZE + 4 + SLOT_ID_SIZE
+BUCKET_CAPACITY = (PAGE_SIZE - BUCKET_HEADER_SIZE) // BUCKET_ENTRY_SIZE
+BUCKET_KEYS_OFFSET = BUCKET_HEADER_SIZE
+BUCKET_PAGES_OFFSET = BUCKET_KEYS_OFFSET + BUCKET_CAPACITY * KEY_SIZE
+BUCKET_SLOTS_OFFSET = BUCKET_PAGES_OFFSET + BUCKET_CAPACITY * 4
+# Directory page: next directory page, level, split pointer and number of keys, then the page numbers of the buckets
+DIRECTORY_HEADER = struct.Struct('<BII')
+DIRECTORY_HEADER_SIZE = PAGE_NUM_SIZE + DIRECTORY_HEADER.size
+DIRECTORY_ENTRIES = (PAGE_SIZE - DIRECTORY_HEADER_SIZE) // 4
+DIRECTORY_ENTRIES_FORMAT = struct.Struct(f'<{DIRECTORY_ENTRIES}I')
+# Pages an operation on the index keeps pinned at once: a bucket page and the overflow page that is added to it
+HASH_PINNED_PAGES = 2
+# Catalog name of the first emptied overflow page, the others are chained through their next page
+FREE_PAGES_ENTRY = 'primary_hash_free_pages'
+
+
+# Spreads the bits of a 32-bit key over the low bits that select a bucket
+def hash_key(key: int) -> int:
+    key = ((key >> 16) ^ key) * 0x45d9f3b & 0xFFFFFFFF
+    key = ((key >> 16) ^ key) * 0x45d9f3b & 0xFFFFFFFF
+    return (key >> 16) ^ key
+
+
+# * The HashIndex class maps the id of a record to its record id (page number, slot id) with linear hashing, as an
+# alternative to the B+ tree for point lookups. A lookup reads the directory entry of one bucket (kept in memory) and
+# the bucket page, plus its overflow pages if it has any. When the index is fuller than HASH_LOAD_FACTOR one bucket is
+# split: the bucket at the split pointer is divided over itself and a new bucket, so the index grows one bucket at a
+# time instead of being rehashed at once. The page numbers of the buckets are stored on a chain of directory pages,
+# the first of which (the meta page) also holds the level, the split pointer and the number of keys. On a concurrent
+# buffer pool the operations are serialized by a mutex, a split moves entries between buckets any thread may read.
+class HashIndex:
+    # Initialize an empty index with one bucket, or load an existing index from its meta page
+    def __init__(self, heap_file, meta_page: int = None):
+        self.heap_file = heap_file
+        self.buffer_pool = heap_file.buffer_pool
+        self.level = 0  # Number of bits of the hash that selects a bucket before the split pointer
+        self.split = 0  # Next bucket to split
+        self.count = 0  # Number of keys in the index
+        self.buckets = []  # Page numbers of the buckets
+        self.directory = []  # Page numbers of the directory pages, in the order of the chain
+        # Overflow pages that were emptied and are reused for new pages, the last one is first in the chain on the pages
+        self.free_pages = []
+        self.mutex = threading.RLock() if self.buffer_pool.concurrent else nullcontext()
+        if meta_page is None:
+            self.add_directory_page()
+            self.add_bucket()
+            self.write_meta()
+            return
+
+        page_number = meta_page
+        while page_number != 0:
+            self.directory.append(page_number)
+            with self.buffer_pool.pin(page_number, HashDirectoryPage) as page:
+                if len(self.directory) == 1:
+                    self.level, self.split, self.count = page.level, page.split, page.count
+                page_number = page.next_page
+                entries = page.entries
+            self.buckets.extend(entries[:(1 << self.level) + self.split - len(self.buckets)])
+
+        page_number = heap_file.catalog.get(FREE_PAGES_ENTRY) or 0
+        while page_number != 0:
+            self.free_pages.append(page_number)
+            with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                page_number = page.next_page
+        self.free_pages.reverse()
+
+    # Returns the page number of the meta page of the index, stored in the catalog
+    @property
+    def meta_page(self) -> int:
+        return self.directory[0]
+
+    # Returns the bucket of a key
+    def bucket(self, key: int) -> int:
+        hashed = hash_key(key)
+        bucket = hashed & ((1 << self.level) - 1)
+        if bucket < self.split:
+            bucket = hashed & ((1 << (self.level + 1)) - 1)
+        return bucket
+
+    # Returns the record id of a key, or None if the key is not in the index
+    def search(self, key: int) -> Optional[tuple]:
+        with self.mutex:
+            page_number = self.buckets[self.bucket(key)]
+            while page_number != 0:
+                with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                    record_id = page.entries.get(key)
+                    page_number = page.next_page
+                if record_id is not None:
+                    return record_id
+            return None
+
+    # Returns a dict from every key that is in the index to its record id, each key is one lookup
+    def search_many(self, keys) -> dict:
+        found = {}
+        with self.mutex:
+            for key in set(keys):
+                record_id = self.search(key)
+                if record_id is not None:
+                    found[key] = record_id
+        return found
+
+    # Inserts a key with its record id, or replaces the record id of a key that is in the index. Splits one bucket if
+    # the index is full.
+    def insert(self, key: int, record_id: tuple):
+        self.insert_many([(key, record_id)])
+
+    # Inserts many (key, record id) pairs like insert, the meta page is written once
+    def insert_many(self, items):
+        with self.mutex:
+            count = self.count
+            for key, record_id in items:
+                page_number = self.buckets[self.bucket(key)]
+                if self.replace(page_number, key, record_id):
+                    continue
+                self.add_entry(page_number, key, record_id)
+                self.count += 1
+                if self.count > HASH_LOAD_FACTOR * BUCKET_CAPACITY * len(self.buckets):
+                    self.split_bucket()
+            if self.count != count:
+                self.write_meta()
+
+    # Deletes a key, returns False if the key is not in the index. Emptied overflow pages are unlinked from their
+    # bucket, buckets are not merged.
+    def delete(self, key: int) -> bool:
+        return self.delete_many([key]) == 1
+
+    # Deletes many keys like delete, the meta page is written once. Returns the number of deleted keys.
+    def delete_many(self, keys) -> int:
+        with self.mutex:
+            count = self.count
+            for key in set(keys):
+                previous, page_number = None, self.buckets[self.bucket(key)]
+                while page_number != 0:
+                    with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                        if page.entries.pop(key, None) is not None:
+                            self.buffer_pool.mark_dirty(page_number)
+                            if not page.entries and previous is not None:
+                                self.unlink(previous, page.next_page)
+                                self.free_page(page_number, page)
+                            self.count -= 1
+                            break
+                        previous, page_number = page_number, page.next_page
+            if self.count != count:
+                self.write_meta()
+            return count - self.count
+
+    # Iterates over the (key, record id) pairs with lo <= key <= hi in order of their key. A hash index keeps no order,
+    # so all buckets are read.
+    def range_search(self, lo: int, hi: int):
+        items = []
+        with self.mutex:
+            for page_number in self.buckets:
+                for key, record_id in self.bucket_entries(page_number):
+                    if lo <= key <= hi:
+                        items.append((key, record_id))
+        items.sort()
+        yield from items
+
+    # Inserts the (key, record id) pairs into an empty index, the number of buckets is first grown to fit them. Returns
+    # the number of keys inserted.
+    def bulk_load(self, items, fill_factor: float = 1.0) -> int:
+        if not self.is_empty():
+            raise ValueError('Bulk loading needs an empty index!')
+        items = list(items)
+        with self.mutex:
+            while len(items) > fill_factor * HASH_LOAD_FACTOR * BUCKET_CAPACITY * len(self.buckets):
+                self.split_bucket()
+            for key, record_id in items:
+                self.add_entry(self.buckets[self.bucket(key)], key, record_id)
+            self.count = len(items)
+            self.write_meta()
+            return self.count
+
+    # Returns the number of page reads of a lookup without overflow pages, the directory is kept in memory
+    def height(self) -> int:
+        return 1
+
+    # Returns the most pages an operation on the index keeps pinned at once
+    def pinned_pages(self) -> int:
+        return HASH_PINNED_PAGES
+
+    # Checks if the index has no keys
+    def is_empty(self) -> bool:
+        return self.count == 0
+
+    # Returns the (key, record id) pairs of a bucket and its overflow pages
+    def bucket_entries(self, page_number: int) -> list:
+        entries = []
+        while page_number != 0:
+            with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                entries.extend(page.entries.items())
+                page_number = page.next_page
+        return entries
+
+    # Replaces the record id of a key in a bucket, returns False if the key is not in the bucket
+    def replace(self, page_number: int, key: int, record_id: tuple) -> bool:
+        while page_number != 0:
+            with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                if key in page.entries:
+                    page.entries[key] = record_id
+                    self.buffer_pool.mark_dirty(page_number)
+                    return True
+                page_number = page.next_page
+        return False
+
+    # Adds an entry to the first page of a bucket with room, or to a new overflow page at the end of the bucket
+    def add_entry(self, page_number: int, key: int, record_id: tuple):
+        while True:
+            with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                if len(page.entries) < BUCKET_CAPACITY:
+                    page.entries[key] = record_id
+                    self.buffer_pool.mark_dirty(page_number)
+                    return
+                if page.next_page == 0:
+                    page.next_page = self.new_page()
+                    self.buffer_pool.mark_dirty(page_number)
+                page_number = page.next_page
+
+    # Splits the bucket at the split pointer over itself and a new bucket, with one more bit of the hash
+    def split_bucket(self):
+        old_bucket = self.split
+        new_bucket = old_bucket + (1 << self.level)
+        mask = (1 << (self.level + 1)) - 1
+        page_number = self.buckets[old_bucket]
+        entries = self.bucket_entries(page_number)
+
+        # Empty the old bucket, its overflow pages are reused for the new entries
+        with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+            overflow = page.next_page
+            page.entries, page.next_page = {}, 0
+            self.buffer_pool.mark_dirty(page_number)
+        while overflow != 0:
+            with self.buffer_pool.pin(overflow, HashBucketPage) as page:
+                next_page = page.next_page
+                self.free_page(overflow, page)
+            overflow = next_page
+        self.add_bucket()
+
+        self.split += 1
+        if self.split == 1 << self.level:
+            self.level, self.split = self.level + 1, 0
+        for key, record_id in entries:
+            bucket = new_bucket if hash_key(key) & mask == new_bucket else old_bucket
+            self.add_entry(self.buckets[bucket], key, record_id)
+
+    # Removes an emptied overflow page from the chain of its bucket, the page before it gets the next page
+    def unlink(self, previous: int, next_page: int):
+        with self.buffer_pool.pin(previous, HashBucketPage) as page:
+            page.next_page = next_page
+            self.buffer_pool.mark_dirty(previous)
+
+    # Adds an overflow page that left its bucket, pinned as page, to the free pages. It is emptied and chained to the
+    # free page before it, so the free pages are found again after a reopen.
+    def free_page(self, page_number: int, page):
+        page.entries, page.next_page = {}, self.free_pages[-1] if self.free_pages else 0
+        self.buffer_pool.mark_dirty(page_number)
+        self.free_pages.append(page_number)
+        self.write_free_pages()
+
+    # Stores the first free page of the chain in the catalog, 0 if there is none
+    def write_free_pages(self):
+        with self.heap_file.space_lock:
+            self.heap_file.catalog.set(FREE_PAGES_ENTRY, self.free_pages[-1] if self.free_pages else 0)
+            self.buffer_pool.mark_dirty(self.heap_file.catalog_page)
+
+    # Returns the page number of a new empty bucket page, on an emptied overflow page if there is one
+    def new_page(self) -> int:
+        if self.free_pages:
+            page_number = self.free_pages.pop()
+            with self.buffer_pool.pin(page_number, HashBucketPage) as page:
+                page.entries, page.next_page = {}, 0
+                self.buffer_pool.mark_dirty(page_number)
+            self.write_free_pages()
+            return page_number
+        page_number = self.heap_file.allocate_page()
+        self.buffer_pool.new(page_number, HashBucketPage())
+        self.buffer_pool.unpin(page_number)
+        return page_number
+
+    # Adds a bucket at the end and stores its page number in the directory
+    def add_bucket(self):
+        page_number = self.new_page()
+        index, entry = divmod(len(self.buckets), DIRECTORY_ENTRIES)
+        while index >= len(self.directory):
+            self.add_directory_page()
+        with self.buffer_pool.pin(self.directory[index], HashDirectoryPage) as page:
+            page.entries[entry] = page_number
+            self.buffer_pool.mark_dirty(self.directory[index])
+        self.buckets.append(page_number)
+
+    # Adds a directory page at the end of the chain
+    def add_directory_page(self):
+        page_number = self.heap_file.allocate_page()
+        self.buffer_pool.new(page_number, HashDirectoryPage())
+        self.buffer_pool.unpin(page_number, dirty=True)
+        if self.directory:
+            with self.buffer_pool.pin(self.directory[-1], HashDirectoryPage) as page:
+                page.next_page = page_number
+                self.buffer_pool.mark_dirty(self.directory[-1])
+        self.directory.append(page_number)
+
+    # Stores the level, split pointer and number of keys on the meta page
+    def write_meta(self):
+        with self.buffer_pool.pin(self.meta_page, HashDirectoryPage) as page:
+            page.level, page.split, page.count = self.level, self.split, self.count
+            self.buffer_pool.mark_dirty(self.meta_page)
+
+
+# * The HashBucketPage class is a page of a bucket: the page number of the next overflow page and the number of
+# entries, followed by the keys, the page numbers and the slot ids of the record ids, each in an array of
+# BUCKET_CAPACITY entries. In memory the entries are kept in a dict from key to record id.
+class HashBucketPage:
+    # Initialization of a bucket page with optional existing data
+    def __init__(self, data: bytearray = None):
+        if data is None:
+            self.next_page = 0
+            self.entries = {}
+            return
+        self.next_page = int.from_bytes(data[:PAGE_NUM_SIZE], 'little')
+        count = int.from_bytes(data[PAGE_NUM_SIZE:BUCKET_HEADER_SIZE], 'little')
+        self.entries = dict(zip(struct.unpack_from(f'<{count}I', data, BUCKET_KEYS_OFFSET),
+                                zip(struct.unpack_from(f'<{count}I', data, BUCKET_PAGES_OFFSET),
+                                    struct.unpack_from(f'<{count}H', data, BUCKET_SLOTS_OFFSET))))
+
+    # Returns the bucket page serialized into a page
+    @property
+    def data(self) -> bytearray:
+        count = len(self.entries)
+        data = bytearray(PAGE_SIZE)
+        data[:PAGE_NUM_SIZE] = self.next_page.to_bytes(PAGE_NUM_SIZE, 'little')
+        data[PAGE_NUM_SIZE:BUCKET_HEADER_SIZE] = count.to_bytes(NUMBER_SLOTS_SIZE, 'little')
+        struct.pack_into(f'<{count}I', data, BUCKET_KEYS_OFFSET, *self.entries)
+        struct.pack_into(f'<{count}I', data, BUCKET_PAGES_OFFSET, *(page for page, _ in self.entries.values()))
+        struct.pack_into(f'<{count}H', data, BUCKET_SLOTS_OFFSET, *(slot for _, slot in self.entries.values()))
+        return data
+
+
+# * The HashDirectoryPage class is a page of the directory of a hash index: the page number of the next directory
+# page, the level, split pointer and number of keys of the index (only used on the meta page), followed by the page
+# numbers of DIRECTORY_ENTRIES buckets.
+class HashDirectoryPage:
+    # Initialization of a directory page with optional existing data
+    def __init__(self, data: bytearray = None):
+        if data is None:
+            self.next_page = 0
+            self.level = self.split = self.count = 0
+            self.entries = [0] * DIRECTORY_ENTRIES
+        else:
+            self.next_page = int.from_bytes(data[:PAGE_NUM_SIZE], 'little')
+            self.level, self.split, self.count = DIRECTORY_HEADER.unpack_from(data, PAGE_NUM_SIZE)
+            self.entries = list(DIRECTORY_ENTRIES_FORMAT.unpack_from(data, DIRECTORY_HEADER_SIZE))
+
+    # Returns the directory page serialized into a page
+    @property
+    def data(self) -> bytearray:
+        data = bytearray(PAGE_SIZE)
+        data[:PAGE_NUM_SIZE] = self.next_page.to_bytes(PAGE_NUM_SIZE, 'little')
+        DIRECTORY_HEADER.pack_into(data, PAGE_NUM_SIZE, self.level, self.split, self.count)
+        DIRECTORY_ENTRIES_FORMAT.pack_into(data, DIRECTORY_HEADER_SIZE, *self.entries)
+        return data
@@ -1,110 +1,877 @@
 # * Imports
-from src.main.database.page import PageDirectory
+from src.main.database.page import Page, PageDirectory, COMPRESSIONS, compress_page, pack_compressed_page
+from src.main.database.catalog import Catalog
+from src.main.database.bplus_three import BPlusTreeIndex, PageNodeStore, tree_pinned_pages
+from src.main.database.buffer_pool import BufferPool, ConcurrentBufferPool
+from src.main.database.disk_manager import DiskManager, FlushStats
+from src.main.database.free_space_map import FreeSpaceMap
+from src.main.database.hash_index import HashIndex, HASH_PINNED_PAGES
+from src.main.database.lock_manager import LockManager, ReadWriteLatch
+from src.main.database.pax_page import PaxPage, PAX_PREFIX
+from src.main.database.secondary_index import SecondaryIndex, INDEX_PREFIX, SECONDARY_KEY_SIZE
+from src.main.database.write_ahead_log import WriteAheadLog
 from src.main.utils.constants import *
 import src.main.utils.utils as utils
+from contextlib import contextmanager, nullcontext
+from typing import List
+import bisect
+import functools
 import os
+import threading
 
 
-# * This class is responsible for represents the entire database and manages multiple page directories.
+# * This class is responsible for represents the entire database and manages multiple page directories. Records are
+# found through a B+ tree or hash index on their id or through secondary indexes on other fields, and stored on a page found
+# through the free space map. All are stored on pages in the same file. All pages (directories, data
+# pages, catalog and index nodes) are accessed through a buffer pool of a bounded number of pages, which reads and
+# writes them through the disk manager. A concurrent heap file can be used by several threads: records are locked by
+# their id, data pages are latched while they are read or changed, and the page directories and free space map are
+# changed by one thread at a time. The data pages are slotted pages (NSM) or, in a file created with the PAX layout,
+# PAX pages that store the records by column; the layout and schema of a PAX file are kept in the catalog.
 class HeapFile:
     # Initializes the HeapFile with the given file path and loads existing data or creates a new PageDirectory.
-    def __init__(self, file_path):
+    def __init__(self, file_path, cache_size: int = CACHE_SIZE, eviction_policy: str = 'lru', use_mmap: bool = False,
+                 index_fan_out: int = None, index_type: str = 'btree', compaction: str = 'eager', wal: bool = False,
+                 concurrent: bool = False, compression: str = None, layout: str = 'nsm', schema: List[str] = None,
+                 lazy_delete: bool = False):
+        if index_type not in ('btree', 'hash'):
+            raise ValueError(f"Unknown index type {index_type}")
+        if compaction not in ('eager', 'lazy', 'threshold'):
+            raise ValueError(f"Unknown compaction policy {compaction}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}")
+        if layout not in ('nsm', 'pax'):
+            raise ValueError(f"Unknown page layout {layout}")
+        # The pool must hold every page an operation pins at once: with an index of the given type and fan-out in a new
+        # file, the indexes of an existing file are checked once they are read
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            self.check_cache_size(cache_size,
+                                  HASH_PINNED_PAGES if index_type == 'hash' else tree_pinned_pages(index_fan_out))
+        else:
+            self.check_cache_size(cache_size, HASH_PINNED_PAGES)
         self.file_path = file_path
-        if os.path.isfile(file_path):
-            with open(file_path, 'rb') as db:
-                pd = PageDirectory(file_path=file_path, data=bytearray(db.read(PAGE_SIZE)))
+        self.index_fan_out = index_fan_out  # Fan-out of a new index, by default as many children as fit on a page
+        self.index_type = index_type  # Type of the primary key index of a new file, a B+ tree or a hash index
+        # Whether the B+ tree primary key index replaces deleted ids by tombstones, removed in batches (vacuum)
+        self.lazy_delete = lazy_delete
+        # When a data page reclaims the space of deleted records: on every delete ('eager'), only when an insert needs
+        # the space ('lazy'), or also once the dead space passes COMPACTION_THRESHOLD of the page ('threshold')
+        self.compaction = compaction
+        self.concurrent = concurrent
+        self.compression = compression  # Algorithm of the pages compressed by compress, 'zlib' or 'lzma'
+        self.locks = LockManager()  # Locks of the records that are read or changed, by their id
+        # Writers hold the operation latch shared, a commit holds it exclusive so it only sees whole operations
+        self.operation_latch = ReadWriteLatch()
+        self.local = threading.local()
+        # Guards the page directories, the free space map and the catalog, which every insert and delete changes
+        self.space_lock = threading.RLock() if concurrent else nullcontext()
+        self.disk = DiskManager(file_path, use_mmap)
+        # With a write-ahead log a commit only syncs the log, the file is brought back to its last commit on opening
+        self.wal = None
+        if wal:
+            self.wal = WriteAheadLog(file_path + '.wal')
+            self.recover()
+        self.buffer_pool = (ConcurrentBufferPool if concurrent else BufferPool)(
+            self.read_page_data, self.write_pages, cache_size, eviction_policy, self.disk.read_pages,
+            self.log_undo if wal else None)
+        if self.disk.is_empty():
+            self.buffer_pool.new(0, PageDirectory(self.buffer_pool))  # !Changed this so it also has the pool
+            self.buffer_pool.unpin(0)
+        # Page numbers of the page directories, in the order of the chain
+        self.page_dir_numbers: list[int] = [0]
+        with self.page_dir(0) as pd:
+            next_dir = pd.next_dir
+            catalog_page = pd.catalog_page
+        while next_dir != 0:
+            self.page_dir_numbers.append(next_dir)
+            with self.page_dir(next_dir) as pd:
+                next_dir = pd.next_dir
+
+        self.catalog_page = catalog_page
+        self.catalog = self.read_catalog()
+        self.free_space_map = self.read_free_space_map()
+        # Factory of the data pages and a new data page, for the free space and the space of a record on a new page
+        self.page_type, self.empty_page = Page, Page()
+        self.read_layout(layout, schema)
+        self.index = self.read_index()
+        # Secondary indexes by the index of their field in the schema
+        self.secondary_indexes = {}
+        for name in self.catalog.names(INDEX_PREFIX):
+            secondary_index = SecondaryIndex.from_catalog(self, name, self.catalog.get(name))
+            self.secondary_indexes[secondary_index.column] = secondary_index
+        try:
+            self.check_cache_size(cache_size, max(index.pinned_pages() for index in self.indexes()))
+        except ValueError:
+            self.disk.close()
+            raise
+
+    # Raises a ValueError if a buffer pool of the given capacity can not hold the pages an operation on an index that
+    # pins the given number of pages keeps pinned, together with the pages of the file it pins.
+    @staticmethod
+    def check_cache_size(cache_size: int, index_pages: int):
+        if cache_size < FILE_PINNED_PAGES + index_pages:
+            raise ValueError(f"A buffer pool of {cache_size} pages is too small, an operation on the file can pin "
+                             f"{FILE_PINNED_PAGES + index_pages} pages at once!")
+
+    # Returns the primary key index and the secondary indexes
+    def indexes(self) -> list:
+        return [self.index] + list(self.secondary_indexes.values())
+
+    # Creates a PageDirectory from the data of its page, for the buffer pool.
+    def page_dir_factory(self, data: bytearray) -> PageDirectory:
+        return PageDirectory(self.buffer_pool, data)
+
+    # Pins the page directory with the specified page number for the duration of a with block. A directory marks
+    # itself dirty when it changes.
+    @contextmanager
+    def page_dir(self, pd_number: int):
+        pd = self.buffer_pool.fetch(pd_number, self.page_dir_factory)
+        try:
+            yield pd
+        finally:
+            self.buffer_pool.unpin(pd_number)
+
+    # Pins the data page with the specified page number and its page directory for the duration of a with block. The
+    # page is latched exclusive if it is changed.
+    @contextmanager
+    def data_page(self, page_number: int, dirty: bool = False):
+        with self.page_dir(self.find_page_dir(page_number)) as pd:
+            with self.space_lock:
+                page = pd.find_page(page_number, self.page_type)
+            if page is None:
+                raise ValueError(f"Page {page_number} does not exist!")
+            try:
+                with self.latch(page_number, dirty):
+                    yield pd, page
+            finally:
+                self.buffer_pool.unpin(page_number, dirty)
+
+    # Returns the latch of a pinned page for a with block, or a context that does nothing if the file is not concurrent.
+    def latch(self, page_number: int, exclusive: bool = False):
+        return self.buffer_pool.latch(page_number).hold(exclusive) if self.concurrent else nullcontext()
+
+    # Locks the records with the given keys for the duration of a with block, if the file is concurrent.
+    def lock_records(self, keys: list, exclusive: bool = False):
+        return self.locks.lock(keys, exclusive) if self.concurrent else nullcontext()
+
+    # Holds the operation latch for the duration of a with block: shared for a change of some records, exclusive for a
+    # commit or a change of the whole file. An operation started inside another operation of the thread does nothing.
+    def operation(self, exclusive: bool = False):
+        return self.hold_operation_latch(exclusive) if self.concurrent else nullcontext()
+
+    @contextmanager
+    def hold_operation_latch(self, exclusive: bool):
+        if getattr(self.local, 'operation', False):
+            yield
+            return
+        self.local.operation = True
+        try:
+            with self.operation_latch.hold(exclusive):
+                yield
+        finally:
+            self.local.operation = False
+
+    # Reads the catalog page, or creates one if the file has none yet. The catalog stays pinned in the buffer pool.
+    def read_catalog(self) -> Catalog:
+        if self.catalog_page != 0:
+            return self.buffer_pool.fetch(self.catalog_page, Catalog)
+        self.catalog_page = self.allocate_page()
+        with self.page_dir(0) as pd:
+            pd.catalog_page = self.catalog_page
+            pd.update_directory_info()
+        return self.buffer_pool.new(self.catalog_page, Catalog())
+
+    # Reads the page layout of the data pages from the catalog, or stores the PAX layout with its schema for a new file.
+    # The layout of a file that holds data pages can not change.
+    def read_layout(self, layout: str, schema: List[str]):
+        names = self.catalog.names(PAX_PREFIX)
+        if names:
+            layout, schema = 'pax', names[0][len(PAX_PREFIX):].split(',')
+        elif layout == 'pax':
+            if schema is None:
+                raise ValueError('A PAX file needs the schema of its records!')
+            if self.data_page_numbers():
+                raise ValueError('The file already holds NSM pages!')
+            self.catalog.set(PAX_PREFIX + ','.join(schema), 0)
+            self.buffer_pool.mark_dirty(self.catalog_page)
+        if layout == 'pax' and self.compression is not None:
+            raise ValueError('PAX pages can not be compressed!')
+        self.layout = layout  # 'nsm' for slotted data pages, 'pax' for PAX pages
+        self.schema = list(schema) if schema is not None else None
+        if layout == 'pax':
+            self.page_type = functools.partial(PaxPage, self.schema)
+            self.empty_page = self.page_type()
+
+    # Returns the space a record takes on a data page, for the free space map
+    def record_space(self, data) -> int:
+        return self.empty_page.record_space(data)
+
+    # Loads the free space map, or builds one from the page directories if the file has none yet.
+    def read_free_space_map(self) -> FreeSpaceMap:
+        first_page = self.catalog.get('free_space_map')
+        if first_page is not None:
+            return FreeSpaceMap(self, first_page)
+
+        free_space_map = FreeSpaceMap(self)
+        self.catalog.set('free_space_map', free_space_map.first_page)
+        self.buffer_pool.mark_dirty(self.catalog_page)
+        for pd_number in list(self.page_dir_numbers):
+            with self.page_dir(pd_number) as pd:
+                entries = list(pd.page_entries())
+            for page_number, free_space in entries:
+                if free_space != RESERVED_PAGE:
+                    free_space_map.update(page_number, free_space)
+        return free_space_map
+
+    # Loads the primary key index, or builds one of the index type from the records if the file has none yet. An
+    # existing index keeps its type.
+    def read_index(self):
+        meta_page = self.catalog.get('primary_index')
+        if meta_page is not None:
+            self.index_type = 'btree'
+            return BPlusTreeIndex(PageNodeStore(self), meta_page, lazy_delete=self.lazy_delete)
+        meta_page = self.catalog.get('primary_hash_index')
+        if meta_page is not None:
+            self.index_type = 'hash'
+            self.check_lazy_delete()
+            return HashIndex(self, meta_page)
+
+        if self.index_type == 'hash':
+            self.check_lazy_delete()
+            index = HashIndex(self)
+            self.catalog.set('primary_hash_index', index.meta_page)
         else:
-            pd = PageDirectory(file_path)  # !Changed this so it also has filepath as parameter
-        self.page_directories: list[PageDirectory] = [pd]
+            index = BPlusTreeIndex(PageNodeStore(self), fan_out=self.index_fan_out, lazy_delete=self.lazy_delete)
+            self.catalog.set('primary_index', index.meta_page)
+        self.buffer_pool.mark_dirty(self.catalog_page)
+        for page_number, slot_id, record in self.records():
+            index.insert(self.record_key(record), (page_number, slot_id))
+        return index
+
+    # Raises a ValueError if a hash index is asked to delete lazily, only a B+ tree has tombstones
+    def check_lazy_delete(self):
+        if self.lazy_delete:
+            raise ValueError('Only a B+ tree index can delete lazily!')
+
+    # Creates a secondary index on the field with the given index in the schema from the stored records. Returns the
+    # number of records in the index.
+    def create_index(self, column: int, schema: list) -> int:
+        with self.operation(exclusive=True):
+            if column in self.secondary_indexes:
+                raise ValueError(f"Column {column} already has an index!")
+            self.check_cache_size(self.buffer_pool.capacity, tree_pinned_pages(self.index_fan_out, SECONDARY_KEY_SIZE))
+            secondary_index = SecondaryIndex(self, column, schema)
+            count = secondary_index.bulk_load(self.records())
+            self.catalog.set(secondary_index.name, secondary_index.meta_page)
+            self.buffer_pool.mark_dirty(self.catalog_page)
+            self.secondary_indexes[column] = secondary_index
+            return count
+
+    # Returns the records of which the field with the given index has the given value, using its secondary index.
+    def find_by(self, column: int, value) -> list:
+        if column not in self.secondary_indexes:
+            raise ValueError(f"Column {column} has no index!")
+        secondary_index = self.secondary_indexes[column]
+        # Records with a different string value of the same hash are filtered out
+        return [record for record in self.read_records(secondary_index.search(value))
+                if secondary_index.value(record) == value]
+
+    # Returns the key of a record in the index, the first field of a record is the id and an int
+    @staticmethod
+    def record_key(byte_id: bytearray) -> int:
+        return int.from_bytes(byte_id[:KEY_SIZE], 'little')
+
+    # Reads and returns the data of the page with the specified page number from the file.
+    def read_page_data(self, page_number):
+        return self.disk.read_page(page_number)
+
+    # Writes the pages of the write-ahead log to the file after a crash, and empties the log.
+    def recover(self):
+        pages = self.wal.recover()
+        if pages:
+            self.disk.write_pages(pages)
+            self.disk.sync()
+        self.wal.truncate()
+
+    # Logs the images in the file of pages before uncommitted changes are written over them.
+    def log_undo(self, page_numbers: list):
+        self.wal.log_undo([(page_number, bytes(self.disk.read_page(page_number))) for page_number in page_numbers])
+
+    # Writes the given (page number, data) pairs to the file.
+    def write_pages(self, pages: list) -> FlushStats:
+        return self.disk.write_pages(self.disk_pages(pages))
+
+    # Returns the (page number, data) pairs with the data as it is stored in the file: compressed pages are compressed
+    # into one page.
+    def disk_pages(self, pages: list) -> list:
+        return [(page_number, self.compress_data(data) if len(data) > PAGE_SIZE else data)
+                for page_number, data in pages]
+
+    # Compresses the data of a compressed page into one page, with the compression of the file or, if it no longer fits
+    # that way (a page compressed with another algorithm), with any algorithm that fits it on a page.
+    def compress_data(self, data) -> bytearray:
+        for compression in sorted(COMPRESSIONS, key=lambda name: name != self.compression):
+            page = compress_page(data, compression)
+            if page is not None:
+                return page
+        raise ValueError('Compressed page does not fit on a page!')
+
+    # Creates a new page directory after the last page directory.
+    def create_page_dir(self) -> int:
+        with self.space_lock, self.page_dir(self.page_dir_numbers[-1]) as pd:
+            # Create new page directory after the max. current page number
+            new_pd = PageDirectory(self.buffer_pool, current_number=pd.last_page_number())
+            pd.next_dir = new_pd.pd_number
+            pd.update_directory_info()
+        self.buffer_pool.new(new_pd.pd_number, new_pd)
+        self.buffer_pool.unpin(new_pd.pd_number)
+        self.page_dir_numbers.append(new_pd.pd_number)
+        return new_pd.pd_number
+
+    # Returns the page number of the page directory that holds the page with the specified page number.
+    def find_page_dir(self, page_number) -> int:
+        return self.page_dir_numbers[bisect.bisect_left(self.page_dir_numbers, page_number) - 1]
+
+    # Reserves a new page (for the catalog or an index) in the page directories and returns its page number. Data pages
+    # are added with the free space they have left.
+    def allocate_page(self, free_space: int = RESERVED_PAGE) -> int:
+        with self.space_lock:
+            # Only the last page directory can have room for new pages
+            with self.page_dir(self.page_dir_numbers[-1]) as pd:
+                page_number = pd.allocate_page(free_space)
+            if page_number is None:
+                with self.page_dir(self.create_page_dir()) as pd:
+                    page_number = pd.allocate_page(free_space)
+            if free_space != RESERVED_PAGE:
+                self.free_space_map.update(page_number, free_space)
+            return page_number
+
+    # Updates the free space of a data page in its page directory and in the free space map.
+    def update_free_space(self, pd: PageDirectory, page_number: int, free_space: int):
+        with self.space_lock:
+            pd.update_free_space(page_number, free_space)
+            self.free_space_map.update(page_number, free_space)
+
+    # Iterates over all records as (page number, slot id, record), in the order they are stored in the file.
+    def records(self):
+        for pd_number in list(self.page_dir_numbers):
+            for page_number in self.directory_data_pages(pd_number):
+                with self.buffer_pool.pin(page_number, self.page_type, False) as page:
+                    records = [(page_number, slot_id, record) for slot_id, record in page.records()]
+                yield from records
+
+    # Returns the page numbers of the data pages in the order they are stored in the file.
+    def data_page_numbers(self) -> list:
+        page_numbers = []
+        for pd_number in list(self.page_dir_numbers):
+            page_numbers.extend(self.directory_data_pages(pd_number))
+        return page_numbers
+
+    # Returns the page numbers of the data pages in a page directory. Pages without slots (new pages and pages emptied
+    # by compress) hold no records and are left out, so scans do not read them.
+    def directory_data_pages(self, pd_number: int) -> list:
+        empty = self.empty_page.free_space()
+        with self.space_lock, self.page_dir(pd_number) as pd:
+            return [page_number for page_number, free_space in pd.page_entries()
+                    if free_space != RESERVED_PAGE and free_space != empty]
+
+    # Iterates over copies of the data pages in the order they are stored in the file. Each page is copied while it is
+    # pinned and latched shared, and released before its copy is returned, so the caller can change records (also on
+    # the page it holds) while it iterates. The pages are read ahead in chunks of READ_AHEAD_PAGES pages.
+    def data_pages(self):
+        for page_numbers in self.data_page_chunks():
+            for page_number in page_numbers:
+                with self.buffer_pool.pin(page_number, self.page_type, False) as page:
+                    copy = self.page_type(bytes(page.data))
+                yield copy
+
+    # Iterates over the (page number, page) of the data pages, like data_pages but without copying them. Each page stays
+    # pinned and latched (exclusive to change it) until the next one is requested, so it is only used by passes over
+    # the file that hold the operation latch exclusive and change no other records meanwhile.
+    def numbered_data_pages(self, exclusive: bool = False):
+        for page_numbers in self.data_page_chunks():
+            for page_number in page_numbers:
+                with self.buffer_pool.pin(page_number, self.page_type, exclusive) as page:
+                    yield page_number, page
+
+    # Iterates over the page numbers of the data pages in chunks of at most READ_AHEAD_PAGES pages, reading the pages of
+    # a chunk ahead before it is returned.
+    def data_page_chunks(self):
+        for pd_number in list(self.page_dir_numbers):
+            yield from self.read_ahead(self.directory_data_pages(pd_number))
+
+    # Iterates over the given data pages in chunks of READ_AHEAD_PAGES pages, or of half the buffer pool if that is
+    # smaller, so the pages of a chunk are not evicted before they are used. The pages of a chunk are read ahead before
+    # it is returned.
+    def read_ahead(self, page_numbers: list):
+        chunk = max(1, min(READ_AHEAD_PAGES, self.buffer_pool.capacity // 2))
+        for start in range(0, len(page_numbers), chunk):
+            self.buffer_pool.prefetch(page_numbers[start:start + chunk], self.page_type)
+            yield page_numbers[start:start + chunk]
+
+    # Compacts a data page after a delete or update, if the compaction policy asks for it.
+    def apply_compaction(self, page: Page):
+        if page.dead_space == 0 or self.compaction == 'lazy':
+            return
+        if self.compaction == 'eager' or page.dead_space >= COMPACTION_THRESHOLD * PAGE_SIZE:
+            page.compact_page()
 
-    # Reads and returns the specified PageDirectory, loading it if not already in memory.
-    def read_page_dir(self, pd: PageDirectory) -> PageDirectory:
-        if new_pd := list(filter(lambda pgd: pgd.pd_number == pd.next_dir, self.page_directories)):
-            return new_pd[0]
+    # Compacts every data page with dead space in one pass over the file and returns the number of compacted pages.
+    # The free space of the pages in the directories and the free space map already includes their dead space.
+    def vacuum(self) -> int:
+        compacted = 0
+        with self.operation(exclusive=True):
+            for page_number, page in self.numbered_data_pages(exclusive=True):
+                if page.dead_space:
+                    page.compact_page()
+                    self.buffer_pool.mark_dirty(page_number)
+                    compacted += 1
+        return compacted
 
-        with open(self.file_path, 'rb') as db:
-            db.seek(pd.next_dir * PAGE_SIZE)
-            new_pd = PageDirectory(file_path=self.file_path, data=bytearray(db.read(PAGE_SIZE)))
-        self.page_directories.append(new_pd)
-        return new_pd
+    # Compresses the full data pages (cold pages) and repacks the compressed pages with deleted records, returns the
+    # number of pages that were emptied.
+    def compress(self) -> int:
+        """
+        A data page is cold when more than COLD_PAGE_FILL of it is in use. The records of COMPRESS_CHUNK_PAGES cold
+        pages at a time are packed into compressed pages (_pack_compressed_page_), which take the place of the first
+        pages of the chunk; the other pages are emptied and reused for new records. Records that do not compress well
+        enough are packed into regular pages. The moved records get their new record id in the indexes.
 
-    # Deletes the record with the specified page ID and slot ID.
-    def delete_record(self, page_id, slot_id):
-        if page_id < len(self.pages):
-            self.pages[page_id].delete_record(slot_id)
+        :return: The number of pages that were emptied
+        """
+        if self.compression is None:
+            raise ValueError('The file has no compression!')
+        emptied = 0
+        with self.operation(exclusive=True):
+            cold = [page_number for page_number, page in self.numbered_data_pages()
+                    if (page.dead_space > 0 if page.compressed else
+                        page.available_space() <= (1 - COLD_PAGE_FILL) * PAGE_SIZE)]
+            for start in range(0, len(cold), COMPRESS_CHUNK_PAGES):
+                emptied += self.compress_pages(cold[start:start + COMPRESS_CHUNK_PAGES])
+        return emptied
+
+    # Repacks the records of the data pages into compressed pages on the first of these pages and empties the others,
+    # returns the number of emptied pages.
+    def compress_pages(self, page_numbers: list) -> int:
+        records = []
+        for page_number in page_numbers:
+            with self.buffer_pool.pin(page_number, Page) as page:
+                records.extend(page.read_record(slot_id)
+                               for slot_id, (_, length) in enumerate(page.page_footer.slot_dir) if length != 0)
+        packed, start = [], 0
+        while start < len(records):
+            page, count = pack_compressed_page(records, start, self.compression)
+            if page is None:
+                page = Page()
+                count = len(page.insert_records(records, start))
+            packed.append((page, start, count))
+            start += count
+
+        record_ids = {}
+        for i, page_number in enumerate(page_numbers + [None] * (len(packed) - len(page_numbers))):
+            new_page, start, count = packed[i] if i < len(packed) else (Page(), 0, 0)
+            if page_number is None:
+                # More pages than before, for records that do not compress
+                page_number = self.allocate_page(new_page.available_space())
+                self.buffer_pool.new(page_number, new_page)
+                self.buffer_pool.unpin(page_number)
+            else:
+                with self.data_page(page_number, dirty=True) as (pd, page):
+                    page.load(new_page.data)
+                    self.update_free_space(pd, page_number, page.available_space())
+            record_ids.update(((page_number, slot_id), records[start + slot_id]) for slot_id in range(count))
+
+        self.index.insert_many((self.record_key(record), record_id) for record_id, record in record_ids.items())
+        for secondary_index in self.secondary_indexes.values():
+            for record_id, record in record_ids.items():
+                secondary_index.delete(record)
+                secondary_index.insert(record, record_id)
+        return len(page_numbers) - len(packed)
+
+    # Deletes the record with the specified ID, returns False if there is no such record.
+    def delete_record(self, byte_id: bytearray) -> bool:
+        key = self.record_key(byte_id)
+        with self.operation(), self.lock_records([key], exclusive=True):
+            record_id = self.index.search(key)
+            if record_id is None:
+                return False
+            page_number, slot_id = record_id
+            with self.data_page(page_number, dirty=True) as (pd, page):
+                if self.secondary_indexes:
+                    record = page.read_record(slot_id)
+                    for secondary_index in self.secondary_indexes.values():
+                        secondary_index.delete(record)
+                page.delete_record(slot_id, compact=False)
+                self.apply_compaction(page)
+                self.update_free_space(pd, page_number, page.available_space())
+            self.index.delete(key)
+            return True
 
     # Updates the record with the specified ID, replacing it with the given data.
     def update_record(self, byte_id: bytearray, data):
-        page, slot_id = self.find_record(byte_id)
-        if page.update_record(slot_id, data):
-            return True
-        else:
+        key, new_key = self.record_key(byte_id), self.record_key(data)
+        with self.operation(), self.lock_records([key, new_key], exclusive=True):
+            return self.replace_record(key, new_key, data)
+
+    # Replaces the record with the key by the data with the new key, the records are locked.
+    def replace_record(self, key: int, new_key: int, data):
+        record_id = self.index.search(key)
+        if record_id is None:
+            raise ValueError('Record with this ID is not found!')
+        if new_key != key and self.index.search(new_key) is not None:
+            raise ValueError('Record with this ID already exists!')
+
+        page_number, slot_id = record_id
+        with self.data_page(page_number, dirty=True) as (pd, page):
+            old_record = page.read_record(slot_id) if self.secondary_indexes else None
+            slot_id = page.update_record(slot_id, data, compact=False)
+            self.apply_compaction(page)
+            self.update_free_space(pd, page_number, page.available_space())
+        if slot_id is None:
             # Not enough free space on page, try to find a new page
-            self.page_directories[0].insert_record(data)
+            page_number, slot_id = self.store_record(data)
+
+        if new_key != key:
+            self.index.delete(key)
+        if new_key != key or (page_number, slot_id) != record_id:
+            self.index.insert(new_key, (page_number, slot_id))
+        for secondary_index in self.secondary_indexes.values():
+            secondary_index.delete(old_record)
+            secondary_index.insert(data, (page_number, slot_id))
+        return True
 
-    # Inserts a record into the database, handling page directory and page creation as needed.
+    # Deletes the records with the specified ids at once and returns the number of deleted records.
+    def delete_many(self, keys: list) -> int:
+        """
+        The ids are looked up in one pass over the index and the records are deleted page by page: every page is
+        compacted (by the compaction policy) and gets its free space updated once, however many of its records are
+        deleted. The ids are then deleted from the index in one pass in key order (_delete_many_).
+
+        :param keys: Ids of the records, as ints; ids that are not found are skipped
+        :return: The number of deleted records
+        """
+        with self.operation(), self.lock_records(keys, exclusive=True):
+            record_ids = self.index.search_many(keys)
+            for page_number, slots in self.group_by_page(record_ids):
+                with self.data_page(page_number, dirty=True) as (pd, page):
+                    for key, slot_id in slots:
+                        if self.secondary_indexes:
+                            record = page.read_record(slot_id)
+                            for secondary_index in self.secondary_indexes.values():
+                                secondary_index.delete(record)
+                        page.delete_record(slot_id, compact=False)
+                    self.apply_compaction(page)
+                    self.update_free_space(pd, page_number, page.available_space())
+            self.index.delete_many(record_ids)
+            return len(record_ids)
+
+    # Replaces the records with the ids of the given records at once and returns the number of updated records.
+    def update_many(self, records: list) -> int:
+        """
+        Every record replaces the stored record with its id (the last one for an id that occurs more than once). The
+        records are updated page by page like delete_many; the records that no longer fit on their page are stored
+        together afterwards (_store_records_), and the ids of the records that moved are updated in one pass over the
+        index.
+
+        :param records: Encoded records
+        :return: The number of updated records
+        """
+        updates = {self.record_key(data): data for data in records}
+        with self.operation(), self.lock_records(list(updates), exclusive=True):
+            record_ids = self.index.search_many(updates)
+            if len(record_ids) < len(updates):
+                raise ValueError('Record with this ID is not found!')
+
+            old_records, moved, new_record_ids = {}, [], {}
+            for page_number, slots in self.group_by_page(record_ids):
+                with self.data_page(page_number, dirty=True) as (pd, page):
+                    for key, slot_id in slots:
+                        if self.secondary_indexes:
+                            old_records[key] = page.read_record(slot_id)
+                        new_slot_id = page.update_record(slot_id, updates[key], compact=False)
+                        if new_slot_id is None:
+                            moved.append(key)  # Not enough free space on the page
+                        elif new_slot_id != slot_id:
+                            new_record_ids[key] = (page_number, new_slot_id)
+                    self.apply_compaction(page)
+                    self.update_free_space(pd, page_number, page.available_space())
+            new_record_ids.update(zip(moved, self.store_records([updates[key] for key in moved])))
+
+            self.index.insert_many(new_record_ids.items())
+            for key, data in updates.items():
+                for secondary_index in self.secondary_indexes.values():
+                    secondary_index.delete(old_records[key])
+                    secondary_index.insert(data, new_record_ids.get(key, record_ids[key]))
+            return len(updates)
+
+    # Inserts many records at once and returns their record ids, see store_records. The ids are added to the index in
+    # one pass in key order (_insert_many_).
+    def insert_many(self, records: list) -> list:
+        keys = [self.record_key(data) for data in records]
+        with self.operation(), self.lock_records(keys, exclusive=True):
+            if len(set(keys)) < len(keys) or self.index.search_many(keys):
+                raise ValueError('Record with this ID already exists!')
+            record_ids = self.store_records(records)
+            self.index.insert_many(zip(keys, record_ids))
+            for secondary_index in self.secondary_indexes.values():
+                for data, record_id in zip(records, record_ids):
+                    secondary_index.insert(data, record_id)
+            return record_ids
+
+    # Inserts a record into the database and its id into the index, returns the (page number, slot id) of the record.
     def insert_record(self, data):
-        pd: PageDirectory = self.page_directories[0]
-
-        # Attempts to insert the record in an existing page directory.
-        # Iterates over all page dir., if full move to the next directory.
-        while not (inserted := pd.insert_record(data)) and pd.next_dir != 0:
-            pd = self.read_page_dir(pd)
-
-        # If last dir. is full, create new one
-        if not inserted:
-            # Find the max. current page number
-            max_page_nr = int.from_bytes(pd.read_record(len(pd.page_footer.slot_dir) - 1)[:PAGE_NUM_SIZE], 'little')
-            # Create new page directory
-            new_pd = PageDirectory(file_path=self.file_path, current_number=max_page_nr)
-            pd.next_dir = new_pd.pd_number
-            # (current_pd_number, next_pd_number)
-            pd.data[PAGE_NUM_SIZE:PAGE_NUM_SIZE + FREE_SPACE_SIZE] = pd.next_dir.to_bytes(FREE_SPACE_SIZE, 'little')
-            self.page_directories.append(new_pd)
-            return new_pd.insert_record(data)
-        return True  # If record is successfully inserted by either in an existing directory or a newly created one
-
-    # Finds and returns the page and slot ID for the record with the specified ID.
-    def find_record(self, byte_id: bytearray) -> (int, int):
-        pd: PageDirectory = self.page_directories[0]
-
-        while True:  # Initiates an infinite loop to search for the record continuously until it finds it or exhausts
-            # all page directories.
-            if result := pd.find_record(byte_id):  # Calls the find_record method on the current page directory (pd). If
-                # it finds a record with the specified byte_id, it returns the result.
-                return result
-            if pd.next_dir == 0:  # Checks if there is no next directory (pd.next_dir == 0). If true, it breaks out
-                # of the loop since there are no more directories to search.
-                break
-            pd = self.read_page_dir(pd)  # Moves to the next page directory by calling the read_page_dir method.
-
-        return None, None
+        key = self.record_key(data)
+        with self.operation(), self.lock_records([key], exclusive=True):
+            if self.index.search(key) is not None:
+                raise ValueError('Record with this ID already exists!')
+            record_id = self.store_record(data)
+            self.index.insert(key, record_id)
+            for secondary_index in self.secondary_indexes.values():
+                secondary_index.insert(data, record_id)
+            return record_id
+
+    # Loads records sorted on their id into new data pages at the end of the file and returns how many were loaded.
+    def bulk_load(self, records, fill_factor: float = 1.0) -> int:
+        """
+        Records are packed into full pages one page at a time, without searching the page directories. An empty index
+        is built bottom-up from the sorted ids with the given fill factor, otherwise the ids are inserted one by one.
+        The records are checked before any is stored (_check_load_), so a load that fails on a record that is too
+        large, an unsorted or duplicate id or an id that is already stored leaves the file unchanged.
+
+        :param records: Encoded records, sorted on their id without duplicates
+        :param fill_factor: Fraction of the index nodes that is filled
+        :return: The number of records loaded
+        """
+        with self.operation(exclusive=True):
+            records = list(records)
+            self.check_load(records)
+            entries = self.pack_records(records)
+            if self.index.is_empty():
+                return self.index.bulk_load(entries, fill_factor)
+
+            count = 0
+            for key, record_id in entries:
+                self.index.insert(key, record_id)
+                count += 1
+            return count
+
+    # Checks the records of a bulk load: they fit on a page, their ids are sorted without duplicates and none of them
+    # is in the index yet. Raises a ValueError otherwise.
+    def check_load(self, records: list):
+        empty = self.empty_page.free_space()
+        if any(self.record_space(record) > empty for record in records):
+            raise ValueError('Record is too large to fit on a page!')
+        keys = [self.record_key(record) for record in records]
+        if any(key >= next_key for key, next_key in zip(keys, keys[1:])):
+            raise ValueError('Records must be sorted on their id without duplicates to bulk load them!')
+        if not self.index.is_empty() and self.index.search_many(keys):
+            raise ValueError('Record with this ID already exists!')
+
+    # Packs the records, checked by check_load, into new data pages and yields the (key, record id) of every stored
+    # record. The new pages are flushed in batches, so they are written in large sequential writes instead of one by one
+    # on eviction.
+    def pack_records(self, records: list):
+        empty = self.empty_page.free_space()
+        flush_every = max(1, self.buffer_pool.capacity // 2)
+        page_records, free_space, new_pages = [], empty, 0
+        for record in records:
+            needed_space = self.record_space(record)
+            if needed_space > free_space:
+                yield from self.store_page(page_records)
+                page_records, free_space = [], empty
+                new_pages += 1
+                if new_pages % flush_every == 0:
+                    self.buffer_pool.flush()
+            page_records.append(record)
+            free_space -= needed_space
+        if page_records:
+            yield from self.store_page(page_records)
+
+    # Stores the records on a new data page and returns their (key, record id) pairs.
+    def store_page(self, records: list) -> list:
+        if self.layout == 'pax':
+            page = self.page_type()
+            page.insert_records(records)
+        else:
+            page = Page.from_records(records)
+        page_number = self.allocate_page(page.free_space())
+        self.buffer_pool.new(page_number, page)
+        self.buffer_pool.unpin(page_number)
+        for secondary_index in self.secondary_indexes.values():
+            for slot_id, record in enumerate(records):
+                secondary_index.insert(record, (page_number, slot_id))
+        return [(self.record_key(record), (page_number, slot_id)) for slot_id, record in enumerate(records)]
+
+    # Stores a record on a page with enough free space found through the free space map, or on a new data page.
+    def store_record(self, data) -> (int, int):
+        needed_space = self.record_space(data)
+        if needed_space > self.empty_page.free_space():
+            raise ValueError('Record is too large to fit on a page!')
+
+        while True:
+            page_number = self.find_data_page(needed_space)
+            with self.data_page(page_number, dirty=True) as (pd, page):
+                slot_id = page.insert_record(data)
+                if slot_id is not None:
+                    self.update_free_space(pd, page_number, page.available_space())
+            # Another thread can fill the page before it is latched, then a page is found again
+            if slot_id is not None:
+                return page_number, slot_id
+
+    # Stores the records on pages found through the free space map or on new data pages, and returns their record ids
+    # in the order of the records. The records that fit on a page are stored on it at once, with one update of its free
+    # space.
+    def store_records(self, records: list) -> list:
+        if any(self.record_space(data) > self.empty_page.free_space() for data in records):
+            raise ValueError('Record is too large to fit on a page!')
+
+        record_ids = []
+        while len(record_ids) < len(records):
+            start = len(record_ids)
+            page_number = self.find_data_page(self.record_space(records[start]))
+            with self.data_page(page_number, dirty=True) as (pd, page):
+                slot_ids = page.insert_records(records, start)
+                if slot_ids:
+                    self.update_free_space(pd, page_number, page.available_space())
+            record_ids.extend((page_number, slot_id) for slot_id in slot_ids)
+        return record_ids
+
+    # Returns the page number of a data page with the needed space from the free space map, or of a new data page in
+    # the last page directory if no page has enough free space.
+    def find_data_page(self, needed_space: int) -> int:
+        with self.space_lock:
+            page_number = self.free_space_map.find(needed_space)
+            if page_number is None:
+                page = self.page_type()
+                page_number = self.allocate_page(page.free_space())
+                self.buffer_pool.new(page_number, page)
+                self.buffer_pool.unpin(page_number)
+            return page_number
 
     # Reads and returns the record with the specified ID.
     def read_record(self, byte_id: bytearray):
-        page, slot_id = self.find_record(byte_id)
-        if page is None:
-            raise ValueError('Record with this ID is not found!')
-        return page.read_record(slot_id)
+        key = self.record_key(byte_id)
+        with self.lock_records([key]):
+            record_id = self.index.search(key)
+            if record_id is None:
+                raise ValueError('Record with this ID is not found!')
+            page_number, slot_id = record_id
+            with self.buffer_pool.pin(page_number, self.page_type, False) as page:
+                return page.read_record(slot_id)
 
-    # Finds and returns the page with the specified page number.
-    def find_page(self, page_number):
-        for page_directory in self.page_directories:
-            if page := page_directory.find_page(page_number):
-                return page
+    # Reads the records with the given ids and returns them in the given order, None for an id that is not found.
+    def read_many(self, keys: list) -> list:
+        """
+        All ids are looked up in the index in one pass in sorted order (_search_many_). The record ids are grouped by
+        page, and every page that is needed is read once, in ascending page order, with the pages read ahead in chunks.
+
+        :param keys: Ids of the records, as ints
+        :return: The records (or None) in the order of the ids
+        """
+        with self.lock_records(keys):
+            by_page = self.group_by_page(self.index.search_many(keys))
+            records = {}
+            for page_number, slots in by_page:
+                with self.buffer_pool.pin(page_number, self.page_type, False) as page:
+                    for key, slot_id in slots:
+                        records[key] = page.read_record(slot_id)
+        return [records.get(key) for key in keys]
+
+    # Groups the record ids of keys by their page and yields the (page number, [(key, slot id)]) of every page in
+    # ascending page order. The pages are read ahead in chunks (_read_ahead_), a chunk once its first page is needed.
+    def group_by_page(self, record_ids: dict):
+        by_page = {}
+        for key, (page_number, slot_id) in record_ids.items():
+            by_page.setdefault(page_number, []).append((key, slot_id))
+        for page_numbers in self.read_ahead(sorted(by_page)):
+            for page_number in page_numbers:
+                yield page_number, by_page[page_number]
+
+    # Yields the records with an id between lo and hi (both included) in order of their id. The record ids are taken
+    # from the index in batches, the pages of a batch are read ahead in page order.
+    def read_range(self, lo: int, hi: int):
+        batch, pages = [], set()
+        for key, record_id in self.index.range_search(lo, hi):
+            batch.append((key, record_id))
+            pages.add(record_id[0])
+            if len(pages) == READ_AHEAD_PAGES:
+                yield from self.read_batch(batch)
+                batch, pages = [], set()
+        yield from self.read_batch(batch)
+
+    # Returns the records of a batch of (key, record id) pairs from the index. In a concurrent file a record can be
+    # moved or deleted after it was found, such records are looked up again by their key.
+    def read_batch(self, batch: list) -> list:
+        records = self.read_records([record_id for _, record_id in batch])
+        if not self.concurrent:
+            return records
+        checked = []
+        for (key, _), record in zip(batch, records):
+            if not record or self.record_key(record) != key:
+                try:
+                    record = self.read_record(key.to_bytes(KEY_SIZE, 'little'))
+                except ValueError:
+                    continue
+            checked.append(record)
+        return checked
+
+    # Returns the records with the given (page number, slot id) record ids, in the given order. The pages are read in
+    # page order, ahead in chunks like group_by_page.
+    def read_records(self, record_ids: list) -> list:
+        records = [None] * len(record_ids)
+        for page_number, slots in self.group_by_page(dict(enumerate(record_ids))):
+            with self.buffer_pool.pin(page_number, self.page_type, False) as page:
+                for i, slot_id in slots:
+                    records[i] = page.read_record(slot_id)
+        return records
+
+    # Closes the heap file, writing the pages changed since the last commit to the file and returns how much was written.
+    # With a write-ahead log the pages are written to the log instead. The file itself stays open.
+    def close(self) -> FlushStats:
+        with self.operation(exclusive=True):
+            stats = self.buffer_pool.flush() if self.wal is None else self.commit()
+        print(f"Closing file with committed changes: {stats.pages} pages ({stats.bytes} bytes) in {stats.writes} "
+              f"writes.")
+        return stats
+
+    # Commits the pages changed since the last commit to the write-ahead log in one write and one sync, and writes a
+    # checkpoint once the log holds WAL_CHECKPOINT_PAGES pages. Commits are appended in order, the sync is shared with
+    # the commits of other threads.
+    def commit(self) -> FlushStats:
+        with self.operation(exclusive=True):
+            pages = self.disk_pages(self.buffer_pool.commit())
+            offset = self.wal.append_commit(pages)
+        self.wal.sync(offset)
+        if self.wal.size() >= WAL_CHECKPOINT_PAGES * PAGE_SIZE:
+            self.checkpoint()
+        return FlushStats(len(pages), sum(len(data) for _, data in pages), 1 if pages else 0)
+
+    # Writes all changed pages to the file, so other processes that read the file see them: with a write-ahead log the
+    # changes are committed by a checkpoint.
+    def flush(self) -> FlushStats:
+        if self.wal is not None:
+            return self.checkpoint()
+        with self.operation(exclusive=True):
+            return self.buffer_pool.flush()
+
+    # Commits the changes since the last commit, writes all pages to the file and syncs it, after which the write-ahead
+    # log is emptied. The commit and the writes happen under one hold of the operation latch, so no uncommitted change
+    # is written over the file while its undo image is truncated with the log.
+    def checkpoint(self) -> FlushStats:
+        with self.operation(exclusive=True):
+            pages = self.disk_pages(self.buffer_pool.commit())
+            if pages:
+                self.wal.sync(self.wal.append_commit(pages))
+            stats = self.buffer_pool.flush()
+            self.disk.sync()
+            self.wal.truncate()
+        return stats
 
-    # Closes the heap file, writing page directory and page data to the file.
-    # Creates the file if it doesn't exist.
-    def close(self):
-        # Create file if it doesn't exist
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'wb') as file:
-                file.close()
-        print("Closing file with committed changes.")
-        with open(self.file_path, 'r+b') as file:
-            for page_dir in self.page_directories:
-                file.seek(page_dir.pd_number * PAGE_SIZE)
-                file.write(page_dir.data)
-                for page_nr, page in page_dir.pages.items():
-                    file.seek(page_nr * PAGE_SIZE)
-                    file.write(page.data)
+    # Commits the changes and closes the file handle, the heap file can not be used anymore afterwards.
+    def close_file(self) -> FlushStats:
+        stats = self.close()
+        if self.wal is not None:
+            self.checkpoint()
+            self.wal.close()
+        self.disk.close()
+        return stats
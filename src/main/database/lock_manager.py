@@ -0,0 +1,94 @@
+# * Imports
+from contextlib import contextmanager
+import threading
+
+
+# * The ReadWriteLatch class lets many threads read a shared structure at once, or one thread change it. A waiting
+# writer goes before new readers, so writers are not starved by a steady stream of readers. The latch is not
+# reentrant: a thread that holds it must not acquire it again.
+class ReadWriteLatch:
+    # Initialize a free latch
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0  # Number of threads that hold the latch shared
+        self.writer = False  # Whether a thread holds the latch exclusive
+        self.waiting_writers = 0
+
+    # Acquires the latch, shared for reading or exclusive for writing
+    def acquire(self, exclusive: bool = False):
+        with self.condition:
+            if exclusive:
+                self.waiting_writers += 1
+                try:
+                    while self.writer or self.readers:
+                        self.condition.wait()
+                finally:
+                    self.waiting_writers -= 1
+                    if not self.writer and not self.readers:
+                        self.condition.notify_all()  # Readers that waited for a writer that gave up go on
+                self.writer = True
+            else:
+                while self.writer or self.waiting_writers:
+                    self.condition.wait()
+                self.readers += 1
+
+    # Releases the latch, acquired shared or exclusive
+    def release(self, exclusive: bool = False):
+        with self.condition:
+            if exclusive:
+                self.writer = False
+            else:
+                self.readers -= 1
+            self.condition.notify_all()
+
+    # Holds the latch for the duration of a with block
+    @contextmanager
+    def hold(self, exclusive: bool = False):
+        self.acquire(exclusive)
+        try:
+            yield
+        finally:
+            self.release(exclusive)
+
+
+# * The LockManager class locks records by their key for the duration of an operation: shared to read a record,
+# exclusive to insert, update or delete it. A lock exists only while it is held or waited for. The keys of an operation
+# are locked in sorted order, so two operations can not wait for each other.
+class LockManager:
+    # Initialize a lock manager without locks
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.locks = {}  # Key -> [latch, number of threads that hold or wait for it]
+
+    # Locks the keys for the duration of a with block. A key is held once its latch is acquired, a key of which the
+    # acquire fails is given up again.
+    @contextmanager
+    def lock(self, keys, exclusive: bool = False):
+        held = []
+        try:
+            for key in sorted(set(keys)):
+                with self.mutex:
+                    entry = self.locks.setdefault(key, [ReadWriteLatch(), 0])
+                    entry[1] += 1
+                try:
+                    entry[0].acquire(exclusive)
+                except BaseException:
+                    self.give_up(key, entry)
+                    raise
+                held.append((key, entry))
+            yield
+        finally:
+            for key, entry in reversed(held):
+                entry[0].release(exclusive)
+                self.give_up(key, entry)
+
+    # Undoes the count of a thread that held or waited for the lock of a key, the lock is removed when no thread is left
+    def give_up(self, key, entry: list):
+        with self.mutex:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[key]
+
+    # Returns the number of keys that are locked or waited for
+    def __len__(self) -> int:
+        return len(self.locks)
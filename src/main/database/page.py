@@ -1,70 +1,206 @@
 # * Imports
 from src.main.utils.constants import *
-from src.main.database.bplus_three import BPlusTreeIndex
 from typing import Optional
+import lzma
+import struct
+import zlib
+
+# (offset, length) of a slot in the slot directory
+SLOT_ENTRY_FORMAT = struct.Struct('<HH')
+# Compression algorithms of compressed pages by name: (id stored on the page, compress, decompress)
+COMPRESSIONS = {'zlib': (1, zlib.compress, zlib.decompress), 'lzma': (2, lzma.compress, lzma.decompress)}
+DECOMPRESS = {algorithm: decompress for algorithm, _, decompress in COMPRESSIONS.values()}
+# End of a compressed page: id of the algorithm, length of the compressed data and a marker in the place of the free
+# space pointer, which is never this large on an uncompressed page
+COMPRESSED_FOOTER = struct.Struct('<BHH')
+COMPRESSED_MARKER = 0xFFFF
+COMPRESSED_MARKER_BYTES = COMPRESSED_MARKER.to_bytes(FREE_SPACE_POINTER_SIZE, 'little')
+
+
+# Compresses the data of a compressed page into the data of one page, or returns None if it does not fit on a page
+# with the given number of bytes to spare
+def compress_page(data, compression: str, headroom: int = 0) -> Optional[bytearray]:
+    algorithm, compress, _ = COMPRESSIONS[compression]
+    compressed = compress(bytes(data))
+    if len(compressed) > PAGE_SIZE - COMPRESSED_FOOTER.size - headroom:
+        return None
+    page = bytearray(PAGE_SIZE)
+    page[:len(compressed)] = compressed
+    page[-COMPRESSED_FOOTER.size:] = COMPRESSED_FOOTER.pack(algorithm, len(compressed), COMPRESSED_MARKER)
+    return page
+
+
+# Checks if the data of a page read from the file holds a compressed page
+def is_compressed(data) -> bool:
+    return len(data) == PAGE_SIZE and data[-FREE_SPACE_POINTER_SIZE:] == COMPRESSED_MARKER_BYTES
+
+
+# Returns the data of the compressed page stored in the data of a page read from the file
+def decompress_page(data) -> bytearray:
+    algorithm, length, _ = COMPRESSED_FOOTER.unpack(data[-COMPRESSED_FOOTER.size:])
+    return bytearray(DECOMPRESS[algorithm](bytes(data[:length])))
+
+
+# Packs the records from the start in the list into a compressed page that fits on one page after compression, with
+# COMPRESSION_HEADROOM bytes to spare. Returns the page and the number of records on it, (None, 0) if not even the
+# first record compresses well enough.
+def pack_compressed_page(records: list, start: int, compression: str) -> tuple:
+    end, used = start, FOOTER_SIZE
+    while end < len(records) and used + len(records[end]) + SLOT_ENTRY_SIZE <= COMPRESSED_PAGE_SIZE:
+        used += len(records[end]) + SLOT_ENTRY_SIZE
+        end += 1
+
+    # Binary search for the largest number of records that fits after compression
+    def fits(count: int):
+        page = Page.from_records(records[start:start + count], COMPRESSED_PAGE_SIZE)
+        return page if compress_page(page.data, compression, COMPRESSION_HEADROOM) is not None else None
+
+    best, lo, hi = None, 1, end - start
+    while lo <= hi:
+        count = (lo + hi) // 2
+        page = fits(count)
+        if page is None:
+            hi = count - 1
+        else:
+            best, lo = (page, count), count + 1
+    return best or (None, 0)
 
 
-# * The Page class represents a page in the database, containing records and a B+ tree index. It provides methods for
-# inserting, deleting, and updating records.
+# * The Page class represents a page in the database, containing records. It provides methods for inserting, deleting,
+# and updating records.
 class Page:
-    # Initialization of a Page instance with optional existing data
+    # Initialization of a Page instance with optional existing data, which can be a read-only view on the file. The data
+    # of a compressed page is decompressed.
     def __init__(self, data=None):
-        self.data = bytearray(PAGE_SIZE) if data is None else data
+        self.load(bytearray(PAGE_SIZE) if data is None else data)
+        if data is None:
+            self.update_header()
+
+    # Sets the data of the page, e.g. to replace it by the data of a compressed page
+    def load(self, data):
+        self.data = decompress_page(data) if is_compressed(data) else data
         self.page_footer = PageFooter(self.data)
-        page_footer_data = self.page_footer.data()
-        self.data[-len(page_footer_data):] = page_footer_data
-        self.bplus_tree_index = BPlusTreeIndex()
+        # Bytes before the free space pointer of deleted records and shrunk updates, reclaimed by compact_page
+        self.dead_space = self.page_footer.free_space_pointer - sum(
+            length for _, length in self.page_footer.slot_dir)
+
+    # Checks if the page is a compressed page: a page of COMPRESSED_PAGE_SIZE bytes that is compressed into one page in
+    # the file. A compressed page takes no new or grown records, so it keeps fitting on a page.
+    @property
+    def compressed(self) -> bool:
+        return len(self.data) > PAGE_SIZE
+
+    # Creates a packed page of the given size holding the given records in slots 0, 1, ..., the records have to fit on
+    # the page
+    @classmethod
+    def from_records(cls, records: list, page_size: int = PAGE_SIZE):
+        data = bytearray(page_size)
+        offset = 0
+        for slot_id, record in enumerate(records):
+            data[offset:offset + len(record)] = record
+            slot_offset = cls.calculate_slot_offset(slot_id, page_size)
+            data[slot_offset:slot_offset + SLOT_ENTRY_SIZE] = offset.to_bytes(OFFSET_SIZE, 'little') + len(
+                record).to_bytes(LENGTH_SIZE, 'little')
+            offset += len(record)
+        data[-FOOTER_SIZE:] = len(records).to_bytes(NUMBER_SLOTS_SIZE, 'little') + offset.to_bytes(
+            FREE_SPACE_POINTER_SIZE, 'little')
+        return cls(data)
+
+    # Copies read-only data (a memoryview over the mapped file) into a bytearray before the page is changed
+    def make_writable(self):
+        if not isinstance(self.data, bytearray):
+            self.data = bytearray(self.data)
 
     # Updates the header information in the page
     def update_header(self):
+        self.make_writable()
         page_footer_data = self.page_footer.data()
         self.data[-len(page_footer_data):] = page_footer_data
 
-    # Calculates and returns the free space available on the page
+    # Calculates and returns the free space available on the page, none on a compressed page
     def free_space(self):
         # 512 - 100 - (x * 8) - 4 = 508
         # Page header grows from bottom up, records grow top down.
         # Free space pointer - space occupied by page header - 4 bytes for free space pointer
-        return PAGE_SIZE - self.page_footer.free_space_pointer - (
+        if self.compressed:
+            return 0
+        return len(self.data) - self.page_footer.free_space_pointer - (
                 len(self.page_footer.slot_dir) * SLOT_ENTRY_SIZE) - FREE_SPACE_POINTER_SIZE - NUMBER_SLOTS_SIZE
 
+    # Returns the space a record can use after the page is compacted: the free space and the dead space
+    def available_space(self):
+        return 0 if self.compressed else self.free_space() + self.dead_space
+
+    # Returns the space a record takes on the page: its bytes and its slot
+    @staticmethod
+    def record_space(record) -> int:
+        return len(record) + SLOT_ENTRY_SIZE
+
     #  Calculate the offset of a slot in bytes
     @staticmethod
-    def calculate_slot_offset(slot_id):
+    def calculate_slot_offset(slot_id, page_size: int = PAGE_SIZE):
         """
         Calculate the offset of a slot in bytes, this is the location it starts, so write to right to left.
 
         :param slot_id: Slot id
+        :param page_size: Size of the page in bytes, larger for a compressed page
         :return: Offset in bytes
         """
-        return (PAGE_SIZE - FREE_SPACE_POINTER_SIZE * 2) - (SLOT_ENTRY_SIZE * (slot_id + 1))
+        return (page_size - FREE_SPACE_POINTER_SIZE * 2) - (SLOT_ENTRY_SIZE * (slot_id + 1))
 
     # Inserts a record into the page
-    def insert_record(self, record: bytearray):
+    def insert_record(self, record: bytearray) -> Optional[int]:
         """
         If there is not enough free space -> try to compact data, and use this free space, otherwise record can't be stored
         First check if there is a slot with 0 as length, to overwrite this
         :param record:
-        :return:
+        :return: Slot id of the inserted record, None if the record can't be stored
         """
         needed_space = len(record) + SLOT_ENTRY_SIZE
         if needed_space > self.free_space():
-            return False
+            if needed_space > self.available_space():
+                return None
+            # Lazy compaction: the dead space of deleted records is only reclaimed once it is needed
+            self.compact_page()
+        self.make_writable()
+        index = self.write_record(record)
+        self.update_header()
+        return index
+
+    # Inserts records from the given start in the list as long as they fit on the page, the footer is written once
+    def insert_records(self, records: list, start: int = 0) -> list:
+        """
+        The page is compacted at most once, when the records need its dead space.
 
+        :param records: Records to insert
+        :param start: Index in records of the first record to insert
+        :return: Slot ids of the inserted records, records[start:start + len(slot ids)]
+        """
+        available, needed_space, end = self.available_space(), 0, start
+        while end < len(records) and needed_space + len(records[end]) + SLOT_ENTRY_SIZE <= available:
+            needed_space += len(records[end]) + SLOT_ENTRY_SIZE
+            end += 1
+        if end == start:
+            return []
+        if needed_space > self.free_space():
+            self.compact_page()
+        self.make_writable()
+        slot_ids = [self.write_record(records[i]) for i in range(start, end)]
+        self.update_header()
+        return slot_ids
+
+    # Writes a record at the free space pointer in a free or new slot and returns the slot id, the page footer is not
+    # written
+    def write_record(self, record: bytearray) -> int:
         # Write data
         self.data[self.page_footer.free_space_pointer:self.page_footer.free_space_pointer + len(record)] = record
 
-        # Check if page is packed, meaning no deleted records
-        if self.is_packed():
-            index = self.page_footer.slot_count()
-        else:
-            index = 0
-            for i, (_, length) in enumerate(self.page_footer.slot_dir):
-                if length == 0:
-                    index = i
+        # Reuse the slot of a deleted record if there is one, otherwise add a slot
+        free_slots = self.page_footer.free_slots
+        index = free_slots.pop() if free_slots else self.page_footer.slot_count()
 
         # Update slots
-        new_slot_offset = Page.calculate_slot_offset(index)
+        new_slot_offset = Page.calculate_slot_offset(index, len(self.data))
 
         # (offset, length)
         self.data[new_slot_offset: new_slot_offset + OFFSET_SIZE] = self.page_footer.free_space_pointer.to_bytes(
@@ -73,70 +209,82 @@ class Page:
                                                                                                            'little')
 
         # Update page footer
-        if self.is_packed():
+        if index == self.page_footer.slot_count():
             self.page_footer.slot_dir.append((self.page_footer.free_space_pointer, len(record)))
         else:
             self.page_footer.slot_dir[index] = (self.page_footer.free_space_pointer, len(record))
 
         # Update free space pointer
         self.page_footer.free_space_pointer += len(record)
-        self.update_header()
-
-        return True
+        return index
 
-        key = record[:4]  # Take first bytes as key
-        page_number = record[-4:]  # Take last bytes as pagenumber
-        self.bplus_tree_index.insert(key, page_number)
-
-    # Deletes a record from the page
-    def delete_record(self, slot_id):
+    # Deletes a record from the page, its space is reclaimed right away if compact is set, otherwise it is dead space
+    # until the page is compacted
+    def delete_record(self, slot_id, compact: bool = True):
+        self.make_writable()
         offset, length = self.page_footer.slot_dir[slot_id]
+        if length == 0:
+            return  # Already deleted
         self.page_footer.slot_dir[slot_id] = (offset, 0)
-        new_slot_offset = Page.calculate_slot_offset(slot_id)
+        self.page_footer.free_slots.append(slot_id)
+        self.dead_space += length
+        new_slot_offset = Page.calculate_slot_offset(slot_id, len(self.data))
         number = 0
         self.data[new_slot_offset + OFFSET_SIZE:new_slot_offset + SLOT_ENTRY_SIZE] = number.to_bytes(LENGTH_SIZE,
                                                                                                      'little')
         # Fix fragmentation
-        self.compact_page()
+        if compact:
+            self.compact_page()
 
     #  Reads and returns a record from the page
     def read_record(self, slot_id):
         offset, length = self.page_footer.slot_dir[slot_id]
-        return self.data[offset: offset + length]
+        return bytearray(self.data[offset: offset + length])
 
-    # Updates a record on the page
-    def update_record(self, slot_id, new_record):
+    # Returns the (slot id, record) of every record on the page
+    def records(self) -> list:
+        return [(slot_id, bytearray(self.data[offset:offset + length]))
+                for slot_id, (offset, length) in enumerate(self.page_footer.slot_dir) if length != 0]
+
+    # Updates a record on the page, returns the (possibly new) slot id or None if the record no longer fits on the page.
+    # Without compact the space freed by a smaller record is left as dead space.
+    def update_record(self, slot_id, new_record, compact: bool = True) -> Optional[int]:
+        self.make_writable()
         offset, length = self.page_footer.slot_dir[slot_id]
+        # A record of a compressed page always moves, new data may not compress as well
+        if self.compressed:
+            self.delete_record(slot_id, compact)
+            return None
         # If new record size is equal, just overwrite
         if len(new_record) == length:
             self.data[offset:offset + length] = new_record
-            return True
+            return slot_id
         # If new record is smaller, we need to compact the page to avoid fragmentation
         elif len(new_record) < length:
             self.data[offset:offset + len(new_record)] = new_record
-            new_slot_offset = Page.calculate_slot_offset(slot_id)
+            new_slot_offset = Page.calculate_slot_offset(slot_id, len(self.data))
             self.page_footer.slot_dir[slot_id] = (offset, len(new_record))
             self.data[new_slot_offset + OFFSET_SIZE:new_slot_offset + SLOT_ENTRY_SIZE] = len(new_record).to_bytes(
                 LENGTH_SIZE, 'little')
-            self.compact_page()
-            return True
+            self.dead_space += length - len(new_record)
+            if compact:
+                self.compact_page()
+            return slot_id
         # New record is lager, we can just insert the record
         else:
             # Delete record, length will be set to -1
-            self.delete_record(slot_id)
+            self.delete_record(slot_id, compact)
             # If returns True, enough free space on the page and slot_id stays the same, else we need to find a new page
             return self.insert_record(new_record)
 
-    # Finds a record based on the provided byte_id
-    def find_record(self, byte_id: bytearray) -> int:
+    # Finds a record based on the provided byte_id by scanning the slots, the index in HeapFile avoids this scan
+    def find_record(self, byte_id: bytearray) -> Optional[int]:
         for slot_id, (offset, length) in enumerate(self.page_footer.slot_dir):
             # some record, we assume the first field is the id and an int
             record = self.data[offset: offset + length]
-            if byte_id == record[:4]:
+            if length != 0 and byte_id == record[:KEY_SIZE]:
                 return slot_id
-            key = byte_id[:4]  # Take first 4 bytes as key
-            page_number = self.bplus_tree_index.search(key)
-            return page_number
+        return None
 
     # Checks if the page is full
     def is_full(self):
@@ -147,32 +295,34 @@ class Page:
         """
         Check if page is packed, meaning no deleted records.
         """
-        return all(length != 0 for offset, length in self.page_footer.slot_dir)
+        return not self.page_footer.free_slots
 
     # Reclaims unused space to limit fragmentation
     def compact_page(self):
         """
         Reclaim unused space so that records are contiguous and limit fragmentation.
 
-        Eager -> compact page when a record is deleted (we do this)
-        Lazy -> compact page when page is full
+        Eager -> compact page when a record is deleted (the default of delete_record and update_record)
+        Lazy -> compact page when page is full (insert_record compacts when the dead space is needed)
         """
+        self.make_writable()
         write_ptr = 0
 
         for i, (offset, length) in sorted(enumerate(self.page_footer.slot_dir), key=lambda x: x[1][0]):
             # Skip deleted records
             if length != 0:
                 if offset != write_ptr:
-                    self.data[write_ptr:write_ptr + length] = self.data[offset:offset + length]
+                    self.data[write_ptr:write_ptr + length] = bytes(self.data[offset:offset + length])
                 self.page_footer.slot_dir[i] = (write_ptr, length)
                 # Update slots in bytes
-                new_slot_offset = Page.calculate_slot_offset(i)
+                new_slot_offset = Page.calculate_slot_offset(i, len(self.data))
                 self.data[new_slot_offset: new_slot_offset + OFFSET_SIZE] = write_ptr.to_bytes(OFFSET_SIZE, 'little')
                 self.data[new_slot_offset + OFFSET_SIZE: new_slot_offset + SLOT_ENTRY_SIZE] = length.to_bytes(
                     LENGTH_SIZE, 'little')
                 write_ptr += length
 
         self.page_footer.free_space_pointer = write_ptr
+        self.dead_space = 0
         self.update_header()
 
     # Dumps information about the data, footer, and records in the page
@@ -192,7 +342,7 @@ class Page:
 
         print(f"Number of slots: {self.page_footer.slot_count()}")
         print(
-            f"Number of slots (bytes): {int.from_bytes(self.data[PAGE_SIZE - FREE_SPACE_POINTER_SIZE * 2:PAGE_SIZE - FREE_SPACE_POINTER_SIZE], 'little')}")
+            f"Number of slots (bytes): {int.from_bytes(self.data[-FREE_SPACE_POINTER_SIZE * 2:-FREE_SPACE_POINTER_SIZE], 'little')}")
         print("\n")
 
         print("=== Record Dump ===")
@@ -225,12 +375,13 @@ class PageFooter:
         # Number of slots
         slot_count = int.from_bytes(data[-FOOTER_SIZE:-FREE_SPACE_POINTER_SIZE], 'little')
 
-        # Contains pairs (offset to beginning of record, length of record), if length == 0, then record is deleted
-        self.slot_dir = []
-        for i in range(slot_count):
-            slot = data[-FOOTER_SIZE - (i + 1) * SLOT_ENTRY_SIZE:-FOOTER_SIZE - i * SLOT_ENTRY_SIZE]
-            offset, length = slot[:OFFSET_SIZE], slot[LENGTH_SIZE:]
-            self.slot_dir.append((int.from_bytes(offset, 'little'), int.from_bytes(length, 'little')))
+        # Contains pairs (offset to beginning of record, length of record), if length == 0, then record is deleted. The
+        # slots are stored from right to left before the footer, they are unpacked at once and reversed.
+        start = len(data) - FOOTER_SIZE - slot_count * SLOT_ENTRY_SIZE
+        self.slot_dir = list(SLOT_ENTRY_FORMAT.iter_unpack(data[start:len(data) - FOOTER_SIZE]))
+        self.slot_dir.reverse()
+        # Slots of deleted records that can be reused, the last one is reused first
+        self.free_slots = [slot_id for slot_id, (_, length) in enumerate(self.slot_dir) if length == 0]
 
     # Returns the number of slots, written on the page footer
     def slot_count(self):
@@ -244,131 +395,107 @@ class PageFooter:
 
 
 # * The PageDirectory class manages a directory of pages and provides methods for finding, creating, and deleting pages.
+# The pages themselves are kept in the buffer pool of the heap file.
 class PageDirectory(Page):
     # Initialization of a PageDirectory instance with optional existing data
-    def __init__(self, file_path: str = None, data: bytearray = None, current_number: int = None):
+    def __init__(self, buffer_pool=None, data: bytearray = None, current_number: int = None):
         self.data = bytearray(PAGE_SIZE) if data is None else data
-        self.pages = {}  # Dictionary to store page information
-        self.file_path = file_path
+        self.buffer_pool = buffer_pool
         super().__init__(self.data)
         # Information about page directories
+        self.catalog_page = 0  # Only used in the first page directory
         if data is None and current_number is None:
             self.pd_number = 0
             self.next_dir = 0
-            byte_array = bytearray(
-                self.pd_number.to_bytes(PAGE_NUM_SIZE, 'little') + self.next_dir.to_bytes(FREE_SPACE_SIZE, 'little'))
-            # First slot points to record --> (current_pd_number, next_pd_number)
-            super().insert_record(byte_array)
+            # First slot points to record --> (current_pd_number, next_pd_number, catalog_page_number)
+            super().insert_record(self.directory_info())
         elif current_number is not None:
             self.pd_number = current_number + 1
             self.next_dir = 0
-            byte_array = bytearray(
-                self.pd_number.to_bytes(PAGE_NUM_SIZE, 'little') + self.next_dir.to_bytes(FREE_SPACE_SIZE, 'little'))
-            # First slot points to record --> (current_pd_number, next_pd_number)
-            super().insert_record(byte_array)
+            # First slot points to record --> (current_pd_number, next_pd_number, catalog_page_number)
+            super().insert_record(self.directory_info())
         else:
             record = super().read_record(0)
             self.pd_number, self.next_dir = int.from_bytes(record[:PAGE_NUM_SIZE], 'little'), int.from_bytes(
-                record[FREE_SPACE_SIZE:], 'little')
+                record[PAGE_NUM_SIZE:PAGE_NUM_SIZE + FREE_SPACE_SIZE], 'little')
+            # Directories written before the catalog existed have no catalog page number
+            self.catalog_page = int.from_bytes(record[PAGE_NUM_SIZE + FREE_SPACE_SIZE:], 'little')
 
-    # Finds a page in the directory based on the page number
-    def find_page(self, page_number) -> Optional[Page]:
-
-        if page_number in self.pages:
-            return self.pages[page_number]
-
-        for offset, length in self.page_footer.slot_dir[1:]:
-            data = self.data[offset:offset + length]
-            if int.from_bytes(data[:PAGE_NUM_SIZE], 'little') == page_number:
-                # TODO - Reading from record that was inserted while file was open and doesn't exist yet gives error
-                assert self.file_path is not None
-                with open(self.file_path, "rb") as db:
-                    db.seek(page_number * PAGE_SIZE)
-                    page = Page(bytearray(db.read(PAGE_SIZE)))
-                    self.pages[page_number] = page
-                    return page
-
-    # Finds a record in the directory based on the byte_id
-    def find_record(self, byte_id: bytearray) -> (int, int):
+    # Returns the directory information record --> (current_pd_number, next_pd_number, catalog_page_number)
+    def directory_info(self) -> bytearray:
+        return bytearray(
+            self.pd_number.to_bytes(PAGE_NUM_SIZE, 'little') + self.next_dir.to_bytes(FREE_SPACE_SIZE, 'little') +
+            self.catalog_page.to_bytes(PAGE_NUM_SIZE, 'little'))
+
+    # Writes the directory information to the first slot
+    def update_directory_info(self):
+        info = self.directory_info()
+        offset, length = self.page_footer.slot_dir[0]
+        self.make_writable()
+        self.mark_dirty()
+        if len(info) == length:
+            self.data[offset:offset + length] = info
+            return
+        # Directory information written before the catalog existed is shorter, move it to the end of the records
+        if len(info) - length > self.free_space():
+            raise ValueError('Page directory is full, the directory information can not be updated!')
+        Page.delete_record(self, 0)
+        Page.insert_record(self, info)
+
+    # Marks the directory as changed in the buffer pool, so it is written on the next commit
+    def mark_dirty(self):
+        if self.buffer_pool is not None and self.buffer_pool.contains(self.pd_number):
+            self.buffer_pool.mark_dirty(self.pd_number)
+
+    # Returns the (page number, free space) entries of the pages in the directory
+    def page_entries(self):
         for offset, length in self.page_footer.slot_dir[1:]:
-            page_number = int.from_bytes(self.data[offset: offset + PAGE_NUM_SIZE], 'little')
-            page: Page = self.find_page(page_number)
-            record = page.find_record(byte_id)
-            if record is not None:
-                return page, record
-        return False
-
-    # Finds or creates a data page for insertion of a record
-    def find_or_create_data_page_for_insert(self, needed_space):
-
-        page_num = 0
-        # TODO NOW - Minus one since first slot references to page dir. info
-        for slot_id in range(self.page_footer.slot_count() - 1):
-            # loop over slot, read in tuple(record) -> should contain (page num, free space)
-            # TODO NOW - Increase slot_id with 1 since first slot will reference page dir. info
-            offset, length = self.page_footer.slot_dir[slot_id + 1]
             record = self.data[offset: offset + length]
-            page_num, free_space = int.from_bytes(record[:PAGE_NUM_SIZE], 'little'), int.from_bytes(
-                record[FREE_SPACE_SIZE:], 'little')
-            if needed_space <= free_space:
-                break
-
-        else:
-            # no page found make new one
-            # save new page in footer, TODO Check if there is still space available to link to next page directory
-            # Check if there is enough free space in page dir. --> (page_nr, free_space) + slot size
-            if (PAGE_NUM_SIZE + FREE_SPACE_SIZE) + SLOT_ENTRY_SIZE > self.free_space():
-                return False
-
-            page = Page()
-            # Find the max. current page number
-            page_num = int.from_bytes(self.read_record(len(self.page_footer.slot_dir) - 1)[:PAGE_NUM_SIZE],
-                                      'little') + 1
-            byte_array = bytearray(
-                page_num.to_bytes(PAGE_NUM_SIZE, 'little') + page.free_space().to_bytes(FREE_SPACE_SIZE, 'little'))
-            # add data page info to page directory
-            super().insert_record(byte_array)
-            self.pages[page_num] = page
-            return True
-
-        # Gets executed when space is left in Page
-        assert self.file_path is not None
-        with open(self.file_path, "rb") as db:
-            db.seek(page_num * PAGE_SIZE)
-            page = Page(bytearray(db.read(PAGE_SIZE)))
-
-        self.pages[page_num] = page
-        return True
-
-    # Deletes a data page from the directory
-    def delete_data_page(self, page_number):
-        # Mark a data page as free in the directory
-        if page_number in self.pages:
-            self.pages[page_number]['status'] = 'free'
-            print(f"Deleted data page {page_number}")
-
-    # Inserts a record into the directory
-    def insert_record(self, data: bytearray):
-        for nr, page in self.pages.items():
-            if page.is_full():
-                # self.full_pages.append(self.pages.pop(page_number))
-                continue
-            elif page.insert_record(data):
-                self.update_free_space(nr, page.free_space())
-                return True  # Tuple written successfully
-        # All existing pages are full, create a new page and write the tuple
-        if not self.find_or_create_data_page_for_insert(len(data) + SLOT_ENTRY_SIZE):
-            return False
-        return self.insert_record(data)
-
-    # Updates the free space information for a page in the directory
+            yield int.from_bytes(record[:PAGE_NUM_SIZE], 'little'), int.from_bytes(
+                record[PAGE_NUM_SIZE:PAGE_NUM_SIZE + FREE_SPACE_SIZE], 'little')
+
+    # Returns the page number of the last page in the directory (the directory itself if it has no pages)
+    def last_page_number(self) -> int:
+        return int.from_bytes(self.read_record(len(self.page_footer.slot_dir) - 1)[:PAGE_NUM_SIZE], 'little')
+
+    # Checks if the page with the given page number belongs to this directory
+    def has_page(self, page_number) -> bool:
+        # Pages are numbered consecutively after the directory, the first slot references to page dir. info
+        return 0 < page_number - self.pd_number < self.page_footer.slot_count()
+
+    # Finds a page in the directory based on the page number, read with the factory (a slotted data page by default).
+    # The page stays pinned in the buffer pool until the caller unpins it
+    def find_page(self, page_number, factory=Page) -> Optional[Page]:
+        if not self.has_page(page_number):
+            return None
+        return self.buffer_pool.fetch(page_number, factory)
+
+    # Adds a page to the directory, returns its page number or None if the directory is full
+    def allocate_page(self, free_space: int = RESERVED_PAGE) -> Optional[int]:
+        # Check if there is enough free space in page dir. --> (page_nr, free_space) + slot size
+        if (PAGE_NUM_SIZE + FREE_SPACE_SIZE) + SLOT_ENTRY_SIZE > self.free_space():
+            return None
+
+        page_num = self.last_page_number() + 1
+        byte_array = bytearray(
+            page_num.to_bytes(PAGE_NUM_SIZE, 'little') + free_space.to_bytes(FREE_SPACE_SIZE, 'little'))
+        # add page info to page directory
+        super().insert_record(byte_array)
+        self.mark_dirty()
+        return page_num
+
+    # Updates the free space information for a page in the directory, only marks the directory dirty if it changed
     def update_free_space(self, page_nr, free_space):
         # TODO NOW - Calculate relative page_nr inside page dir.
         page_nr = page_nr - self.pd_number
         offset, length = self.page_footer.slot_dir[page_nr]
-        self.data[offset + PAGE_NUM_SIZE:offset + PAGE_NUM_SIZE + FREE_SPACE_SIZE] = free_space.to_bytes(
-            FREE_SPACE_SIZE, 'little')
+        free_space = free_space.to_bytes(FREE_SPACE_SIZE, 'little')
+        if self.data[offset + PAGE_NUM_SIZE:offset + PAGE_NUM_SIZE + FREE_SPACE_SIZE] != free_space:
+            self.make_writable()
+            self.data[offset + PAGE_NUM_SIZE:offset + PAGE_NUM_SIZE + FREE_SPACE_SIZE] = free_space
+            self.mark_dirty()
 
-    # Returns a list of free pages in the directory
+    # Returns a list of the empty data pages in the directory
     def list_free_pages(self):
-        return [page for page, info in self.pages.items() if info['status'] == 'free']
+        empty = Page().free_space()
+        return [page_number for page_number, free_space in self.page_entries() if free_space == empty]
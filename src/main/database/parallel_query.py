@@ -0,0 +1,160 @@
+# * Imports
+from src.main.database.disk_manager import DiskManager
+from src.main.database.pax_page import load_data_page
+from src.main.utils.constants import *
+import src.main.utils.utils as utils
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+import operator
+import os
+
+# Operators of a filter (column, operator, value), applied to a whole column at once
+FILTER_OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+                    '>=': operator.ge}
+# Aggregate functions of an aggregate (function, column), the column of a count is not used
+AGGREGATES = ('count', 'sum', 'min', 'max')
+# Number of page ranges per worker, so a worker that is done early takes over the rest of the work
+RANGES_PER_WORKER = 4
+
+
+# Splits the page numbers into at most parts ranges of consecutive page numbers of about the same size
+def page_ranges(page_numbers: list, parts: int) -> list:
+    parts = max(1, min(parts, len(page_numbers)))
+    size, rest = divmod(len(page_numbers), parts)
+    ranges, start = [], 0
+    for part in range(parts):
+        end = start + size + (part < rest)
+        ranges.append(page_numbers[start:end])
+        start = end
+    return [pages for pages in ranges if pages]
+
+
+# Reads the data pages (slotted or PAX pages of the schema) with the given page numbers from the file, consecutive pages
+# in one read
+def read_pages(disk: DiskManager, page_numbers: list, schema: List[str]) -> list:
+    pages, start = [], 0
+    while start < len(page_numbers):
+        end = start + 1
+        while end < len(page_numbers) and page_numbers[end] == page_numbers[end - 1] + 1:
+            end += 1
+        pages.extend(load_data_page(data, schema) for data in disk.read_pages(page_numbers[start], end - start))
+        start = end
+    return pages
+
+
+# Returns the values of a decoded column as an array, strings as an array of objects
+def column_values(column) -> np.ndarray:
+    if isinstance(column, utils.StringColumn):
+        return np.array(column.to_list(), dtype=object)
+    return column
+
+
+# Reduces the values of every group with an aggregate function, the values are sorted on their group and the groups
+# start at the given positions
+def reduce_groups(function: str, values: np.ndarray, starts: np.ndarray) -> list:
+    if function == 'count':
+        return np.diff(np.append(starts, len(values))).tolist()
+    if values.dtype == object:
+        groups = np.split(values, starts[1:])
+        reduce = {'sum': sum, 'min': min, 'max': max}[function]
+        return [reduce(group) for group in groups]
+    if function == 'sum':
+        return np.add.reduceat(values.astype(np.int64), starts).tolist()
+    return (np.minimum if function == 'min' else np.maximum).reduceat(values, starts).tolist()
+
+
+# Aggregates the records on a range of data pages of a database file, run by a worker process. Returns a dict from the
+# value of the group by field (None without grouping) to the list of partial aggregates of the group.
+def aggregate_pages(file_path: str, page_numbers: list, schema: List[str], aggregates: list, filters: list,
+                    group_by: Optional[int]) -> dict:
+    disk = DiskManager(file_path, use_mmap=True, read_only=True)
+    try:
+        columns = utils.decode_pages(read_pages(disk, page_numbers, schema), schema)
+    finally:
+        disk.close()
+
+    mask = np.ones(len(columns[0]) if columns else 0, dtype=bool)
+    for column, op, value in filters:
+        mask &= FILTER_OPERATORS[op](column_values(columns[column]), value)
+    if not mask.any():
+        return {}
+
+    # Sort the records on their group, so every aggregate is one reduction per group
+    keys = column_values(columns[group_by])[mask] if group_by is not None else np.zeros(int(mask.sum()), dtype=np.int8)
+    groups, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.flatnonzero(np.diff(inverse[order], prepend=-1))
+    partials = [reduce_groups(function, column_values(columns[column if column is not None else 0])[mask][order],
+                              starts)
+                for function, column in aggregates]
+    names = groups.tolist() if group_by is not None else [None]
+    return {name: [partial[i] for partial in partials] for i, name in enumerate(names)}
+
+
+# Merges the partial aggregates of a group into the aggregates of the group
+def merge_partials(aggregates: list, merged: list, partials: list) -> list:
+    if merged is None:
+        return list(partials)
+    for i, (function, _) in enumerate(aggregates):
+        if function in ('count', 'sum'):
+            merged[i] += partials[i]
+        else:
+            merged[i] = (min if function == 'min' else max)(merged[i], partials[i])
+    return merged
+
+
+# * The ParallelQuery class aggregates the records of a heap file in several processes, so the pages are decoded on
+# several cores instead of one (the GIL). The data pages of the page directory chain are split into ranges of
+# consecutive pages, which are handed to a ProcessPoolExecutor. Every worker opens the file read-only and memory-mapped,
+# decodes its pages into columns with the schema, applies the filters and computes partial aggregates per group; the
+# partial aggregates are merged in the calling process. The changes of the heap file are written to the file first,
+# so the workers see them, which commits them (HeapFile.flush).
+class ParallelQuery:
+    # Initialize a query executor on a heap file, with workers processes (by default one per core)
+    def __init__(self, heap_file, workers: int = None):
+        self.heap_file = heap_file
+        self.workers = workers or os.cpu_count() or 1
+
+    # Returns the aggregates of the records that pass all filters, per value of the group by field if given.
+    def aggregate(self, schema: List[str], aggregates: list, filters: list = None, group_by: int = None):
+        """
+        A filter is a (column, operator, value) tuple with an operator of FILTER_OPERATORS, an aggregate a (function,
+        column) tuple with a function of AGGREGATES, columns are indices in the schema. Sums, minimums and maximums
+        are computed over int, short and byte fields; minimums and maximums also over var_str fields.
+
+        :param schema: Schema of the records
+        :param aggregates: The (function, column) of every aggregate, e.g. [('count', None), ('sum', 2)]
+        :param filters: The (column, operator, value) a record has to pass, e.g. [(2, '>=', 18)]
+        :param group_by: Index of the field to group the records on
+        :return: A tuple with the aggregates, or a dict from every value of the group by field to such a tuple. The
+            minimum and maximum of no records are None.
+
+        The changes of the heap file are committed first (HeapFile.flush), also when they were not committed yet.
+        """
+        filters = list(filters or [])
+        for function, column in aggregates:
+            if function not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate {function}")
+        for column, op, value in filters:
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator {op}")
+
+        self.heap_file.flush()
+        ranges = page_ranges(self.heap_file.data_page_numbers(), self.workers * RANGES_PER_WORKER)
+        args = (schema, aggregates, filters, group_by)
+        if self.workers == 1:
+            results = [aggregate_pages(self.heap_file.file_path, pages, *args) for pages in ranges]
+        else:
+            with ProcessPoolExecutor(self.workers) as executor:
+                results = list(executor.map(aggregate_pages, [self.heap_file.file_path] * len(ranges), ranges,
+                                            *([arg] * len(ranges) for arg in args)))
+
+        merged = {}
+        for result in results:
+            for group, partials in result.items():
+                merged[group] = merge_partials(aggregates, merged.get(group), partials)
+        if group_by is not None:
+            return {group: tuple(values) for group, values in sorted(merged.items())}
+        empty = [0 if function in ('count', 'sum') else None for function, _ in aggregates]
+        return tuple(merged.get(None, empty))
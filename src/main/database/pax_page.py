@@ -0,0 +1,255 @@
+# * Imports
+from src.main.database.page import Page
+from src.main.utils.constants import *
+import src.main.utils.utils as utils
+from functools import lru_cache
+from typing import List, Optional
+import numpy as np
+import struct
+
+# End of a PAX page: bytes in use, number of rows and a marker in the place of the free space pointer of a slotted page
+PAX_FOOTER = struct.Struct('<HHH')
+PAX_MARKER = 0xFFFE
+PAX_MARKER_BYTES = PAX_MARKER.to_bytes(FREE_SPACE_POINTER_SIZE, 'little')
+PAX_PREFIX = 'pax:'  # Catalog name of the schema of a PAX file, 'pax:int,var_str,...'
+MINIPAGE_START = np.dtype('<u2')  # Start of every minipage, in the page header
+STRING_OFFSET = np.dtype('<u2')  # Offsets of the strings in a var_str minipage
+
+
+# Checks if the data of a page read from the file holds a PAX page
+def is_pax_page(data) -> bool:
+    return data[-FREE_SPACE_POINTER_SIZE:] == PAX_MARKER_BYTES
+
+
+# Returns a data page read from the file: a PaxPage for the data of a PAX page, otherwise a Page
+def load_data_page(data, schema: List[str]):
+    return PaxPage(schema, data) if is_pax_page(data) else Page(data)
+
+
+# Returns the layout of a schema on a PAX page: its codec, the NumPy type of every field (None for a var_str field)
+# and the indices of the var_str fields
+@lru_cache(maxsize=None)
+def pax_layout(schema: tuple) -> tuple:
+    dtypes = [utils.FIXED_FIELD_DTYPES.get(field_type) for field_type in schema]
+    return utils.compile_schema(schema), dtypes, [i for i, dtype in enumerate(dtypes) if dtype is None]
+
+
+# * The PaxPage class is a data page in the PAX layout (Partition Attributes Across): the values of each field of the
+# records on the page are stored together in a minipage, so a scan that needs a few fields only reads their minipages.
+# The page starts with the start of every minipage, followed by a live byte per row and the minipages in the order of
+# the schema: a fixed-width field is an array of its values, a var_str field the offsets of its strings followed by the
+# UTF-8 bytes of all strings. A row is the slot of a record, a deleted row keeps its place (so record ids stay valid)
+# and is reused by the next insert. The records go in and out encoded like on a slotted page. When the page changes its
+# values are kept by row in memory, and the page is written again when its data is needed.
+class PaxPage:
+    # Initialization of an empty PAX page for records of the schema, or of a page with existing data
+    def __init__(self, schema: List[str], data=None):
+        self.schema = tuple(schema)
+        self.codec, self.dtypes, self.strings = pax_layout(self.schema)
+        self.dead_space = 0  # The space of a deleted record is free right away
+        self.compressed = False
+        self.rows = None  # The values of every row, read from the data once the page changes
+        self.live = None
+        self.free_rows = None
+        if data is None:
+            self.count, self.rows, self.live, self.free_rows = 0, [], [], []
+            self.used = self.header_size() + PAX_FOOTER.size + STRING_OFFSET.itemsize * len(self.strings)
+            self.encoded = None
+        else:
+            self.used, self.count, _ = PAX_FOOTER.unpack(data[-PAX_FOOTER.size:])
+            self.encoded = data
+
+    # Returns the data of the page, written again from the rows if the page changed
+    @property
+    def data(self):
+        if self.encoded is None:
+            self.encoded = self.encode()
+        return self.encoded
+
+    # Returns the size of the page header, the starts of the minipages
+    def header_size(self) -> int:
+        return len(self.schema) * MINIPAGE_START.itemsize
+
+    # Returns the start of every minipage, read from the page header
+    def minipage_starts(self) -> np.ndarray:
+        return np.frombuffer(self.data, dtype=MINIPAGE_START, count=len(self.schema))
+
+    # Writes the rows into the data of a page
+    def encode(self) -> bytearray:
+        parts = [bytes(self.live)]
+        for field, dtype in enumerate(self.dtypes):
+            values = [row[field] for row in self.rows]
+            if dtype is not None:
+                parts.append(np.array(values, dtype=dtype).tobytes())
+                continue
+            offsets = np.zeros(self.count + 1, dtype=STRING_OFFSET)
+            np.cumsum([len(value) for value in values], out=offsets[1:])
+            parts.append(offsets.tobytes() + b''.join(values))
+
+        data = bytearray(PAGE_SIZE)
+        starts = np.cumsum([self.header_size()] + [len(part) for part in parts])
+        data[:self.header_size()] = starts[1:-1].astype(MINIPAGE_START).tobytes()
+        data[self.header_size():starts[-1]] = b''.join(parts)
+        data[-PAX_FOOTER.size:] = PAX_FOOTER.pack(self.used, self.count, PAX_MARKER)
+        return data
+
+    # Reads the values of every row from the data, before the page changes
+    def read_rows(self):
+        if self.rows is not None:
+            return
+        live_start = self.header_size()
+        self.live = list(self.data[live_start:live_start + self.count])
+        columns = [self.column(field, live_only=False) for field in range(len(self.schema))]
+        self.rows = [list(row) for row in zip(*columns)] if columns else []
+        self.free_rows = [row for row, live in enumerate(self.live) if not live]
+
+    # Returns the values of a field of the rows, only of the live rows if live_only is set. A fixed-width field is
+    # returned as a NumPy array over the minipage, a var_str field as a list of UTF-8 bytes.
+    def column(self, field: int, live_only: bool = True):
+        dtype = self.dtypes[field]
+        if dtype is not None:
+            start = int(self.minipage_starts()[field])
+            values = np.frombuffer(memoryview(self.data)[start:start + self.count * dtype.itemsize], dtype=dtype)
+            return values[self.live_mask()] if live_only else values.tolist()
+        offsets, strings = self.string_minipage(field)
+        values = [strings[begin:end].tobytes() for begin, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        if not live_only:
+            return values
+        return [value for value, live in zip(values, self.live_mask()) if live]
+
+    # Returns the string offsets and a memoryview over the string bytes of a var_str minipage, string i is
+    # strings[offsets[i]:offsets[i + 1]]
+    def string_minipage(self, field: int) -> (np.ndarray, memoryview):
+        view = memoryview(self.data)
+        start = int(self.minipage_starts()[field])
+        end = start + (self.count + 1) * STRING_OFFSET.itemsize
+        offsets = np.frombuffer(view[start:end], dtype=STRING_OFFSET)
+        return offsets, view[end:end + int(offsets[-1])]
+
+    # Returns a boolean array with the live rows
+    def live_mask(self) -> np.ndarray:
+        live_start = self.header_size()
+        return np.frombuffer(memoryview(self.data)[live_start:live_start + self.count], dtype=np.uint8) != 0
+
+    # Returns the values of the given fields of the live rows as lists of Python values, one list per field
+    def read_columns(self, fields: List[int]) -> list:
+        columns = []
+        for field in fields:
+            values = self.column(field)
+            columns.append([str(value, 'utf-8') for value in values] if self.dtypes[field] is None else values.tolist())
+        return columns
+
+    # Returns the columns of the live rows like RecordCodec.decode_columns: a NumPy array per fixed-width field and a
+    # StringColumn per var_str field. The strings of a deleted row are empty, so the string bytes are taken as they are.
+    def decode_columns(self) -> list:
+        mask = self.live_mask()
+        columns = []
+        for field, dtype in enumerate(self.dtypes):
+            if dtype is not None:
+                columns.append(self.column(field))
+                continue
+            offsets, strings = self.string_minipage(field)
+            offsets = np.concatenate((offsets[:1], offsets[1:][mask])).astype(np.int64)
+            columns.append(utils.StringColumn(offsets, np.frombuffer(strings.tobytes(), dtype=np.uint8)))
+        return columns
+
+    # Splits an encoded record into the values of its fields, var_str values as UTF-8 bytes
+    def split_record(self, record) -> list:
+        values, offset = [], 0
+        for packer, _, _ in self.codec.runs:
+            if packer is None:
+                length = record[offset]
+                values.append(bytes(record[offset + 1:offset + 1 + length]))
+                offset += 1 + length
+            else:
+                values.extend(packer.unpack_from(record, offset))
+                offset += packer.size
+        return values
+
+    # Returns the space a record takes on a new row: a live byte, its fixed-width values and an offset and the bytes of
+    # every string. In the same units as free_space, for the free space map.
+    def record_space(self, record) -> int:
+        return 1 + len(record) + len(self.strings)
+
+    # Returns the bytes of the strings of a row
+    def string_space(self, values) -> int:
+        return sum(len(values[field]) for field in self.strings)
+
+    # Returns the number of bytes that are free on the page
+    def free_space(self) -> int:
+        return PAGE_SIZE - self.used
+
+    # Returns the space a record can use, on a PAX page the free space
+    def available_space(self) -> int:
+        return self.free_space()
+
+    # Inserts a record on a deleted row or a new row, returns the row or None if the record does not fit on the page
+    def insert_record(self, record) -> Optional[int]:
+        values = self.split_record(record)
+        self.read_rows()
+        space = self.string_space(values) if self.free_rows else self.record_space(record)
+        if space > self.free_space():
+            return None
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.rows[row], self.live[row] = values, 1
+        else:
+            row = self.count
+            self.rows.append(values)
+            self.live.append(1)
+            self.count += 1
+        self.used += space
+        self.encoded = None
+        return row
+
+    # Inserts records from the given start in the list as long as they fit on the page, returns their rows
+    def insert_records(self, records: list, start: int = 0) -> list:
+        rows = []
+        for record in records[start:]:
+            row = self.insert_record(record)
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+    # Reads and returns the record of a row, encoded like on a slotted page (empty for a deleted row)
+    def read_record(self, row) -> bytearray:
+        self.read_rows()
+        if not self.live[row]:
+            return bytearray()
+        return self.codec.encode([str(value, 'utf-8') if field in self.strings else value
+                                  for field, value in enumerate(self.rows[row])])
+
+    # Returns the (row, record) of every live row
+    def records(self) -> list:
+        self.read_rows()
+        return [(row, self.read_record(row)) for row, live in enumerate(self.live) if live]
+
+    # Deletes the record of a row, its strings are removed right away and the row is reused by the next insert
+    def delete_record(self, row, compact: bool = True):
+        self.read_rows()
+        if not self.live[row]:
+            return
+        self.used -= self.string_space(self.rows[row])
+        self.rows[row] = [b'' if dtype is None else 0 for dtype in self.dtypes]
+        self.live[row] = 0
+        self.free_rows.append(row)
+        self.encoded = None
+
+    # Updates the record of a row, returns the row or None if the new record does not fit on the page. A record that
+    # does not fit is deleted from the page.
+    def update_record(self, row, new_record, compact: bool = True) -> Optional[int]:
+        self.read_rows()
+        values = self.split_record(new_record)
+        growth = self.string_space(values) - self.string_space(self.rows[row])
+        if growth > self.free_space():
+            self.delete_record(row)
+            return None
+        self.rows[row] = values
+        self.used += growth
+        self.encoded = None
+        return row
+
+    # Nothing to compact, the space of deleted records is free right away
+    def compact_page(self):
+        pass
@@ -0,0 +1,89 @@
+# * Imports
+from src.main.database.bplus_three import BPlusTreeIndex, PageNodeStore
+from src.main.utils.constants import *
+import src.main.utils.utils as utils
+from typing import List
+import zlib
+
+# Size of the keys of a secondary index: the key of the column value followed by the id of the record
+SECONDARY_KEY_SIZE = 8
+ID_BITS = 8 * KEY_SIZE
+ID_MASK = (1 << ID_BITS) - 1
+# Prefix of the catalog names of the secondary indexes
+INDEX_PREFIX = 'index:'
+
+
+# * The SecondaryIndex class finds records on the value of any field, through a B+ tree stored in the heap file next to
+# the primary key index. Values can occur many times, so every record gets a unique composite key: the key of its value
+# in the high bits and its id in the low bits. The records with a value are then one range of the three. The key of an
+# int, short or byte value is the value itself, the key of a var_str value its CRC-32, so the records found for a
+# string must still be checked on their value.
+class SecondaryIndex:
+    # Initialize an empty index on the given field of the schema, or load an existing index from its meta page
+    def __init__(self, heap_file, column: int, schema: List[str], meta_page: int = None):
+        """
+        :param heap_file: Heap file that stores the records and the index
+        :param column: Index of the indexed field in the schema
+        :param schema: Schema of the records, only the fields up to the indexed field are used
+        :param meta_page: Page number of the meta page of an existing index
+        """
+        if not 0 <= column < len(schema):
+            raise ValueError(f"Column {column} is not in the schema!")
+        self.column = column
+        self.schema = tuple(schema[:column + 1])
+        self.codec = utils.compile_schema(self.schema)
+        self.index = BPlusTreeIndex(PageNodeStore(heap_file, SECONDARY_KEY_SIZE), meta_page,
+                                    fan_out=None if meta_page is not None else heap_file.index_fan_out)
+
+    # Returns the catalog name of the index, which holds the indexed field and the schema up to it
+    @property
+    def name(self) -> str:
+        return f"{INDEX_PREFIX}{self.column}:{','.join(self.schema)}"
+
+    # Returns the page number of the meta page of the index, stored in the catalog
+    @property
+    def meta_page(self) -> int:
+        return self.index.meta_page
+
+    # Returns the index on the field and schema stored under a catalog name
+    @staticmethod
+    def from_catalog(heap_file, name: str, meta_page: int):
+        column, schema = name[len(INDEX_PREFIX):].split(':')
+        return SecondaryIndex(heap_file, int(column), schema.split(','), meta_page)
+
+    # Returns the key of a value of the indexed field
+    def value_key(self, value) -> int:
+        if self.schema[-1] == 'var_str':
+            return zlib.crc32(value.encode('utf-8'))
+        return value
+
+    # Returns the value of the indexed field of an encoded record
+    def value(self, record) -> object:
+        return self.codec.decode_fields(record, [self.column])[0]
+
+    # Returns the composite key of an encoded record
+    def record_key(self, record) -> int:
+        return (self.value_key(self.value(record)) << ID_BITS) | int.from_bytes(record[:KEY_SIZE], 'little')
+
+    # Returns the most pages an operation on the index keeps pinned at once
+    def pinned_pages(self) -> int:
+        return self.index.pinned_pages()
+
+    # Adds an encoded record stored at the given (page number, slot id) to the index
+    def insert(self, record, record_id: (int, int)):
+        self.index.insert(self.record_key(record), record_id)
+
+    # Removes an encoded record from the index
+    def delete(self, record):
+        self.index.delete(self.record_key(record))
+
+    # Builds the index bottom-up from all (page number, slot id, record) of the heap file, the index must be empty
+    def bulk_load(self, records) -> int:
+        return self.index.bulk_load(sorted((self.record_key(record), (page_number, slot_id))
+                                           for page_number, slot_id, record in records))
+
+    # Returns the (page number, slot id) of the records that may have the given value, a var_str value can share its
+    # key with other values
+    def search(self, value) -> list:
+        low = self.value_key(value) << ID_BITS
+        return [record_id for _, record_id in self.index.range_search(low, low | ID_MASK)]
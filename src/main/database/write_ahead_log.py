@@ -0,0 +1,135 @@
+# * Imports
+from src.main.utils.constants import *
+import os
+import struct
+import threading
+import zlib
+
+# Types of the log records
+REDO_RECORD = 1  # Image of a page after a change, applied when its commit record is in the log
+UNDO_RECORD = 2  # Image of a page in the file before an uncommitted change was written over it
+COMMIT_RECORD = 3  # End of a commit, the redo records before it are durable
+# Header of a log record: type, page number (number of pages for a commit record) and CRC-32 of the record
+RECORD_HEADER = struct.Struct('<BII')
+
+
+# Returns a log record of the given type for a page number and its data
+def log_record(record_type: int, page_number: int, data=b'') -> bytes:
+    header = record_type.to_bytes(1, 'little') + page_number.to_bytes(4, 'little')
+    return RECORD_HEADER.pack(record_type, page_number, zlib.crc32(data, zlib.crc32(header))) + bytes(data)
+
+
+# * The WriteAheadLog class makes the commits of a heap file atomic and durable. A commit appends the images of the
+# changed pages (redo records) and a commit record to a log file next to the database file, and syncs only the log:
+# one sequential write and one fsync, the pages are written to the database file later. Commits of several threads
+# that wait for a sync at the same time are synced together (group commit). Before an uncommitted page is written
+# over a page of the file (on eviction), the old image is logged (undo record). On opening, recover returns the pages
+# to write: the last committed images of the pages, and the old images of pages with uncommitted changes. The log is
+# truncated after a checkpoint, once all pages are written to the file and synced.
+class WriteAheadLog:
+    # Opens (or creates) the log file
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.file = open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b')
+        self.file.seek(0, os.SEEK_END)
+        # Offsets keep growing when the log is truncated, so a thread that waits for a sync across a truncate is done
+        self.start = 0  # Offset of the start of the log file
+        self.written = self.file.tell()  # Offset up to which records are written
+        self.synced = self.written  # Offset up to which records are synced to the disk
+        self.syncs = 0  # Number of syncs of the log
+        self.lock = threading.Lock()
+        self.synced_condition = threading.Condition(self.lock)
+        self.syncing = False
+
+    # Returns the size of the log in bytes
+    def size(self) -> int:
+        return self.written - self.start
+
+    # Appends records to the log and returns the offset after them
+    def append(self, records: list) -> int:
+        with self.lock:
+            self.file.write(b''.join(records))
+            self.written += sum(len(record) for record in records)
+            return self.written
+
+    # Logs the images of the changed pages and a commit record, and returns once they are synced
+    def commit(self, pages: list):
+        self.sync(self.append_commit(pages))
+
+    # Appends the images of the changed pages and a commit record without syncing them, returns the offset to sync to
+    def append_commit(self, pages: list) -> int:
+        records = [log_record(REDO_RECORD, page_number, data) for page_number, data in pages]
+        records.append(log_record(COMMIT_RECORD, len(pages)))
+        return self.append(records)
+
+    # Logs the old images of pages before uncommitted changes are written over them, and returns once they are synced
+    def log_undo(self, pages: list):
+        self.sync(self.append([log_record(UNDO_RECORD, page_number, data) for page_number, data in pages]))
+
+    # Returns once the log is synced up to the offset. The first thread that has to sync syncs everything written so
+    # far, the threads that wait meanwhile are done when that covers their records.
+    def sync(self, offset: int):
+        with self.lock:
+            while self.synced < offset:
+                if self.syncing:
+                    self.synced_condition.wait()
+                    continue
+                self.syncing = True
+                target = self.written
+                self.file.flush()
+                self.lock.release()
+                try:
+                    self.sync_file()
+                finally:
+                    self.lock.acquire()
+                    self.syncing = False
+                    self.synced_condition.notify_all()
+                self.synced = max(self.synced, target)
+                self.syncs += 1
+
+    # Syncs the log file to the disk
+    def sync_file(self):
+        os.fsync(self.file.fileno())
+
+    # Reads the log and returns the (page number, data) pairs to write to the database file to bring it back to its
+    # last commit. Reading stops at the first incomplete or corrupt record, the tail of a crash during a write.
+    def recover(self) -> list:
+        self.file.seek(0)
+        log = self.file.read()
+        committed = {}  # Page number -> last committed image
+        pending = []  # Records after the last commit record
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(log):
+            record_type, page_number, crc = RECORD_HEADER.unpack_from(log, offset)
+            size = 0 if record_type == COMMIT_RECORD else PAGE_SIZE
+            end = offset + RECORD_HEADER.size + size
+            data = log[offset + RECORD_HEADER.size:end]
+            if record_type not in (REDO_RECORD, UNDO_RECORD, COMMIT_RECORD) or end > len(log) or \
+                    log_record(record_type, page_number, data) != log[offset:end]:
+                break
+            if record_type == COMMIT_RECORD:
+                committed.update((page, image) for kind, page, image in pending if kind == REDO_RECORD)
+                pending = []
+            else:
+                pending.append((record_type, page_number, data))
+            offset = end
+
+        # Pages of the uncommitted tail get their oldest image back, unless a commit has a newer image of them
+        restored = {}
+        for record_type, page_number, data in reversed(pending):
+            if record_type == UNDO_RECORD and page_number not in committed:
+                restored[page_number] = data
+        restored.update(committed)
+        return sorted(restored.items())
+
+    # Empties the log, after all its pages are written to the database file and synced
+    def truncate(self):
+        with self.lock:
+            self.file.seek(0)
+            self.file.truncate()
+            self.file.flush()
+            self.start = self.synced = self.written
+
+    # Closes the log file
+    def close(self):
+        self.file.close()
@@ -0,0 +1,60 @@
+# * Imports
+from src.main.database.bplus_three import BPlusTreeIndex, NodeStore
+from typing import List, NamedTuple
+import random
+import time
+
+PAGE_SIZES = [512, 1024, 2048, 4096, 8192, 16384]
+
+
+# * The IndexBenchmark class holds the result of one benchmark run of the B+ tree for a page size and fan-out.
+class IndexBenchmark(NamedTuple):
+    page_size: int
+    fan_out: int
+    height: int
+    inserts_per_second: float
+    lookups_per_second: float
+
+
+# Inserts keys in random order into an in-memory B+ tree and looks them all up again, for every combination of page
+# size and fan-out. A fan-out of None uses as many children as fit on a page, fan-outs that do not fit are skipped.
+def benchmark_index(page_sizes: List[int] = None, fan_outs: list = None,
+                    num_keys: int = 100000) -> List[IndexBenchmark]:
+    """
+    Benchmarks the B+ tree for different page sizes and fan-outs.
+
+    :param page_sizes: Page sizes in bytes, 512B up to 16KB by default
+    :param fan_outs: Maximum numbers of children of a node, None for the capacity of a page
+    :param num_keys: Number of keys inserted and looked up per run
+    :return: An IndexBenchmark per run
+    """
+    keys = list(range(num_keys))
+    random.shuffle(keys)
+    results = []
+    for page_size in PAGE_SIZES if page_sizes is None else page_sizes:
+        for fan_out in [None] if fan_outs is None else fan_outs:
+            try:
+                index = BPlusTreeIndex(NodeStore(page_size), fan_out=fan_out)
+            except ValueError:
+                continue
+            start = time.perf_counter()
+            for key in keys:
+                index.insert(key, (key, 0))
+            insert_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for key in keys:
+                index.search(key)
+            lookup_time = time.perf_counter() - start
+
+            results.append(IndexBenchmark(page_size, index.internal_capacity + 1, index.height(),
+                                          num_keys / insert_time, num_keys / lookup_time))
+    return results
+
+
+# Main method to sweep page sizes and fan-outs and print the results as a table.
+if __name__ == '__main__':
+    print(f"{'page size':>10} {'fan-out':>8} {'height':>7} {'inserts/s':>12} {'lookups/s':>12}")
+    for result in benchmark_index(fan_outs=[None, 16, 64, 256]):
+        print(f"{result.page_size:>10} {result.fan_out:>8} {result.height:>7} {result.inserts_per_second:>12.0f} "
+              f"{result.lookups_per_second:>12.0f}")
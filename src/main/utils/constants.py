@@ -9,7 +9,39 @@ FREE_SPACE_POINTER_SIZE = 2
 NUMBER_SLOTS_SIZE = 2
 FOOTER_SIZE = FREE_SPACE_POINTER_SIZE + NUMBER_SLOTS_SIZE
 
+# Fraction of a page that is dead space (deleted records) before it is compacted with the 'threshold' policy
+COMPACTION_THRESHOLD = 0.25
+# Size of a compressed data page, which is compressed into one page in the file: up to 8 pages of records, as far as
+# the 2-byte offsets of the slots reach
+COMPRESSED_PAGE_SIZE = min(8 * PAGE_SIZE, 2 ** (8 * OFFSET_SIZE - 1))
+COMPRESSION_HEADROOM = 64  # Bytes a compressed page keeps free in the file, for deletes that compress a bit worse
+COLD_PAGE_FILL = 0.9  # Fraction of a data page in use from which it is full and compressed by HeapFile.compress
+COMPRESS_CHUNK_PAGES = 64  # Number of cold pages HeapFile.compress repacks at once
+
 # PageDirectory Constants
 PAGE_NUM_SIZE = 3
 FREE_SPACE_SIZE = 3
-CACHE_SIZE = 10
+CACHE_SIZE = 1024  # Number of pages kept in memory by the buffer pool
+# Pages an operation keeps pinned besides the index nodes: the catalog, a page directory and a data page, and the page
+# directory and free space map page of a page that is allocated meanwhile
+FILE_PINNED_PAGES = 5
+READ_AHEAD_PAGES = 32  # Number of pages a scan reads ahead in one read
+WAL_CHECKPOINT_PAGES = 1024  # Number of pages in the write-ahead log after which a commit writes a checkpoint
+IO_THREADS = 16  # Number of threads of an AsyncController that do the blocking work of its calls
+SCAN_BATCH = 1024  # Number of records an asynchronous scan decodes in one call on an I/O thread
+# Free space value of a directory entry for a page that holds no records (catalog and index pages)
+RESERVED_PAGE = 2 ** (8 * FREE_SPACE_SIZE) - 1
+
+# B+ Tree Index Constants
+KEY_SIZE = 4  # The id (first field of a record) is a 4-byte int
+SLOT_ID_SIZE = 2
+RECORD_ID_SIZE = PAGE_NUM_SIZE + SLOT_ID_SIZE  # (page number, slot id)
+NODE_TYPE_SIZE = 1
+NODE_HEADER_SIZE = NODE_TYPE_SIZE + NUMBER_SLOTS_SIZE + PAGE_NUM_SIZE  # (node type, number of keys, next leaf)
+
+# Hash Index Constants
+HASH_LOAD_FACTOR = 0.75  # Fraction of the bucket entries that is used before a bucket is split
+
+# Free Space Map Constants
+FSM_ENTRY_SIZE = 2  # Free space of one page in the free space map
+FSM_BUCKET_SIZE = 64  # Width in bytes of a free space class, the map has PAGE_SIZE // FSM_BUCKET_SIZE classes
@@ -1,6 +1,8 @@
 # * Imports
 import struct
+from functools import lru_cache
 from faker import Faker
+import numpy as np
 import pandas as pd
 import random
 from typing import List
@@ -43,22 +45,183 @@ def decode_field(byte_array, start_idx, field_type):
         raise ValueError(f"Unknown field_type {field_type}")
 
 
+# struct format characters and NumPy types of the fixed-width field types
+FIXED_FIELD_FORMATS = {'int': 'I', 'short': 'H', 'byte': 'B'}
+FIXED_FIELD_DTYPES = {'int': np.dtype('<u4'), 'short': np.dtype('<u2'), 'byte': np.dtype('u1')}
+
+
+# * The RecordCodec class encodes and decodes records of one schema. It is compiled once per schema: every run of
+# consecutive fixed-width fields is packed and unpacked with one struct.Struct, a var_str field is a length byte
+# followed by the UTF-8 bytes.
+class RecordCodec:
+    # Compiles the schema into runs of (struct, first field, end field), the struct is None for a var_str field
+    def __init__(self, schema: List[str]):
+        self.schema = list(schema)
+        self.runs = []
+        fixed, first = '', 0
+        for i, field_type in enumerate(self.schema + [None]):
+            if field_type in FIXED_FIELD_FORMATS:
+                fixed += FIXED_FIELD_FORMATS[field_type]
+                continue
+            if fixed:
+                self.runs.append((struct.Struct('<' + fixed), first, i))
+                fixed = ''
+            if field_type == 'var_str':
+                self.runs.append((None, i, i + 1))
+            elif field_type is not None:
+                raise ValueError(f"Unknown field_type {field_type}")
+            first = i + 1
+
+    # Returns the encoded fields of a record, the var_str fields as a length byte and the UTF-8 bytes
+    def encode_fields(self, record) -> list:
+        parts = []
+        try:
+            for packer, first, end in self.runs:
+                if packer is None:
+                    encoded = record[first].encode('UTF-8')
+                    if len(encoded) > 255:
+                        raise ValueError('A var_str field can hold at most 255 bytes!')
+                    parts.append(bytes((len(encoded),)))
+                    parts.append(encoded)
+                else:
+                    parts.append(packer.pack(*record[first:end]))
+        except struct.error as e:
+            raise ValueError(f"Record does not match the schema: {e}")
+        return parts
+
+    # Encodes a record into a new bytearray
+    def encode(self, record) -> bytearray:
+        return bytearray(b''.join(self.encode_fields(record)))
+
+    # Returns the number of bytes of the encoded record
+    def size(self, record) -> int:
+        return sum(len(part) for part in self.encode_fields(record))
+
+    # Decodes a record from a buffer (bytes, bytearray or memoryview) starting at the offset, the fixed-width fields
+    # are unpacked in place
+    def decode(self, buffer, offset: int = 0) -> tuple:
+        fields = []
+        for packer, _, _ in self.runs:
+            if packer is None:
+                length = buffer[offset]
+                fields.append(str(buffer[offset + 1:offset + 1 + length], 'utf-8'))
+                offset += 1 + length
+            else:
+                fields.extend(packer.unpack_from(buffer, offset))
+                offset += packer.size
+        return tuple(fields)
+
+    # Decodes only the given fields (indices in the schema) of a record, in the order they are given. Other fields are
+    # skipped without decoding them, and nothing after the last needed field is read.
+    def decode_fields(self, buffer, fields: List[int], offset: int = 0) -> tuple:
+        needed = set(fields)
+        last = max(needed, default=-1)
+        values = {}
+        for packer, first, end in self.runs:
+            if first > last:
+                break
+            if packer is None:
+                length = buffer[offset]
+                if first in needed:
+                    values[first] = str(buffer[offset + 1:offset + 1 + length], 'utf-8')
+                offset += 1 + length
+                continue
+            if not needed.isdisjoint(range(first, end)):
+                values.update(zip(range(first, end), packer.unpack_from(buffer, offset)))
+            offset += packer.size
+        return tuple(values[field] for field in fields)
+
+    # Decodes all records on the pages into columns, a NumPy array per fixed-width field and a StringColumn per var_str
+    # field. Each field is decoded for all records at once, from the record offsets in the slot directories. A PAX page
+    # already stores its records by column and decodes its own columns, which are appended to those of the other pages.
+    def decode_columns(self, pages) -> list:
+        buffers, offsets, page_columns = [], [], []
+        base = 0
+        for page in pages:
+            if hasattr(page, 'decode_columns'):
+                page_columns.append(page.decode_columns())
+                continue
+            slots = np.array(page.page_footer.slot_dir, dtype=np.int64).reshape(-1, 2)
+            offsets.append(slots[slots[:, 1] != 0, 0] + base)
+            buffers.append(bytes(page.data))
+            base += len(page.data)
+        data = np.frombuffer(b''.join(buffers), dtype=np.uint8)
+        positions = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+
+        columns = []
+        for packer, first, end in self.runs:
+            if packer is None:
+                lengths = data[positions].astype(np.int64)
+                column_offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+                np.cumsum(lengths, out=column_offsets[1:])
+                # Index of every string byte: its start plus its position in the string
+                starts = np.repeat(positions + 1 - column_offsets[:-1], lengths)
+                columns.append(StringColumn(column_offsets, data[starts + np.arange(column_offsets[-1])]))
+                positions = positions + 1 + lengths
+                continue
+            for field_type in self.schema[first:end]:
+                dtype = FIXED_FIELD_DTYPES[field_type]
+                field_bytes = data[positions[:, None] + np.arange(dtype.itemsize)]
+                columns.append(field_bytes.view(dtype).reshape(-1))
+                positions = positions + dtype.itemsize
+        if page_columns:
+            columns = [StringColumn.concatenate(parts) if isinstance(parts[0], StringColumn) else np.concatenate(parts)
+                       for parts in zip(columns, *page_columns)]
+        return columns
+
+
+# * The StringColumn class holds a decoded var_str column: the UTF-8 bytes of all values in one array, value i is
+# data[offsets[i]:offsets[i + 1]].
+class StringColumn:
+    # Initialization of a column with len(values) + 1 offsets and the concatenated bytes
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    # Returns the number of values in the column
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Returns value i as a string
+    def __getitem__(self, i: int) -> str:
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]].tobytes(), 'utf-8')
+
+    # Returns the values as a list of strings
+    def to_list(self) -> List[str]:
+        data = self.data.tobytes()
+        return [str(data[start:end], 'utf-8') for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    # Returns one column with the values of the given columns after each other
+    @staticmethod
+    def concatenate(columns: list):
+        offsets, base = [np.zeros(1, dtype=np.int64)], 0
+        for column in columns:
+            offsets.append(column.offsets[1:] + base)
+            base += int(column.offsets[-1])
+        return StringColumn(np.concatenate(offsets), np.concatenate([column.data for column in columns]))
+
+
+# Returns the compiled codec of a schema, codecs are compiled once and reused
+@lru_cache(maxsize=None)
+def compile_schema(schema: tuple) -> RecordCodec:
+    return RecordCodec(list(schema))
+
+
 # Encodes a record based on the provided schema.
 def encode_record(record, schema: List[str]):
-    encoded_fields = []
-    for value, field_type in zip(record, schema):
-        encoded_fields.extend(encode_field(value, field_type))
-    return bytearray(encoded_fields)
+    return compile_schema(tuple(schema)).encode(record)
 
 
 # Decodes a record based on the provided schema.
 def decode_record(byte_array, schema: List[str]):
-    decoded_fields = []
-    start_idx = 0
-    for field_type in schema:
-        value, start_idx = decode_field(byte_array, start_idx, field_type)
-        decoded_fields.append(value)
-    return tuple(decoded_fields)
+    return compile_schema(tuple(schema)).decode(byte_array)
+
+
+# Decodes all records on a page or a list of pages into columns based on the provided schema.
+def decode_pages(pages, schema: List[str]) -> list:
+    if hasattr(pages, 'page_footer') or hasattr(pages, 'decode_columns'):
+        pages = [pages]
+    return compile_schema(tuple(schema)).decode_columns(pages)
 
 
 # TODO Should this not be in testutils?
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+import unittest
+
+from src.main.database.async_controller import AsyncController
+from src.main.database.controller import Controller
+
+
+class TestAsyncController(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    def setUp(self):
+        self.filepath = 'test_async_controller.bin'
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    # * This test runs many inserts, reads, updates, deletes and scans at once on the event loop.
+    def test_operations(self):
+        async def run():
+            orm = AsyncController(self.filepath)
+            await asyncio.gather(*(orm.insert((i, f'name {i}', i), self.SCHEMA) for i in range(1000)))
+            records = await asyncio.gather(*(orm.read(i) for i in range(1000)))
+            self.assertEqual(records, [(i, f'name {i}', i) for i in range(1000)])
+
+            await asyncio.gather(*(orm.update(i, (i, 'changed', 0), self.SCHEMA) for i in range(0, 1000, 2)),
+                                 *(orm.delete(i) for i in range(1, 1000, 2)), orm.commit())
+            self.assertEqual(sorted([record async for record in orm.scan(self.SCHEMA)]),
+                             [(i, 'changed', 0) for i in range(0, 1000, 2)])
+            self.assertEqual([record[0] async for record in orm.range(10, 20, self.SCHEMA)], [10, 12, 14, 16, 18, 20])
+            scan = orm.scan(self.SCHEMA)
+            async for _ in scan:
+                break
+            await scan.aclose()
+            await orm.close()
+
+        asyncio.run(run())
+
+    # * This test updates every record from the loop of a scan, which must not wait for the page the scan is on.
+    def test_update_during_scan(self):
+        async def run():
+            orm = AsyncController(self.filepath)
+            await orm.insert_many([(i, f'name {i}', i) for i in range(2000)], self.SCHEMA)
+
+            async def scan_and_update():
+                async for record in orm.scan(self.SCHEMA):
+                    await orm.update(record[0], (record[0], 'updated', record[2]), self.SCHEMA)
+
+            await asyncio.wait_for(scan_and_update(), 10)
+            self.assertEqual(set([record[1] async for record in orm.scan(self.SCHEMA)]), {'updated'})
+            await orm.close()
+
+        asyncio.run(run())
+
+    # * This test reads the same record from many tasks at once on a slow disk, and checks that every page is read
+    # once and that the event loop keeps running meanwhile.
+    def test_reads_are_coalesced(self):
+        orm = Controller(self.filepath)
+        for i in range(2000):
+            orm.insert((i, f'name {i}', i), self.SCHEMA)
+        orm.close()
+
+        async def run():
+            orm = AsyncController(self.filepath)
+            orm.schema = self.SCHEMA
+            buffer_pool = orm.controller.heap_file.buffer_pool
+            read_page = buffer_pool.read_page
+            buffer_pool.read_page = lambda page_number: time.sleep(0.02) or read_page(page_number)
+            reads = buffer_pool.reads
+
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.001)
+                    ticks += 1
+
+            ticker = asyncio.create_task(tick())
+            records = await asyncio.gather(*(orm.read(1234) for _ in range(50)))
+            ticker.cancel()
+            self.assertEqual(records, [(1234, 'name 1234', 1234)] * 50)
+            self.assertLessEqual(buffer_pool.reads - reads, orm.controller.heap_file.index.height() + 2)
+            self.assertGreater(ticks, 5)
+            await orm.close()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
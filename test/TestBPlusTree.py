@@ -0,0 +1,275 @@
+import os
+import random
+import unittest
+from array import array
+
+from src.main.database.bplus_three import BPlusTreeIndex, BPlusTreeNode, BPlusTreeInternalNode, NodeStore, TOMBSTONE, \
+    VACUUM_THRESHOLD
+from src.main.database.controller import Controller
+from src.main.utils.benchmark import benchmark_index
+from src.main.utils.constants import NODE_HEADER_SIZE
+
+
+class TestBPlusTree(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    # * This test inserts keys in random order into an in-memory tree and searches them, including missing keys.
+    def test_insert_and_search(self):
+        index = BPlusTreeIndex()
+        keys = list(range(5000))
+        random.shuffle(keys)
+        for key in keys:
+            index.insert(key, (key // 10, key % 10))
+
+        self.assertFalse(index.root.is_leaf)
+        for key in range(5000):
+            self.assertEqual(index.search(key), (key // 10, key % 10))
+        self.assertIsNone(index.search(5000))
+
+        # Deleted keys are not found anymore
+        for key in range(0, 5000, 2):
+            self.assertTrue(index.delete(key))
+        self.assertFalse(index.delete(0))
+        for key in range(5000):
+            self.assertEqual(index.search(key), None if key % 2 == 0 else (key // 10, key % 10))
+
+    # Checks that the keys of the three are sorted and that every node besides the root is at least half full
+    def check_balanced(self, index, node=None, depth=0):
+        node = index.root if node is None else node
+        self.assertEqual(list(node.keys), sorted(node.keys))
+        if node.page_number != index.meta.root:
+            self.assertGreaterEqual(len(node.keys), index.capacity(node) // 2)
+        if node.is_leaf:
+            return [depth]
+        self.assertEqual(len(node.children), len(node.keys) + 1)
+        return [leaf_depth for child in node.children
+                for leaf_depth in self.check_balanced(index, index.store.get(child), depth + 1)]
+
+    # * This test deletes keys in random order and checks that the three stays balanced and shrinks.
+    def test_delete_rebalances(self):
+        index = BPlusTreeIndex(fan_out=5)
+        keys = list(range(2000))
+        random.shuffle(keys)
+        for key in keys:
+            index.insert(key, (key, 1))
+        height, nodes = index.height(), len(index.store.nodes)
+
+        random.shuffle(keys)
+        for i, key in enumerate(keys):
+            self.assertTrue(index.delete(key))
+            self.assertFalse(index.delete(key))
+            if i % 250 == 0:
+                self.assertEqual(len(set(self.check_balanced(index))), 1)
+                self.assertEqual([key for key, _ in index.range_search(0, 2000)], sorted(keys[i + 1:]))
+        self.assertLess(index.height(), height)
+        self.assertEqual(index.height(), 1)
+        self.assertEqual(len(index.store.nodes), 2)  # The meta page and an empty root
+        self.assertGreater(nodes, 2)
+
+    # * This test inserts and deletes keys in batches, which fill and empty leaves in place and split or merge them
+    # like single inserts and deletes where needed.
+    def test_insert_and_delete_many(self):
+        for lazy_delete in [False, True]:
+            index = BPlusTreeIndex(fan_out=5, lazy_delete=lazy_delete, vacuum_threshold=300)
+            keys = list(range(0, 2000, 2))
+            random.shuffle(keys)
+            index.insert_many((key, (key, 1)) for key in keys)
+            index.insert_many([(key, (key, 2)) for key in range(1, 2000, 2)] + [(0, (0, 3))])
+            self.assertEqual(len(set(self.check_balanced(index))), 1)
+            self.assertEqual(list(index.range_search(0, 2000)),
+                             [(0, (0, 3))] + [(key, (key, 1 + key % 2)) for key in range(1, 2000)])
+
+            deleted = random.sample(range(2000), 1500)
+            self.assertEqual(index.delete_many(deleted + [5000]), 1500)
+            self.assertEqual(index.delete_many(deleted), 0)
+            index.vacuum()
+            self.assertEqual(len(set(self.check_balanced(index))), 1)
+            self.assertEqual([key for key, _ in index.range_search(0, 2000)], sorted(set(range(2000)) - set(deleted)))
+
+    # * This test deletes keys lazily with tombstones, which are removed in batches.
+    def test_lazy_delete(self):
+        index = BPlusTreeIndex(fan_out=8, lazy_delete=True, vacuum_threshold=100)
+        for key in range(1000):
+            index.insert(key, (key, 1))
+        for key in range(0, 150):
+            self.assertTrue(index.delete(key))
+        self.assertFalse(index.delete(149))
+        # The first 100 deletes were vacuumed, the next 50 are tombstones
+        self.assertEqual(index.lazy_deletes, 50)
+        self.assertIsNone(index.search(120))
+        self.assertEqual(next(index.range_search(0, 1000))[0], 150)
+        self.assertEqual(index.find_leaf(120).search(120), TOMBSTONE)
+        index.insert(120, (120, 2))
+        self.assertEqual(index.search(120), (120, 2))
+
+        self.assertEqual(index.vacuum(), 49)
+        self.assertEqual(len(set(self.check_balanced(index))), 1)
+        self.assertEqual([key for key, _ in index.range_search(0, 1000)], [120] + list(range(150, 1000)))
+
+    # * This test deletes lazily from the index of a file, which keeps the number of lazy deletes over a reopen and
+    # counts an index with only tombstones as empty.
+    def test_lazy_delete_in_file(self):
+        filepath = 'test_lazy_delete_in_file.bin'
+        try:
+            with self.assertRaises(ValueError):
+                Controller(filepath, index_type='hash', lazy_delete=True)
+            os.remove(filepath)
+
+            orm = Controller(filepath, index_fan_out=16, lazy_delete=True)
+            orm.bulk_load([(i, f'name {i}', i) for i in range(1500)], self.SCHEMA)
+            for i in range(600):
+                orm.delete(i)
+            self.assertEqual(orm.heap_file.index.lazy_deletes, 600)
+            orm.close()
+
+            orm = Controller(filepath, lazy_delete=True)
+            orm.schema = self.SCHEMA
+            index = orm.heap_file.index
+            self.assertEqual(index.lazy_deletes, 600)
+            for i in range(600, 1100):
+                orm.delete(i)
+            # The tombstones were removed at VACUUM_THRESHOLD lazy deletes, counted over the reopen
+            self.assertEqual(index.lazy_deletes, 1100 - VACUUM_THRESHOLD)
+            self.assertEqual(orm.delete_many(range(1100, 1500)), 400)
+            self.assertFalse(index.root.is_leaf)
+            self.assertTrue(index.is_empty())
+            index.store.release()
+
+            # An index with only tombstones can be bulk loaded again
+            self.assertEqual(orm.bulk_load([(i, f'again {i}', i) for i in range(2000, 2100)], self.SCHEMA), 100)
+            self.assertEqual(index.lazy_deletes, 0)
+            self.assertEqual([record[0] for record in orm.range(0, 3000, self.SCHEMA)], list(range(2000, 2100)))
+            orm.close()
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    # * This test deletes from an index on pages, which reuses the pages of merged nodes, and reloads it.
+    def test_delete_from_file(self):
+        filepath = 'test_delete_from_file.bin'
+        orm = Controller(filepath, index_fan_out=8)
+        for i in range(1000):
+            orm.insert((i, f'name {i}', i), self.SCHEMA)
+        for i in range(1000):
+            if i % 4 != 0:
+                orm.delete(i)
+        store = orm.heap_file.index.store
+        self.assertGreater(len(store.free_pages), 0)
+        orm.insert((1000, 'name 1000', 0), self.SCHEMA)
+        orm.close()
+
+        orm = Controller(filepath)
+        orm.schema = self.SCHEMA
+        self.assertEqual(len(set(self.check_balanced(orm.heap_file.index))), 1)
+        self.assertEqual([record[0] for record in orm.range(0, 2000, self.SCHEMA)],
+                         list(range(0, 1001, 4)))
+        orm.close()
+        os.remove(filepath)
+
+    # * This test checks that a node keeps its keys sorted in an array and that it is read back from its page.
+    def test_node_keys(self):
+        leaf = BPlusTreeNode()
+        for key in [5, 1, 9, 3, 7, 3]:
+            leaf.insert(key, (key, 1))
+        self.assertIsInstance(leaf.keys, array)
+        self.assertEqual(list(leaf.keys), [1, 3, 5, 7, 9])
+        self.assertEqual((leaf.find_key_index(7), leaf.find_key_index(4)), (3, -1))
+
+        node = BPlusTreeNode.from_data(leaf.data)
+        self.assertEqual((list(node.keys), node.children), (list(leaf.keys), leaf.children))
+        internal = BPlusTreeNode.from_data(BPlusTreeInternalNode([10, 20], [4, 5, 6]).data)
+        self.assertEqual([internal.find_child_index(key) for key in [0, 10, 15, 20, 99]], [0, 1, 1, 2, 2])
+
+    # * This test searches key ranges along the linked leaves, across splits and after deletes.
+    def test_range_search(self):
+        index = BPlusTreeIndex()
+        keys = list(range(0, 10000, 3))
+        random.shuffle(keys)
+        for key in keys:
+            index.insert(key, (key, 0))
+        for key in range(0, 3000, 2):
+            index.delete(key)
+
+        expected = [key for key in range(0, 10000, 3) if key >= 3000 or key % 2 == 1]
+        self.assertEqual([key for key, _ in index.range_search(-1, 10000)], expected)
+        self.assertEqual(list(index.range_search(2000, 2020)),
+                         [(key, (key, 0)) for key in expected if 2000 <= key <= 2020])
+        self.assertEqual(list(index.range_search(10, 5)), [])
+        self.assertEqual(list(index.range_search(9999, 20000)), [(9999, (9999, 0))])
+
+    # * This test builds a tree bottom-up from sorted keys, checks the leaf chain and inserts into the loaded tree.
+    def test_bulk_load(self):
+        index = BPlusTreeIndex()
+        self.assertEqual(index.bulk_load(((key, (key, 0)) for key in range(0, 100000, 2)), fill_factor=0.7), 50000)
+        self.assertFalse(index.root.is_leaf)
+        for key in range(0, 1000):
+            self.assertEqual(index.search(key), None if key % 2 else (key, 0))
+
+        leaf, keys = index.find_leaf(0), []
+        while leaf is not None:
+            keys.extend(leaf.keys)
+            leaf = index.store.get(leaf.next_leaf) if leaf.next_leaf is not None else None
+        self.assertEqual(keys, list(range(0, 100000, 2)))
+
+        for key in range(1, 1000, 2):
+            index.insert(key, (key, 1))
+        self.assertEqual(index.search(501), (501, 1))
+        with self.assertRaises(ValueError):
+            index.bulk_load([(1, (0, 0))])
+        with self.assertRaises(ValueError):
+            BPlusTreeIndex().bulk_load([(2, (0, 0)), (1, (0, 0))])
+
+    # * This test checks that the fan-out limits the number of keys in a node and is kept when the index is reloaded.
+    def test_fan_out(self):
+        index = BPlusTreeIndex(fan_out=4)
+        for key in range(100):
+            index.insert(key, (key, 0))
+        self.assertGreater(index.height(), 3)
+        self.assertTrue(all(len(node.keys) <= 3 for node in index.store.nodes.values() if hasattr(node, 'keys')))
+        self.assertEqual(BPlusTreeIndex(NodeStore(512)).leaf_capacity, (512 - NODE_HEADER_SIZE) // 9)
+        with self.assertRaises(ValueError):
+            BPlusTreeIndex(NodeStore(512), fan_out=100)
+
+        filepath = 'test_fan_out.bin'
+        orm = Controller(filepath, index_fan_out=16)
+        for i in range(500):
+            orm.insert((i, f'name {i}', i), self.SCHEMA)
+        orm.close()
+        orm = Controller(filepath)
+        self.assertEqual(orm.heap_file.index.internal_capacity, 15)
+        self.assertGreaterEqual(orm.heap_file.index.height(), 3)
+        orm.close()
+        os.remove(filepath)
+
+        results = benchmark_index([512, 4096], [None, 8, 200], num_keys=2000)
+        self.assertEqual([(result.page_size, result.fan_out) for result in results],
+                         [(512, 72), (512, 8), (4096, 584), (4096, 8), (4096, 200)])
+
+    # * This test checks that the index is stored in the binary file and reloaded when the file is opened again.
+    def test_index_is_persisted(self):
+        filepath = 'test_index_is_persisted.bin'
+        orm = Controller(filepath)
+        for i in range(3000):
+            orm.insert((i, f'name {i}', i * 2), self.SCHEMA)
+        orm.delete(10)
+        orm.update(20, (20, 'a much longer name than before', 0), self.SCHEMA)
+        orm.commit()
+
+        orm = Controller(filepath)
+        orm.schema = self.SCHEMA
+        self.assertIsNotNone(orm.heap_file.catalog.get('primary_index'))
+        self.assertEqual(orm.read(2999), (2999, 'name 2999', 5998))
+        self.assertEqual(orm.read(20), (20, 'a much longer name than before', 0))
+        with self.assertRaises(ValueError):
+            orm.read(10)
+        self.assertEqual(list(orm.range(8, 12, self.SCHEMA)),
+                         [(i, f'name {i}', i * 2) for i in [8, 9, 11, 12]])
+        self.assertEqual([record[0] for record in orm.range(0, 3000, self.SCHEMA)],
+                         [i for i in range(3000) if i != 10])
+        orm.close()
+
+        os.remove(filepath)
+
+
+if __name__ == '__main__':
+    unittest.main()
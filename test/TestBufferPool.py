@@ -0,0 +1,128 @@
+import os
+import unittest
+
+from src.main.database.bplus_three import tree_pinned_pages
+from src.main.database.buffer_pool import BufferPool
+from src.main.database.controller import Controller
+from src.main.database.page import Page
+from src.main.utils.constants import FILE_PINNED_PAGES, PAGE_SIZE
+
+
+class TestBufferPool(unittest.TestCase):
+
+    def setUp(self):
+        # The "file" is a dictionary of page number -> data
+        self.file = {page_number: bytearray([page_number]) * PAGE_SIZE for page_number in range(10)}
+        self.reads = []
+
+    def read_page(self, page_number):
+        self.reads.append(page_number)
+        return bytearray(self.file[page_number])
+
+    def write_pages(self, pages):
+        for page_number, data in pages:
+            self.file[page_number] = bytearray(data)
+
+    # * This test checks that the least recently used unpinned page is evicted and dirty victims are written back.
+    def test_lru_eviction(self):
+        pool = BufferPool(self.read_page, self.write_pages, capacity=2, policy='lru')
+        page = pool.fetch(0, Page)
+        page.data[0] = 42
+        pool.unpin(0, dirty=True)
+        pool.fetch(1, Page)
+        pool.unpin(1)
+        pool.fetch(0, Page)  # 0 becomes the most recently used page
+        pool.unpin(0)
+
+        pool.fetch(2, Page)
+        pool.unpin(2)
+        self.assertTrue(pool.contains(0))
+        self.assertFalse(pool.contains(1))
+        self.assertEqual(self.reads, [0, 1, 2])
+
+        pool.fetch(3, Page)
+        pool.unpin(3)
+        self.assertFalse(pool.contains(0))
+        self.assertEqual(self.file[0][0], 42)
+
+    # * This test checks that the CLOCK policy gives referenced pages a second chance and never evicts pinned pages.
+    def test_clock_eviction_and_pins(self):
+        pool = BufferPool(self.read_page, self.write_pages, capacity=2, policy='clock')
+        pool.fetch(0, Page)  # Stays pinned
+        pool.fetch(1, Page)
+        pool.unpin(1)
+        pool.fetch(2, Page)
+        self.assertTrue(pool.contains(0))
+        self.assertFalse(pool.contains(1))
+
+        with self.assertRaises(RuntimeError):
+            pool.fetch(3, Page)
+
+    # * This test checks that flush writes only the dirty pages and clears their dirty bit.
+    def test_flush(self):
+        written = []
+        pool = BufferPool(self.read_page, written.extend, capacity=4)
+        with pool.pin(0, Page) as page:
+            page.data[0] = 7
+            pool.mark_dirty(0)
+        with pool.pin(1, Page):
+            pass
+        pool.flush()
+        self.assertEqual([page_number for page_number, _ in written], [0])
+        pool.flush()
+        self.assertEqual(len(written), 1)
+
+    # * This test checks that prefetch reads the missing pages, consecutive pages in one read, without pinning them.
+    def test_prefetch(self):
+        reads = []
+        pool = BufferPool(self.read_page, self.write_pages, capacity=8,
+                          read_pages=lambda first, count: reads.append((first, count)) or [
+                              bytearray(self.file[first + i]) for i in range(count)])
+        with pool.pin(3, Page):
+            pass
+        pool.prefetch([1, 2, 3, 4, 5, 8], Page)
+        self.assertEqual(reads, [(1, 2), (4, 2), (8, 1)])
+        with pool.pin(5, Page) as page:
+            self.assertEqual(page.data[0], 5)
+        self.assertEqual(self.reads, [3])
+        self.assertTrue(all(pool.frames[page_number].pin_count == 0 for page_number in [1, 2, 4, 5, 8]))
+
+    # * This test checks that a file rejects a buffer pool that can not hold the pages an operation pins, and works on
+    # the smallest pool it accepts while its B+ tree grows several levels.
+    def test_small_pool(self):
+        filepath = 'test_small_pool.bin'
+        schema = ['int', 'var_str', 'int']
+        smallest = FILE_PINNED_PAGES + tree_pinned_pages(4)
+        try:
+            for cache_size in [1, 2, 4, smallest - 1]:
+                with self.assertRaises(ValueError):
+                    Controller(filepath, cache_size=cache_size, index_fan_out=4)
+                self.assertFalse(os.path.exists(filepath))
+
+            orm = Controller(filepath, cache_size=smallest, index_fan_out=4)
+            for i in range(1000):
+                orm.insert((i, f'name {i}', i % 5), schema)
+            orm.delete_many(range(0, 1000, 2))
+            self.assertGreater(orm.heap_file.index.height(), 4)
+            orm.close()
+
+            with self.assertRaises(ValueError):
+                Controller(filepath, cache_size=smallest - 1)  # The index of the file has a small fan-out
+            orm = Controller(filepath, cache_size=smallest)
+            self.assertEqual(orm.read_many([1, 2, 999], schema), [(1, 'name 1', 1), None, (999, 'name 999', 4)])
+            orm.close()
+            os.remove(filepath)
+
+            # A secondary index has longer keys than the primary key index, so fewer fit in a node
+            orm = Controller(filepath, cache_size=FILE_PINNED_PAGES + tree_pinned_pages())
+            orm.insert((1, 'name 1', 1), schema)
+            with self.assertRaises(ValueError):
+                orm.create_index(2, schema)
+            orm.close()
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.database.lock_manager import LockManager, ReadWriteLatch
+
+
+class TestConcurrency(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    def setUp(self):
+        self.filepath = 'test_concurrency.bin'
+        self.orm = None
+
+    def tearDown(self):
+        if self.orm is not None:
+            self.orm.close()
+        for path in [self.filepath, self.filepath + '.wal']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Runs the target in the given number of threads, with the number of the thread, and reraises their errors
+    @staticmethod
+    def run_threads(target, count: int):
+        errors = []
+
+        def run(thread: int):
+            try:
+                target(thread)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(thread,)) for thread in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    # * This test checks that readers share a latch, a writer waits for them and new readers wait for a waiting writer.
+    def test_latch_and_lock_manager(self):
+        latch = ReadWriteLatch()
+        latch.acquire()
+        latch.acquire()
+        order = []
+        writer = threading.Thread(target=lambda: latch.acquire(exclusive=True) or order.append('writer'))
+        writer.start()
+        time.sleep(0.05)
+        reader = threading.Thread(target=lambda: latch.acquire() or order.append('reader'))
+        reader.start()
+        time.sleep(0.05)
+        self.assertEqual(order, [])
+        latch.release()
+        latch.release()
+        writer.join()
+        self.assertEqual(order, ['writer'])
+        latch.release(exclusive=True)
+        reader.join()
+        self.assertEqual(order, ['writer', 'reader'])
+
+        locks = LockManager()
+        with locks.lock([3, 1, 3]):
+            with locks.lock([1]):
+                self.assertEqual(len(locks), 2)
+        self.assertEqual(len(locks), 0)
+
+        # A lock of which the latch can not be acquired is not released, and the locks before it are
+        class FailingLatch(ReadWriteLatch):
+            def acquire(self, exclusive: bool = False):
+                raise RuntimeError('Interrupted')
+
+        failing = FailingLatch()
+        locks.locks[2] = [failing, 0]
+        with self.assertRaises(RuntimeError):
+            with locks.lock([1, 2, 3]):
+                pass
+        self.assertEqual((len(locks), failing.readers), (0, 0))
+        with locks.lock([1, 2, 3], exclusive=True):
+            self.assertEqual(len(locks), 3)
+
+    # * This test inserts, updates, deletes and reads records from several threads on a small buffer pool and a B+ tree
+    # with a small fan-out, so nodes split and merge while other threads search them.
+    def test_concurrent_operations(self):
+        self.orm = Controller(self.filepath, cache_size=64, index_fan_out=8, concurrent=True)
+        self.orm.schema = self.SCHEMA
+
+        def insert(thread: int):
+            for i in range(thread, 2000, 8):
+                self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+
+        self.run_threads(insert, 8)
+        self.assertEqual([record[0] for record in self.orm.range(0, 2000, self.SCHEMA)], list(range(2000)))
+
+        def change(thread: int):
+            for i in range(thread, 2000, 8):
+                if thread < 4:
+                    if i % 2:
+                        self.orm.delete(i)
+                    else:
+                        self.orm.update(i, (i, f'a longer name {i}' * 3, i + 100000), self.SCHEMA)
+                else:
+                    # Readers see a record before or after its change, never a torn record
+                    try:
+                        self.assertIn(self.orm.read(i - 4)[2], (i - 4, i - 4 + 100000))
+                    except ValueError:
+                        self.assertEqual(i % 2, 1)  # Deleted by a writer
+                    self.assertTrue(all(record[2] in (record[0], record[0] + 100000)
+                                        for record in self.orm.range(i - 50, i, self.SCHEMA)))
+
+        self.run_threads(change, 8)
+        expected = [(i, f'a longer name {i}' * 3, i + 100000) if i % 8 < 4 and i % 2 == 0 else (i, f'name {i}', i)
+                    for i in range(2000) if not (i % 8 < 4 and i % 2)]
+        self.assertEqual(list(self.orm.range(0, 2000, self.SCHEMA)), expected)
+        self.assertEqual(len(self.orm.heap_file.locks), 0)
+
+    # * This test updates every record while a scan is on its page, which must not wait for the latch of the scan.
+    def test_update_during_scan(self):
+        self.orm = Controller(self.filepath, concurrent=True)
+        self.orm.insert_many([(i, f'name {i}', i) for i in range(500)], self.SCHEMA)
+
+        def scan_and_update():
+            for record in self.orm.scan(self.SCHEMA):
+                self.orm.update(record[0], (record[0], 'updated', record[2]), self.SCHEMA)
+
+        scanner = threading.Thread(target=scan_and_update, daemon=True)
+        scanner.start()
+        scanner.join(10)
+        self.assertFalse(scanner.is_alive())
+        self.assertEqual(set(record[1] for record in self.orm.range(0, 500, self.SCHEMA)), {'updated'})
+
+    # * This test inserts into a hash index and commits to a write-ahead log from several threads.
+    def test_concurrent_commits(self):
+        self.orm = Controller(self.filepath, index_type='hash', wal=True, concurrent=True)
+        self.orm.schema = self.SCHEMA
+
+        def insert(thread: int):
+            for i in range(thread * 500, thread * 500 + 500):
+                self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+                if i % 50 == 0:
+                    self.orm.heap_file.commit()
+
+        self.run_threads(insert, 4)
+        self.orm.close()
+        self.orm = Controller(self.filepath)
+        self.orm.schema = self.SCHEMA
+        self.assertEqual([record[0] for record in self.orm.range(0, 2000, self.SCHEMA)], list(range(2000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.utils.constants import RESERVED_PAGE, SLOT_ENTRY_SIZE
+
+
+class TestFreeSpaceMap(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    def setUp(self):
+        self.filepath = 'test_free_space_map.bin'
+        self.orm = Controller(self.filepath)
+        for i in range(3000):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+
+    def tearDown(self):
+        self.orm.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    # Returns the free space of the data pages as registered in the page directories
+    def directory_free_space(self):
+        heap_file = self.orm.heap_file
+        free = {}
+        for pd_number in heap_file.page_dir_numbers:
+            with heap_file.page_dir(pd_number) as pd:
+                free.update((page_number, free_space) for page_number, free_space in pd.page_entries()
+                            if free_space not in (RESERVED_PAGE, 0))
+        return free
+
+    # * This test checks that a record is stored on a page with enough free space, freed by deletes on an old page.
+    def test_find_page_with_free_space(self):
+        free_space_map = self.orm.heap_file.free_space_map
+        self.assertEqual(free_space_map.free, self.directory_free_space())
+
+        page_number, _ = self.orm.heap_file.index.search(10)
+        for i in range(10, 30):
+            self.orm.delete(i)
+        self.assertGreaterEqual(free_space_map.free_space(page_number), 20 * len('name 10'))
+        self.orm.insert((5000, 'name 5000', 0), self.SCHEMA)
+        self.assertEqual(self.orm.heap_file.index.search(5000)[0], page_number)
+
+        # A record that does not fit on any page gets a new page
+        self.assertIsNone(free_space_map.find(4 + 16 * 251 + SLOT_ENTRY_SIZE))
+        self.orm.insert((5001, *['x' * 250] * 16), ['int'] + ['var_str'] * 16)
+        self.assertNotEqual(self.orm.heap_file.index.search(5001)[0], page_number)
+
+    # * This test checks that the free space map is stored in the file and reloaded when the file is opened again.
+    def test_free_space_map_is_persisted(self):
+        for i in range(0, 3000, 3):
+            self.orm.delete(i)
+        expected = self.directory_free_space()
+        self.orm.close()
+
+        self.orm = Controller(self.filepath)
+        self.assertIsNotNone(self.orm.heap_file.catalog.get('free_space_map'))
+        self.assertEqual(self.orm.heap_file.free_space_map.free, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import random
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.database.hash_index import BUCKET_CAPACITY, hash_key
+
+
+class TestHashIndex(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    def setUp(self):
+        self.filepath = 'test_hash_index.bin'
+        self.orm = Controller(self.filepath, index_type='hash')
+
+    def tearDown(self):
+        self.orm.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    # * This test inserts ids in random order and checks that buckets are split one at a time as the index grows.
+    def test_insert_and_search(self):
+        index = self.orm.heap_file.index
+        ids = list(range(20000))
+        random.Random(5).shuffle(ids)
+        for i in ids:
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+            self.assertLessEqual(index.count, BUCKET_CAPACITY * len(index.buckets))
+        self.assertEqual(len(index.buckets), (1 << index.level) + index.split)
+        self.assertGreater(len(index.buckets), 20000 // BUCKET_CAPACITY)
+
+        for i in ids[:500]:
+            self.assertEqual(self.orm.read(i), (i, f'name {i}', i))
+        self.assertIsNone(index.search(20000))
+        with self.assertRaises(ValueError):
+            self.orm.insert((7, 'again', 0), self.SCHEMA)
+
+    # * This test checks updates, deletes, range queries and bulk loading on a hash index.
+    def test_update_delete_and_range(self):
+        self.assertEqual(self.orm.bulk_load(((i, f'name {i}', i) for i in range(5000)), self.SCHEMA), 5000)
+        self.orm.update(10, (10, 'a much longer name than before' * 5, 0), self.SCHEMA)
+        self.orm.update(11, (6000, 'new id', 0), self.SCHEMA)
+        for i in range(100, 200):
+            self.orm.delete(i)
+
+        self.assertEqual(self.orm.read(10), (10, 'a much longer name than before' * 5, 0))
+        self.assertEqual(self.orm.read(6000), (6000, 'new id', 0))
+        for i in [11, 150]:
+            with self.assertRaises(ValueError):
+                self.orm.read(i)
+        self.assertEqual([record[0] for record in self.orm.range(95, 205, self.SCHEMA)],
+                         [95, 96, 97, 98, 99, 200, 201, 202, 203, 204, 205])
+
+    # * This test checks that the type of the index is kept in the file and the index is loaded again.
+    def test_index_is_persisted(self):
+        for i in range(3000):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        self.orm.delete(42)
+        buckets = list(self.orm.heap_file.index.buckets)
+        self.orm.close()
+
+        self.orm = Controller(self.filepath)
+        self.orm.schema = self.SCHEMA
+        index = self.orm.heap_file.index
+        self.assertEqual(self.orm.heap_file.index_type, 'hash')
+        self.assertEqual((index.buckets, index.count), (buckets, 2999))
+        self.assertEqual(self.orm.read(2999), (2999, 'name 2999', 2999))
+        with self.assertRaises(ValueError):
+            self.orm.read(42)
+
+        with self.assertRaises(ValueError):
+            Controller('unused.bin', index_type='list')
+
+    # * This test empties overflow pages and checks that they are found again after a reopen and reused.
+    def test_free_pages_are_persisted(self):
+        keys = [key for key in range(1 << 22) if hash_key(key) & 1023 == 0][:3 * BUCKET_CAPACITY]
+        index = self.orm.heap_file.index
+        index.insert_many((key, (1, key % 100)) for key in keys)
+        index.delete_many(keys)
+        free_pages = list(index.free_pages)
+        self.assertGreater(len(free_pages), 0)
+        self.orm.close()
+        size = os.path.getsize(self.filepath)
+
+        self.orm = Controller(self.filepath)
+        index = self.orm.heap_file.index
+        self.assertEqual(index.free_pages, free_pages)
+        self.assertIsNone(index.search(keys[0]))
+        index.insert_many((key, (1, key % 100)) for key in keys)
+        self.assertEqual(index.free_pages, [])
+        self.assertEqual(index.search(keys[-1]), (1, keys[-1] % 100))
+        self.orm.commit()
+        self.assertEqual(os.path.getsize(self.filepath), size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,316 @@
+import os
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.database.disk_manager import DiskManager
+from src.main.database.page import Page
+from src.main.utils.constants import PAGE_SIZE
+
+
+class TestHeapFile(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    def setUp(self):
+        self.filepath = 'test_heap_file.bin'
+        self.orm = Controller(self.filepath)
+        for i in range(2000):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        self.stats = self.orm.commit()
+
+    def tearDown(self):
+        self.orm.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    # * This test checks that a commit only writes the pages changed since the last commit, adjacent pages together.
+    def test_commit_writes_dirty_pages(self):
+        self.assertEqual(self.stats.bytes, os.path.getsize(self.filepath))
+        self.assertLess(self.stats.writes, self.stats.pages)
+
+        # Nothing changed
+        self.assertEqual(self.orm.commit().pages, 0)
+
+        # An update of the same size only changes the data page
+        self.orm.update(1000, (1000, 'name 9999', 0), self.SCHEMA)
+        stats = self.orm.commit()
+        self.assertEqual((stats.pages, stats.bytes, stats.writes), (1, PAGE_SIZE, 1))
+
+    # * This test reads pages as views on the memory-mapped file, and checks that a page is copied before it changes.
+    def test_memory_mapped_pages(self):
+        self.orm.close()
+        self.orm = Controller(self.filepath, use_mmap=True)
+        self.orm.schema = self.SCHEMA
+        self.assertEqual(self.orm.read(1500), (1500, 'name 1500', 1500))
+        page_number, _ = self.orm.heap_file.index.search(1500)
+        with self.orm.heap_file.buffer_pool.pin(page_number, Page) as page:
+            self.assertIsInstance(page.data, memoryview)
+
+        self.orm.update(1500, (1500, 'changed', 1), self.SCHEMA)
+        with self.orm.heap_file.buffer_pool.pin(page_number, Page) as page:
+            self.assertIsInstance(page.data, bytearray)
+        self.assertEqual(self.orm.read(1500), (1500, 'changed', 1))
+        self.orm.close()
+
+        self.orm = Controller(self.filepath)
+        self.orm.schema = self.SCHEMA
+        self.assertEqual(self.orm.read(1500), (1500, 'changed', 1))
+
+    # * This test grows a memory-mapped file, and checks that an old mapping is closed once no page refers to it.
+    def test_old_mappings_are_released(self):
+        disk = DiskManager(self.filepath + '.map', use_mmap=True)
+        try:
+            disk.write_pages([(0, bytes([1]) * PAGE_SIZE)])
+            page = disk.read_page(0)
+            for page_number in range(1, 5):
+                disk.write_pages([(page_number, bytes([page_number + 1]) * PAGE_SIZE)])
+                self.assertEqual(disk.read_page(page_number)[0], page_number + 1)
+            self.assertEqual(len(disk.old_maps), 1)  # The first mapping, the page still refers to it
+            self.assertEqual(page[0], 1)
+
+            del page
+            disk.write_pages([(5, bytes(PAGE_SIZE))])
+            disk.read_page(5)
+            self.assertEqual(disk.old_maps, [])
+        finally:
+            disk.close()
+            os.remove(self.filepath + '.map')
+
+    # * This test scans all records, with a predicate and a projection, and checks that pages are read ahead in chunks.
+    def test_scan(self):
+        for i in range(0, 2000, 2):
+            self.orm.delete(i)
+        self.orm.commit()
+        self.orm.close()
+        self.orm = Controller(self.filepath, cache_size=64)
+        reads = []
+        read_pages = self.orm.heap_file.disk.read_pages
+        self.orm.heap_file.buffer_pool.read_pages = lambda first, count: reads.append(count) or read_pages(first, count)
+
+        records = list(self.orm.scan(self.SCHEMA))
+        self.assertEqual(sorted(records), [(i, f'name {i}', i) for i in range(1, 2000, 2)])
+        self.assertGreater(max(reads), 1)
+
+        names = list(self.orm.scan(self.SCHEMA, predicate={0: lambda id_: id_ < 100, 2: lambda value: value % 3 == 0},
+                                   columns=[1]))
+        self.assertEqual(sorted(names), sorted((f'name {i}',) for i in range(3, 100, 6)))
+
+    # * This test reads the whole table into columns.
+    def test_read_columns(self):
+        self.orm.delete(5)
+        ids, names, values = self.orm.read_columns(self.SCHEMA)
+        self.assertEqual(sorted(ids.tolist()), [i for i in range(2000) if i != 5])
+        self.assertEqual(names[list(ids).index(1999)], 'name 1999')
+        self.assertTrue((ids == values).all())
+
+    # * This test reads many records at once, with one search per leaf and one read per page, in the order asked for.
+    def test_read_many(self):
+        self.orm.delete(7)
+        ids = [1500, 3, 7, 1999, 3, 5000, 0] + list(range(100, 150))
+        expected = [None if i in (7, 5000) else (i, f'name {i}', i) for i in ids]
+        for index_type in ['btree', 'hash']:
+            self.orm.close()
+            self.orm = Controller(self.filepath, cache_size=16)
+            self.orm.schema = self.SCHEMA
+            reads = []
+            read_page = self.orm.heap_file.buffer_pool.read_page
+            self.orm.heap_file.buffer_pool.read_page = lambda page_number: reads.append(page_number) or read_page(
+                page_number)
+            self.orm.heap_file.buffer_pool.read_pages = None
+            self.assertEqual(self.orm.read_many(ids), expected)
+            self.assertEqual(len(reads), len(set(reads)))
+            if index_type == 'btree':
+                self.assertEqual(list(self.orm.heap_file.index.search_many([3, 7, 5000])), [3])
+
+            # Rebuild the file with a hash index
+            self.orm.close()
+            os.remove(self.filepath)
+            self.orm = Controller(self.filepath, index_type='hash')
+            for i in range(2000):
+                if i != 7:
+                    self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+
+    # * This test reads and deletes records on more data pages than fit in the buffer pool, which are read ahead in
+    # chunks so no page is evicted before it is used and read twice.
+    def test_read_ahead_in_chunks(self):
+        self.orm.close()
+        os.remove(self.filepath)
+        self.orm = Controller(self.filepath, cache_size=16)
+        self.orm.bulk_load([(i, f'name {i}' * 20, i) for i in range(2000)], self.SCHEMA)
+        self.orm.commit()
+        self.assertGreater(len(self.orm.heap_file.data_page_numbers()), 16)
+        reads = []
+        buffer_pool, disk = self.orm.heap_file.buffer_pool, self.orm.heap_file.disk
+        buffer_pool.read_page = lambda page_number: reads.append(page_number) or disk.read_page(page_number)
+        buffer_pool.read_pages = lambda first, count: reads.extend(range(first, first + count)) or disk.read_pages(
+            first, count)
+
+        ids = list(range(1999, -1, -1))
+        self.assertEqual([record[0] for record in self.orm.read_many(ids)], ids)
+        self.assertEqual(len(reads), len(set(reads)))
+        reads.clear()
+        self.assertEqual(len(list(self.orm.range(0, 1999, self.SCHEMA))), 2000)
+        self.assertEqual(len(reads), len(set(reads)))
+        reads.clear()
+        data_pages = set(self.orm.heap_file.data_page_numbers())
+        self.assertEqual(self.orm.delete_many(ids[::2]), 1000)
+        # The index leaves are read again to delete the ids after the data pages, but every data page is read once
+        data_reads = [page_number for page_number in reads if page_number in data_pages]
+        self.assertEqual(sorted(data_reads), sorted(data_pages))
+
+    # * This test inserts, updates and deletes records in batches, with records that move to another page, and checks
+    # the index, the secondary index and the free space of the pages.
+    def test_insert_update_delete_many(self):
+        self.orm.create_index(2, self.SCHEMA)
+        self.orm.insert_many([(i, f'new {i}', i % 10) for i in range(2000, 3000)], self.SCHEMA)
+        with self.assertRaises(ValueError):
+            self.orm.insert_many([(3000, 'a', 1), (5, 'b', 1)], self.SCHEMA)
+        self.assertEqual(self.orm.update_many([(i, f'a much longer name {i}' * (i % 3), 7) for i in range(0, 3000, 3)],
+                                              self.SCHEMA), 1000)
+        with self.assertRaises(ValueError):
+            self.orm.update_many([(1, 'a', 1), (5000, 'b', 1)], self.SCHEMA)
+        self.assertEqual(self.orm.delete_many(list(range(1, 3000, 3)) + [5000]), 1000)
+
+        expected = {i: (i, f'a much longer name {i}' * (i % 3), 7) if i % 3 == 0 else
+                    (i, f'name {i}' if i < 2000 else f'new {i}', i if i < 2000 else i % 10)
+                    for i in range(3000) if i % 3 != 1}
+        self.assertEqual(list(self.orm.range(0, 5000, self.SCHEMA)), [expected[i] for i in sorted(expected)])
+        self.assertEqual(sorted(self.orm.find_by(2, 7)), sorted(record for record in expected.values() if record[2] == 7))
+        heap_file = self.orm.heap_file
+        for page_number, page in heap_file.numbered_data_pages():
+            with heap_file.page_dir(heap_file.find_page_dir(page_number)) as pd:
+                self.assertIn((page_number, page.available_space()), list(pd.page_entries()))
+
+    # * This test compresses the full pages, reads, updates and deletes records on compressed pages, and reads the
+    # compressed pages back from the file.
+    def test_compress(self):
+        self.orm.close()
+        self.orm = Controller(self.filepath, compression='zlib')
+        self.orm.schema = self.SCHEMA
+        self.orm.create_index(2, self.SCHEMA)
+        pages = len(self.orm.heap_file.data_page_numbers())
+        emptied = self.orm.compress()
+        self.assertGreater(emptied, pages // 2)
+        self.assertEqual(len(self.orm.heap_file.data_page_numbers()), pages - emptied)
+        # Only the last page was not full
+        self.assertEqual([page.available_space() == 0 for page in self.orm.heap_file.data_pages()],
+                         [True] * (pages - emptied - 1) + [False])
+
+        self.orm.update(10, (10, 'a new name', 10), self.SCHEMA)
+        self.orm.delete_many(range(20, 40))
+        self.orm.insert((5000, 'new', 5000), self.SCHEMA)
+        expected = [(i, 'a new name' if i == 10 else f'name {i}', i) for i in range(2000) if not 20 <= i < 40]
+        expected.append((5000, 'new', 5000))
+        stats = self.orm.commit()
+        self.assertEqual(stats.bytes, stats.pages * PAGE_SIZE)
+
+        self.orm.close()
+        self.orm = Controller(self.filepath, use_mmap=True)
+        self.orm.schema = self.SCHEMA
+        self.assertEqual(list(self.orm.range(0, 6000, self.SCHEMA)), expected)
+        self.assertEqual(sorted(self.orm.scan(self.SCHEMA)), expected)
+        self.assertEqual(self.orm.find_by(2, 30), [])
+        self.assertEqual(self.orm.aggregate([('count', None)], workers=1), (len(expected),))
+
+    # * This test bulk loads sorted records into full pages with a bottom-up index, and checks the index afterwards.
+    def test_bulk_load(self):
+        self.orm.close()
+        os.remove(self.filepath)
+        self.orm = Controller(self.filepath)
+        rows = [(i, f'name {i}', i) for i in range(0, 20000, 2)]
+        self.assertEqual(self.orm.bulk_load(rows, self.SCHEMA, fill_factor=0.5), len(rows))
+        stats = self.orm.commit()
+        self.assertLess(stats.writes, stats.pages // 10)
+
+        # Records can be read, inserted in between and loaded again after the load
+        self.assertEqual(self.orm.read(19998), (19998, 'name 19998', 19998))
+        self.orm.insert((1, 'name 1', 1), self.SCHEMA)
+        self.assertEqual(self.orm.bulk_load([(20001, 'name 20001', 0)], self.SCHEMA), 1)
+        # A failed load stores none of its records, also not the ones before the failing record
+        with self.assertRaises(ValueError):
+            self.orm.bulk_load([(3, 'name 3', 3), (4, 'name 4', 4)], self.SCHEMA)
+        with self.assertRaises(ValueError):
+            self.orm.bulk_load([(20003, 'name 20003', 0), (4, 'name 4', 4)], self.SCHEMA)
+        with self.assertRaises(ValueError):
+            self.orm.bulk_load([(20005, 'name 20005', 0), (20005, 'again', 0)], self.SCHEMA)
+        self.assertEqual(len(list(self.orm.scan(self.SCHEMA))), len(rows) + 2)
+        self.orm.close()
+
+        self.orm = Controller(self.filepath)
+        self.orm.schema = self.SCHEMA
+        for i in list(range(0, 20000, 2)) + [1, 20001]:
+            self.assertEqual(self.orm.read(i)[0], i)
+        with self.assertRaises(ValueError):
+            self.orm.read(3)
+
+        # An unsorted load into an empty file leaves it empty
+        self.orm.close()
+        os.remove(self.filepath)
+        self.orm = Controller(self.filepath)
+        with self.assertRaises(ValueError):
+            self.orm.bulk_load([(2, 'name 2', 2), (1, 'name 1', 1)], self.SCHEMA)
+        self.assertEqual(list(self.orm.scan(self.SCHEMA)), [])
+
+    # * This test deletes records without compacting the pages, reuses their dead space and vacuums the file.
+    def test_compaction_policies(self):
+        for compaction in ['lazy', 'threshold']:
+            self.orm.close()
+            self.orm = Controller(self.filepath, compaction=compaction)
+            self.orm.schema = self.SCHEMA
+            for i in range(0, 2000, 3):
+                self.orm.delete(i)
+            pages = list(self.orm.heap_file.data_pages())
+            dead_space = [page.dead_space for page in pages]
+            if compaction == 'lazy':
+                self.assertTrue(all(dead > 0 for dead in dead_space))
+            else:
+                self.assertTrue(all(dead < 0.25 * PAGE_SIZE for dead in dead_space))
+                self.assertTrue(any(dead > 0 for dead in dead_space))
+
+            # The free space map counts the dead space, an insert compacts the page it needs
+            self.assertIsNotNone(self.orm.heap_file.free_space_map.find(250))
+            self.orm.insert((0, 'x' * 240, 0), self.SCHEMA)
+            self.assertEqual(self.orm.read(0), (0, 'x' * 240, 0))
+            self.assertEqual(len(list(self.orm.heap_file.data_pages())), len(pages))
+
+            self.assertGreater(self.orm.vacuum(), 0)
+            self.assertTrue(all(page.dead_space == 0 for page in self.orm.heap_file.data_pages()))
+            self.assertEqual(self.orm.vacuum(), 0)
+            self.assertEqual([record[0] for record in self.orm.range(0, 2000, self.SCHEMA)],
+                             [i for i in range(2000) if i % 3 != 0 or i == 0])
+            self.orm.close()
+
+            # Restore the file for the next policy
+            os.remove(self.filepath)
+            self.setUp()
+
+        with self.assertRaises(ValueError):
+            Controller(self.filepath, compaction='never')
+
+    # * This test reuses the slots of deleted records on a page, and reads a page with many slots back from its data.
+    def test_page_slots(self):
+        page = Page()
+        records = [bytearray(f'record {i:03}', 'ascii') for i in range(250)]
+        self.assertEqual([page.insert_record(record) for record in records], list(range(250)))
+        for slot_id in [5, 100, 7]:
+            page.delete_record(slot_id)
+        page.delete_record(100)  # Already deleted, the slot is not freed twice
+        self.assertEqual(page.page_footer.free_slots, [5, 100, 7])
+
+        # The footer is read back with the same slots, and the deleted slots are found again
+        copy = Page(bytearray(page.data))
+        self.assertEqual(copy.page_footer.slot_dir, page.page_footer.slot_dir)
+        self.assertEqual(copy.page_footer.free_slots, [5, 7, 100])
+        self.assertEqual([copy.read_record(slot_id) for slot_id in [0, 6, 249]], [records[0], records[6], records[249]])
+
+        self.assertEqual(page.insert_record(bytearray(b'new 7')), 7)
+        self.assertEqual(copy.insert_record(bytearray(b'new 100')), 100)
+        self.assertEqual([page.insert_record(bytearray(b'x')) for _ in range(3)], [100, 5, 250])
+        self.assertTrue(page.is_packed())
+        copy = Page(bytearray(page.data))
+        self.assertEqual((copy.page_footer.slot_count(), copy.page_footer.free_slots), (251, []))
+        self.assertEqual([copy.read_record(slot_id) for slot_id in [7, 100, 250, 249]],
+                         [b'new 7', b'x', b'x', records[249]])
+
+
+if __name__ == '__main__':
+    unittest.main()
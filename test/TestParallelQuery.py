@@ -0,0 +1,70 @@
+import os
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.database.parallel_query import page_ranges
+
+
+class TestParallelQuery(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int', 'short']
+
+    def setUp(self):
+        self.filepath = 'test_parallel_query.bin'
+        self.orm = Controller(self.filepath, column_names=['id', 'name', 'age', 'city'])
+        self.rows = [(i, f'name {i % 7}', i % 90, i % 5) for i in range(20000)]
+        self.orm.bulk_load(self.rows, self.SCHEMA)
+
+    def tearDown(self):
+        self.orm.close()
+        for path in [self.filepath, self.filepath + '.wal']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # * This test aggregates in worker processes and compares the result with a scan, also after uncommitted changes.
+    def test_aggregate(self):
+        for i in range(0, 1000, 3):
+            self.orm.delete(i)
+        self.orm.insert((50000, 'late', 30, 2), self.SCHEMA)
+        rows = [row for row in self.rows if not (row[0] < 1000 and row[0] % 3 == 0)] + [(50000, 'late', 30, 2)]
+
+        adults = [row for row in rows if row[2] >= 18]
+        expected = {city: (len([row for row in adults if row[3] == city]),
+                           sum(row[2] for row in adults if row[3] == city),
+                           min(row[2] for row in adults if row[3] == city),
+                           max(row[1] for row in adults if row[3] == city)) for city in range(5)}
+        aggregates = [('count', None), ('sum', 'age'), ('min', 'age'), ('max', 'name')]
+        for workers in [1, 2]:
+            self.assertEqual(self.orm.aggregate(aggregates, [('age', '>=', 18)], 'city', workers=workers), expected)
+
+        self.assertEqual(self.orm.aggregate([('count', None), ('max', 0)], workers=2), (len(rows), 50000))
+        self.assertEqual(self.orm.aggregate([('count', None), ('min', 2)], [('name', '==', 'none')]), (0, None))
+        with self.assertRaises(ValueError):
+            self.orm.aggregate([('avg', 2)])
+
+    # * This test checks that an aggregate commits the changes before it, so they are not undone after a crash.
+    def test_aggregate_commits(self):
+        self.orm.close()
+        self.orm = Controller(self.filepath, wal=True)
+        self.orm.schema = self.SCHEMA
+        self.orm.insert((50000, 'late', 30, 2), self.SCHEMA)
+        self.orm.delete(7)
+        self.assertEqual(self.orm.aggregate([('count', None), ('max', 0)], workers=1), (len(self.rows), 50000))
+        self.orm.heap_file.disk.close()  # Crash without a commit
+        self.orm.heap_file.wal.close()
+
+        self.orm = Controller(self.filepath, wal=True)
+        self.orm.schema = self.SCHEMA
+        self.assertEqual(self.orm.read(50000), (50000, 'late', 30, 2))
+        with self.assertRaises(ValueError):
+            self.orm.read(7)
+
+    # * This test splits page numbers into ranges of about the same size.
+    def test_page_ranges(self):
+        ranges = page_ranges(list(range(10)), 4)
+        self.assertEqual([len(pages) for pages in ranges], [3, 3, 2, 2])
+        self.assertEqual(sum(ranges, []), list(range(10)))
+        self.assertEqual(page_ranges([1, 2], 8), [[1], [2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.database.pax_page import PaxPage, load_data_page
+from src.main.utils import utils
+
+
+class TestPaxPage(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'short', 'var_str', 'byte']
+
+    def setUp(self):
+        self.filepaths = ['test_pax_page.bin', 'test_nsm_page.bin']
+        self.orms = []
+
+    def tearDown(self):
+        for orm in self.orms:
+            orm.close()
+        for path in self.filepaths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # * This test inserts, updates and deletes records on a PAX page and reads them back from its data, by row and by
+    # column.
+    def test_page_records(self):
+        codec = utils.compile_schema(tuple(self.SCHEMA))
+        page = PaxPage(self.SCHEMA)
+        rows = [(i, f'name {i}', i % 7, 'BE' if i % 2 else 'NL', i % 3) for i in range(300)]
+        slots = page.insert_records([codec.encode(row) for row in rows])
+        self.assertLess(len(slots), len(rows))  # The page is full
+        self.assertEqual(slots, list(range(len(slots))))
+
+        page.delete_record(3)
+        self.assertEqual(page.update_record(4, codec.encode((4, 'four', 1, 'FR', 2))), 4)
+        self.assertIsNone(page.update_record(5, codec.encode((5, 'x' * 200, 1, 'FR', 2))))  # Too large, deleted
+
+        page = load_data_page(bytes(page.data), self.SCHEMA)
+        self.assertIsInstance(page, PaxPage)
+        expected = [row for row in rows[:len(slots)] if row[0] not in (3, 4, 5)] + [(4, 'four', 1, 'FR', 2)]
+        self.assertEqual(sorted(codec.decode(record) for _, record in page.records()), sorted(expected))
+        self.assertEqual(page.read_record(3), bytearray())
+
+        # A new record takes a deleted row
+        self.assertIn(page.insert_record(codec.encode((999, 'late', 1, '', 0))), (3, 5))
+        ids, cities = page.read_columns([0, 3])
+        self.assertEqual(len(ids), len(expected) + 1)
+        self.assertEqual(cities[ids.index(4)], 'FR')
+        columns = page.decode_columns()
+        self.assertEqual(columns[1].to_list(), page.read_columns([1])[0])
+
+    # * This test stores the same records in a PAX file and an NSM file, and compares scans of some columns, reads,
+    # aggregates and columns after a reopen.
+    def test_pax_file(self):
+        rows = [(i, f'name {i % 97}', i % 90, f'city {i % 5}', i % 3) for i in range(5000)]
+        for path, layout in zip(self.filepaths, ['pax', 'nsm']):
+            orm = Controller(path, layout=layout, schema=self.SCHEMA)
+            orm.bulk_load(rows, self.SCHEMA)
+            for i in range(0, 1000, 3):
+                orm.delete(i)
+            orm.update_many([(i, 'a much longer name ' * 3, 1, '', 1) for i in range(1, 1000, 3)], self.SCHEMA)
+            orm.insert_many([(9000 + i, 'late', 30, 'city 9', 2) for i in range(50)], self.SCHEMA)
+            orm.close()
+
+        with self.assertRaises(ValueError):
+            Controller('test_missing_schema.bin', layout='pax')
+        os.remove('test_missing_schema.bin')
+
+        self.orms = [Controller(path, column_names=['id', 'name', 'age', 'city', 'group']) for path in self.filepaths]
+        pax, nsm = self.orms
+        nsm.schema = self.SCHEMA
+        self.assertEqual((pax.heap_file.layout, pax.schema), ('pax', self.SCHEMA))
+        # Records that moved are stored in another order
+        self.assertEqual(sorted(pax.scan(self.SCHEMA)), sorted(nsm.scan(self.SCHEMA)))
+        self.assertEqual(sorted(pax.scan(self.SCHEMA, {2: lambda age: age >= 18}, [3, 0])),
+                         sorted(nsm.scan(self.SCHEMA, {2: lambda age: age >= 18}, [3, 0])))
+        self.assertEqual(pax.read_many([1, 2, 3, 9001]), nsm.read_many([1, 2, 3, 9001]))
+        self.assertEqual(list(pax.range(990, 1010, self.SCHEMA)), list(nsm.range(990, 1010, self.SCHEMA)))
+        aggregates = [('count', None), ('sum', 'age'), ('max', 'name')]
+        self.assertEqual(pax.aggregate(aggregates, [('age', '>=', 18)], 'city', workers=2),
+                         nsm.aggregate(aggregates, [('age', '>=', 18)], 'city', workers=1))
+        pax_columns, nsm_columns = pax.read_columns(), nsm.read_columns()
+        self.assertEqual(sorted(zip(pax_columns[0].tolist(), pax_columns[3].to_list())),
+                         sorted(zip(nsm_columns[0].tolist(), nsm_columns[3].to_list())))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import unittest
+
+from src.main.database.controller import Controller
+
+
+class TestSecondaryIndex(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'var_str', 'short']
+    COLUMNS = ['id', 'email', 'country', 'age']
+    COUNTRIES = ['Belgium', 'France', 'Germany', 'Spain', 'Italy']
+
+    def setUp(self):
+        self.filepath = 'test_secondary_index.bin'
+        self.orm = Controller(self.filepath, column_names=self.COLUMNS)
+        for i in range(3000):
+            self.orm.insert(self.row(i), self.SCHEMA)
+        self.orm.create_index('email', self.SCHEMA)
+        self.orm.create_index('country', self.SCHEMA)
+        self.orm.create_index(3, self.SCHEMA)
+
+    def tearDown(self):
+        self.orm.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def row(self, i: int) -> tuple:
+        return i, f'user{i}@example.com', self.COUNTRIES[i % len(self.COUNTRIES)], 20 + i % 50
+
+    # * This test finds records on a unique string, a repeated string and a repeated number.
+    def test_find_by(self):
+        self.assertEqual(self.orm.find_by('email', 'user1234@example.com'), [self.row(1234)])
+        self.assertEqual(self.orm.find_by('email', 'nobody@example.com'), [])
+
+        spain = self.orm.find_by('country', 'Spain')
+        self.assertEqual(sorted(spain), [self.row(i) for i in range(3, 3000, 5)])
+        self.assertEqual(sorted(self.orm.find_by('age', 25)), [self.row(i) for i in range(5, 3000, 50)])
+
+        with self.assertRaises(ValueError):
+            self.orm.find_by('name', 'x')
+        with self.assertRaises(ValueError):
+            self.orm.find_by(0, 1)
+
+    # * This test checks that the indexes follow inserts, updates (also of records that move page) and deletes.
+    def test_maintenance(self):
+        self.orm.insert((5000, 'new@example.com', 'Spain', 99), self.SCHEMA)
+        self.orm.update(10, (10, 'moved' * 40 + '@example.com', 'Portugal', 10), self.SCHEMA)
+        self.orm.update(11, (11, 'same@example.com', 'France', 31), self.SCHEMA)
+        self.orm.delete(13)
+
+        self.assertEqual(self.orm.find_by('email', 'new@example.com'), [(5000, 'new@example.com', 'Spain', 99)])
+        self.assertEqual(self.orm.find_by('country', 'Portugal'), [(10, 'moved' * 40 + '@example.com', 'Portugal', 10)])
+        self.assertEqual(self.orm.find_by('email', 'user10@example.com'), [])
+        self.assertEqual(self.orm.find_by('email', 'same@example.com'), [(11, 'same@example.com', 'France', 31)])
+        self.assertEqual(self.orm.find_by('email', 'user13@example.com'), [])
+        spain = [record[0] for record in self.orm.find_by('country', 'Spain')]
+        self.assertIn(5000, spain)
+        self.assertNotIn(13, spain)
+        self.assertEqual(len(spain), 600)
+
+    # * This test checks that the indexes are stored in the file and loaded again.
+    def test_index_is_persisted(self):
+        self.orm.close()
+        self.orm = Controller(self.filepath, column_names=self.COLUMNS)
+        self.orm.schema = self.SCHEMA
+        self.assertEqual(sorted(self.orm.heap_file.secondary_indexes), [1, 2, 3])
+        self.assertEqual(self.orm.find_by('email', 'user2999@example.com'), [self.row(2999)])
+        self.orm.delete(2999)
+        self.assertEqual(self.orm.find_by('email', 'user2999@example.com'), [])
+        self.assertEqual(len(self.orm.find_by('country', 'Italy')), 599)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from src.main.database.page import Page
+from src.main.utils import utils
+
+
+class TestUtils(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'short', 'byte', 'var_str', 'int']
+
+    # * This test checks that the compiled codec encodes records exactly like the field by field encoding.
+    def test_codec_matches_field_encoding(self):
+        record = (7, 'Brian Green', 300, 12, 'e-mail', 2 ** 32 - 1)
+        expected = bytearray()
+        for value, field_type in zip(record, self.SCHEMA):
+            expected.extend(utils.encode_field(value, field_type))
+
+        codec = utils.compile_schema(tuple(self.SCHEMA))
+        self.assertIs(codec, utils.compile_schema(tuple(self.SCHEMA)))
+        self.assertEqual(utils.encode_record(record, self.SCHEMA), expected)
+        self.assertEqual(codec.size(record), len(expected))
+        self.assertEqual(utils.decode_record(expected, self.SCHEMA), record)
+
+        # Decoding from a view on a buffer at an offset
+        buffer = bytearray(100)
+        buffer[10:10 + len(expected)] = expected
+        self.assertEqual(codec.decode(memoryview(buffer), 10), record)
+
+        # The length of a var_str is its number of UTF-8 bytes
+        record = (7, 'Brian Grün', 300, 12, 'é-mail', 0)
+        self.assertEqual(utils.decode_record(utils.encode_record(record, self.SCHEMA), self.SCHEMA), record)
+
+    # * This test checks that values that do not fit their field type are rejected.
+    def test_codec_errors(self):
+        with self.assertRaises(ValueError):
+            utils.encode_record((1, 'x' * 256), ['int', 'var_str'])
+        with self.assertRaises(ValueError):
+            utils.encode_record((256,), ['byte'])
+        with self.assertRaises(ValueError):
+            utils.compile_schema(('float',))
+
+    # * This test decodes only some fields of a record.
+    def test_decode_fields(self):
+        record = (7, 'Brian Green', 300, 12, 'e-mail', 9)
+        encoded = utils.encode_record(record, self.SCHEMA)
+        codec = utils.compile_schema(tuple(self.SCHEMA))
+        self.assertEqual(codec.decode_fields(encoded, [5, 1, 3]), (9, 'Brian Green', 12))
+        self.assertEqual(codec.decode_fields(encoded, []), ())
+        # Fields after the last needed field are not read
+        self.assertEqual(codec.decode_fields(encoded[:5], [0]), (7,))
+
+    # * This test decodes the records of pages into columns and compares them with the records decoded one by one.
+    def test_decode_pages(self):
+        records = [(i, f'name {i}', i % 1000, i % 200, 'é' * (i % 5), i * 3) for i in range(300)]
+        pages, page_records = [], []
+        for start in range(0, 300, 50):
+            page_records.append([utils.encode_record(record, self.SCHEMA) for record in records[start:start + 50]])
+            pages.append(Page.from_records(page_records[-1]))
+        # Deleted records are skipped
+        pages[0].delete_record(3)
+        del records[3]
+
+        columns = utils.decode_pages(pages, self.SCHEMA)
+        self.assertEqual(len(columns), len(self.SCHEMA))
+        self.assertEqual(columns[0].dtype, np.uint32)
+        self.assertEqual(columns[3].dtype, np.uint8)
+        self.assertEqual([tuple(values) for values in zip(*[
+            column.to_list() if isinstance(column, utils.StringColumn) else column.tolist() for column in columns])],
+            records)
+        self.assertEqual(columns[4][3], 'é' * 4)
+        self.assertEqual(len(utils.decode_pages(pages[1], self.SCHEMA)[1]), 50)
+        self.assertEqual(len(utils.decode_pages([], self.SCHEMA)[0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
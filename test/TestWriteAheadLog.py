@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import unittest
+
+from src.main.database.controller import Controller
+from src.main.database.write_ahead_log import WriteAheadLog
+from src.main.utils.constants import PAGE_SIZE
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    SCHEMA = ['int', 'var_str', 'int']
+
+    def setUp(self):
+        self.filepath = 'test_write_ahead_log.bin'
+        self.orm = None
+
+    def tearDown(self):
+        if self.orm is not None:
+            self.crash()
+        for path in [self.filepath, self.filepath + '.wal']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Stops without writing the buffer pool, like a crash of the process
+    def crash(self):
+        self.orm.heap_file.disk.close()
+        self.orm.heap_file.wal.close()
+        self.orm = None
+
+    def reopen(self):
+        self.orm = Controller(self.filepath, wal=True)
+        self.orm.schema = self.SCHEMA
+
+    # * This test commits to the log only, and checks that the commit is recovered after a crash.
+    def test_commit_is_recovered(self):
+        self.reopen()
+        for i in range(500):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        stats = self.orm.commit()
+        self.assertEqual(stats.writes, 1)
+        self.assertEqual(self.orm.heap_file.wal.size() // PAGE_SIZE, stats.pages)
+        self.assertEqual(os.path.getsize(self.filepath), 0)
+        self.crash()
+
+        self.reopen()
+        self.assertEqual(self.orm.heap_file.wal.size(), 0)
+        self.assertEqual([record[0] for record in self.orm.range(0, 1000, self.SCHEMA)], list(range(500)))
+
+    # * This test writes uncommitted pages over the file on eviction, and checks that they are undone after a crash.
+    def test_uncommitted_changes_are_undone(self):
+        self.orm = Controller(self.filepath, cache_size=16, wal=True)
+        self.orm.schema = self.SCHEMA
+        for i in range(300):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        self.orm.commit()
+        for i in range(300, 3000):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        for i in range(0, 300, 2):
+            self.orm.delete(i)
+        self.assertGreater(os.path.getsize(self.filepath), 0)
+        self.crash()
+
+        self.reopen()
+        self.assertEqual([record[0] for record in self.orm.range(0, 5000, self.SCHEMA)], list(range(300)))
+        self.assertEqual(self.orm.read(299), (299, 'name 299', 299))
+        self.orm.insert((300, 'again', 0), self.SCHEMA)
+        self.orm.close()
+        self.orm = None
+
+        # A checkpoint on closing leaves a file that can be opened without the log
+        orm = Controller(self.filepath)
+        orm.schema = self.SCHEMA
+        self.assertEqual(orm.read(300), (300, 'again', 0))
+        orm.close()
+
+    # * This test commits after uncommitted pages were written over the file on eviction, and checks that the commit
+    # logs their current image, so the recovery does not write an older committed image over them.
+    def test_commit_after_eviction_is_recovered(self):
+        self.orm = Controller(self.filepath, cache_size=16, wal=True)
+        self.orm.schema = self.SCHEMA
+        for i in range(300):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        self.orm.commit()
+        self.orm.update(0, (0, 'changed', 0), self.SCHEMA)
+        for i in range(300, 3000):
+            self.orm.insert((i, f'name {i}', i), self.SCHEMA)
+        self.assertTrue(self.orm.heap_file.buffer_pool.written)
+        self.orm.commit()
+        self.assertFalse(self.orm.heap_file.buffer_pool.written)
+        self.crash()
+
+        self.reopen()
+        self.assertEqual(self.orm.read(0), (0, 'changed', 0))
+        self.assertEqual(sorted(record[0] for record in self.orm.scan(self.SCHEMA)), list(range(3000)))
+
+        # A checkpoint commits the changes it writes, even when they are made after the last commit
+        self.orm.update(1, (1, 'checkpointed', 1), self.SCHEMA)
+        self.orm.heap_file.checkpoint()
+        self.crash()
+        self.reopen()
+        self.assertEqual(self.orm.read(1), (1, 'checkpointed', 1))
+
+    # * This test appends a torn record to the log, which is ignored by the recovery.
+    def test_torn_tail_is_ignored(self):
+        self.reopen()
+        self.orm.insert((1, 'one', 1), self.SCHEMA)
+        self.orm.commit()
+        self.orm.insert((2, 'two', 2), self.SCHEMA)
+        wal = self.orm.heap_file.wal
+        wal.append([bytes([1, 5, 0, 0, 0]) + bytes(100)])
+        self.crash()
+
+        self.reopen()
+        self.assertEqual(self.orm.read(1), (1, 'one', 1))
+        with self.assertRaises(ValueError):
+            self.orm.read(2)
+
+    # * This test commits from several threads at once, and checks that commits share a sync.
+    def test_group_commit(self):
+        wal = WriteAheadLog(self.filepath + '.wal')
+        sync_file = wal.sync_file
+        wal.sync_file = lambda: time.sleep(0.01) or sync_file()
+
+        def commit(thread: int):
+            for i in range(5):
+                wal.commit([(thread * 5 + i, bytes([thread]) * PAGE_SIZE)])
+
+        threads = [threading.Thread(target=commit, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(wal.syncs, 40)
+        pages = wal.recover()
+        self.assertEqual([page_number for page_number, _ in pages], list(range(40)))
+        self.assertTrue(all(data == bytes([page_number // 5]) * PAGE_SIZE for page_number, data in pages))
+        wal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()